@@ -1,15 +1,21 @@
 import os
 import csv
+import contextlib
+import functools
 import uuid
 import time
 import json
+import shutil
 import threading
+from collections import deque
 from datetime import datetime, timedelta
+from urllib.parse import quote, urlparse
 
 import boto3
-import requests
+from botocore.config import Config
 from flask import (
     Flask,
+    Response,
     render_template,
     request,
     redirect,
@@ -20,6 +26,21 @@ from flask import (
 )
 from werkzeug.utils import secure_filename
 
+from csv_stream import ColumnPlan, count_csv_rows, iter_csv_rows, iter_csv_tuples, read_csv_header, read_csv_preview
+from mime_cache import PrebuiltMessage, build_message
+from msg91_client import AsyncMsg91Client, Msg91Client, create_session, inline_attachment, url_attachment
+from render_pipeline import BulkTemplate, RenderPipeline
+from event_store import DEFAULT_PATH as EVENT_CACHE_PATH, EventStore
+from job_store import create_job_store, is_active
+from local_s3 import LocalS3
+from providers import FakeProvider, Msg91Provider, SesProvider
+from ses_events import JSON_BACKEND, EventReducer, date_prefixes, fetch_events, join_on_message_ids, reduce_events_in_processes
+from send_ledger import SendCheckpoint
+from suppression import SuppressionIndex, normalize_email
+from send_engine import AdaptiveRateController, AsyncSendEngine, QuotaExceeded, SendEngine, TokenBucket
+from ses_async import AsyncSesClient
+from stage_pipeline import Stage, StagedPipeline
+
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "change-me")
@@ -32,295 +53,692 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(GENERATED_DIR, exist_ok=True)
 
 
-# In-memory job tracking (simple single-process background jobs)
-job_states = {}
+# Job tracking; the SQLite backend (default) is shared by all gunicorn workers and survives restarts
+job_store = create_job_store()
 
 
 def _update_job(job_id, **kwargs):
-    job = job_states.get(job_id, {})
-    job.update(kwargs)
-    job_states[job_id] = job
+    job_store.update(job_id, **kwargs)
 
 
-def _read_csv_rows(csv_path):
-    with open(csv_path, newline="", encoding="utf-8-sig") as f:
-        reader = csv.DictReader(f)
-        return list(reader)
+HOSTED_ATTACHMENT_DIR = os.path.join(GENERATED_DIR, "attachments")
+# Public URL of this app, needed for MSG91 to download attachments in "hosted" mode
+PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "")
+# Hosted attachment copies are served (and kept) this long, so MSG91 can still fetch them for late deliveries
+HOSTED_ATTACHMENT_TTL_SECONDS = int(os.environ.get("HOSTED_ATTACHMENT_TTL_SECONDS", str(3 * 24 * 3600)))
 
+ERROR_LOG_DIR = os.path.join(GENERATED_DIR, "errors")
+ERROR_LOG_FIELDS = ["seq", "email", "batch", "stage", "error"]
+_error_log_lock = threading.Lock()
 
-def _build_ses_client():
-    region = os.environ.get("SES_REGION", "ap-south-1")
-    return boto3.client("ses", region_name=region)
-
-
-def _ses_send_worker(job_id, csv_path, attachment_path, subject_template, from_email, config_set, youtube_link, email_template, column_mappings):
-    from email.mime.multipart import MIMEMultipart
-    from email.mime.text import MIMEText
-    from email.mime.application import MIMEApplication
-    from email.mime.image import MIMEImage
-
-    _update_job(job_id, status="running", processed=0, successes=0, failures=0, errors=[])
-    rows = _read_csv_rows(csv_path)
-    total = len(rows)
-    _update_job(job_id, total=total)
-
-    ses = _build_ses_client()
-
-    attachment_bytes = None
-    attachment_filename = None
-    if attachment_path and os.path.exists(attachment_path):
-        with open(attachment_path, "rb") as f:
-            attachment_bytes = f.read()
-        attachment_filename = os.path.basename(attachment_path)
-
-    # Load inline images for templates that need them
-    inline_images = {}
-    if email_template == "kym_template.html":
-        sign_image_path = os.path.join(BASE_DIR, "img", "sign.png")
-        if os.path.exists(sign_image_path):
-            with open(sign_image_path, "rb") as f:
-                inline_images["signature"] = f.read()
-
-    # Parse column mappings (JSON string from form)
-    mappings = {}
-    if column_mappings:
-        try:
-            mappings = json.loads(column_mappings)
-        except:
-            # Fallback: try to parse as default structure
-            mappings = {}
-
-    # Create reverse mapping: template_var -> csv_column
-    reverse_mapping = {v: k for k, v in mappings.items() if v}
-
-    # Auto-detect column mappings if not provided or incomplete
-    if rows:
-        sample_row = rows[0]
-        # Always try to find Email column (required)
-        if 'Email' not in reverse_mapping:
-            for key in sample_row.keys():
-                key_lower = key.lower().strip()
-                if key_lower in ['email', 'e-mail', 'email address']:
-                    reverse_mapping['Email'] = key
-                    break
-        
-        # Auto-detect other common columns if not mapped
-        for key in sample_row.keys():
-            key_lower = key.lower().strip()
-            if key_lower in ['name', 'full name', 'member name'] and 'Name' not in reverse_mapping:
-                reverse_mapping['Name'] = key
-            elif key_lower in ['membershipid', 'membership id', 'member id', 'memberid'] and 'Membershipid' not in reverse_mapping:
-                reverse_mapping['Membershipid'] = key
-            elif key_lower in ['mobile', 'phone', 'phone number', 'mobile number'] and 'Mobile' not in reverse_mapping:
-                reverse_mapping['Mobile'] = key
-
-    # Render email HTML using Jinja template in app context
-    with app.app_context():
-        for row in rows:
-            # Extract values using dynamic mapping
-            template_vars = {}
-            
-            # Get email (required) - try multiple methods
-            email_col = reverse_mapping.get('Email')
-            if not email_col:
-                # Last resort: try common column names
-                for col in ['Email', 'email', 'E-mail', 'Email Address']:
-                    if col in row:
-                        email_col = col
-                        break
-            
-            if not email_col:
-                errors = job_states[job_id].get("errors", [])
-                errors.append({"email": "N/A", "error": "Email column not found in CSV. Please map the email column."})
-                _update_job(job_id, processed=job_states[job_id]["processed"] + 1, failures=job_states[job_id]["failures"] + 1, errors=errors)
-                continue
-            
-            to_email = row.get(email_col, "").strip()
-            if not to_email:
-                errors = job_states[job_id].get("errors", [])
-                errors.append({"email": "N/A", "error": f"Email value is empty in row"})
-                _update_job(job_id, processed=job_states[job_id]["processed"] + 1, failures=job_states[job_id]["failures"] + 1, errors=errors)
-                continue
-
-            # Map all other variables dynamically
-            for template_var, csv_col in reverse_mapping.items():
-                if template_var != 'Email':  # Already handled
-                    template_vars[template_var] = row.get(csv_col, "").strip()
-            
-            # Add any additional columns from CSV as template variables (for flexibility)
-            for csv_col, value in row.items():
-                if csv_col not in reverse_mapping.values() and csv_col != email_col:
-                    # Use column name as variable name (sanitized)
-                    var_name = csv_col.replace(' ', '').replace('-', '').replace('_', '')
-                    if var_name and var_name not in template_vars:
-                        template_vars[var_name] = value.strip()
-            
-            # Add YouTube link if provided
-            if youtube_link:
-                template_vars['YouTubeLink'] = youtube_link
-
-            # Replace subject template variables dynamically
-            subject = subject_template
-            for var_name, var_value in template_vars.items():
-                subject = subject.replace(f"{{{var_name}}}", var_value)
-                subject = subject.replace(f"{{{var_name.lower()}}}", var_value)
-                subject = subject.replace(f"{{{var_name.upper()}}}", var_value)
-
-            # Render template with all variables
-            try:
-                html_body = render_template(email_template, **template_vars)
-            except Exception as e:
-                errors = job_states[job_id].get("errors", [])
-                errors.append({"email": to_email, "error": f"Template rendering error: {str(e)}"})
-                _update_job(job_id, processed=job_states[job_id]["processed"] + 1, failures=job_states[job_id]["failures"] + 1, errors=errors)
-                continue
-
-            # Use 'related' multipart if we have inline images, otherwise use regular multipart
-            if inline_images:
-                msg = MIMEMultipart('related')
-            else:
-                msg = MIMEMultipart()
-            
-            msg["Subject"] = subject
-            msg["From"] = from_email
-            msg["To"] = to_email
-            
-            # Create alternative part for HTML content
-            if inline_images:
-                alt = MIMEMultipart('alternative')
-                alt.attach(MIMEText(html_body, "html"))
-                msg.attach(alt)
-            else:
-                msg.attach(MIMEText(html_body, "html"))
 
-            # Attach inline images
-            for cid, image_data in inline_images.items():
-                img = MIMEImage(image_data)
-                img.add_header('Content-ID', f'<{cid}>')
-                img.add_header('Content-Disposition', 'inline', filename=f'{cid}.png')
-                msg.attach(img)
+def _error_log_path(job_id):
+    return os.path.join(ERROR_LOG_DIR, f"{job_id}.csv")
 
-            if attachment_bytes:
-                part = MIMEApplication(attachment_bytes)
-                part.add_header("Content-Disposition", "attachment", filename=attachment_filename)
-                msg.attach(part)
 
-            try:
-                kwargs = {
-                    "Source": from_email,
-                    "Destinations": [to_email],
-                    "RawMessage": {"Data": msg.as_string()},
-                }
-                if config_set:
-                    kwargs["ConfigurationSetName"] = config_set
-                ses.send_raw_email(**kwargs)
-                _update_job(job_id, processed=job_states[job_id]["processed"] + 1, successes=job_states[job_id]["successes"] + 1)
-            except Exception as e:
-                errors = job_states[job_id].get("errors", [])
-                errors.append({"email": to_email, "error": str(e)})
-                _update_job(job_id, processed=job_states[job_id]["processed"] + 1, failures=job_states[job_id]["failures"] + 1, errors=errors)
-
-            # Light throttle to avoid SES burst issues
-            if job_states[job_id]["processed"] % 14 == 0:
-                time.sleep(1)
+def _incr_job(job_id, error=None, **deltas):
+    """Atomically bump job counters and optionally record an error (safe from send threads).
+
+    The job store only keeps the newest errors; every error is also appended
+    to the job's error CSV, downloadable from /errors/<job_id>.csv.
+    """
+    seq = job_store.incr(job_id, error=error, **deltas)
+    if error is None:
+        return
+    with _error_log_lock:
+        path = _error_log_path(job_id)
+        new_file = not os.path.exists(path)
+        os.makedirs(ERROR_LOG_DIR, exist_ok=True)
+        with open(path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(ERROR_LOG_FIELDS)
+            writer.writerow([seq] + [error.get(field, "") for field in ERROR_LOG_FIELDS[1:]])
+
+
+def _count_rows_async(job_id, csv_path):
+    """Fill in the job's `total` from a background line count so sending can start right away."""
+    def count():
+        try:
+            _update_job(job_id, total=count_csv_rows(csv_path))
+        except Exception as e:
+            _incr_job(job_id, error={"stage": "count_rows", "error": str(e)})
+
+    threading.Thread(target=count, daemon=True).start()
+
+
+# Progress streams push at most this many updates per second and end after
+# PROGRESS_STREAM_SECONDS (the browser reconnects), which keeps them under gunicorn's worker timeout
+PROGRESS_UPDATES_PER_SEC = float(os.environ.get("PROGRESS_UPDATES_PER_SEC", "2"))
+PROGRESS_STREAM_SECONDS = float(os.environ.get("PROGRESS_STREAM_SECONDS", "25"))
+PROGRESS_KEEPALIVE_SECONDS = 10
+JOB_DONE_STATUSES = ("completed", "failed", "stopped")
+
+# EMAIL_PROVIDER=fake sends every job through the in-process FakeProvider (no AWS or MSG91 calls)
+EMAIL_PROVIDER = os.environ.get("EMAIL_PROVIDER", "").lower()
+
+DEFAULT_SES_SEND_RATE = 14
+# raw: one SendRawEmail per recipient; bulk: SES v2 SendBulkEmail with a stored template, up to 50 per call
+SES_SEND_MODES = ("raw", "bulk")
+DEFAULT_MSG91_CONCURRENCY = 4
+# MSG91 batch latency percentiles are taken over this many recent batches
+LATENCY_WINDOW = 500
+# thread: one thread per in-flight send; async: all sends as coroutines on one asyncio loop (for hundreds in flight)
+SEND_ENGINES = ("thread", "async")
+MSG91_ATTACHMENT_MODES = ("auto", "inline", "url", "hosted")
+# MSG91 names the attachment fields (e.g. `attachments.0.filePath`) in errors about the referenced file
+MSG91_ATTACHMENT_ERROR_HINTS = ("attachment", "filepath")
+# Rows each send-job stage may work ahead of the next one
+SES_PIPELINE_QUEUE_SIZE = int(os.environ.get("SES_PIPELINE_QUEUE_SIZE", "32"))
+# A running job whose worker has not reported for this long is assumed dead (e.g. the process restarted)
+JOB_STALE_SECONDS = 120
+# Campaign reports scan from the first send to this many days after the last one (late bounces, opens, clicks)
+REPORT_CAMPAIGN_TRAILING_DAYS = int(os.environ.get("REPORT_CAMPAIGN_TRAILING_DAYS", "7"))
+
+
+def _build_ses_client(max_pool_connections=10):
+    region = os.environ.get("SES_REGION", "ap-south-1")
+    return boto3.client("ses", region_name=region, config=Config(max_pool_connections=max_pool_connections))
 
-    _update_job(job_id, status="completed")
+
+def _build_ses_async_client(pool_size):
+    region = os.environ.get("SES_REGION", "ap-south-1")
+    return AsyncSesClient(region, boto3.Session(region_name=region).get_credentials(), pool_size=pool_size)
 
 
-def _build_msg91_attachment(attachment_path):
-    if not attachment_path or not os.path.exists(attachment_path):
+def _async_client_or_none(job_id, build):
+    """`build()`, or None (sends then run on a thread pool) when aiohttp is not installed."""
+    try:
+        return build()
+    except RuntimeError as e:
+        _incr_job(job_id, error={"stage": "send_engine", "error": f"{e}; async sends run on a thread pool"})
         return None
-    with open(attachment_path, "rb") as f:
-        import base64
 
-        encoded = base64.b64encode(f.read()).decode("utf-8")
-    filename = os.path.basename(attachment_path)
-    mime_type = "application/octet-stream"
-    lower = filename.lower()
-    if lower.endswith(".jpg") or lower.endswith(".jpeg"):
-        mime_type = "image/jpeg"
-    elif lower.endswith(".png"):
-        mime_type = "image/png"
-    elif lower.endswith(".pdf"):
-        mime_type = "application/pdf"
 
-    return {"file": f"data:{mime_type};base64,{encoded}", "fileName": filename}
+def _build_sesv2_client():
+    region = os.environ.get("SES_REGION", "ap-south-1")
+    return boto3.client("sesv2", region_name=region)
+
 
+def _create_provider(create_real):
+    """The provider a send job uses: `create_real()`, or the fake one when EMAIL_PROVIDER=fake."""
+    if EMAIL_PROVIDER == "fake":
+        return FakeProvider.from_env()
+    return create_real()
 
-def _msg91_send_worker(job_id, csv_path, attachment_path, template_id, from_email, domain, auth_key, batch_size, delay_between_batches):
-    _update_job(job_id, status="running", processed=0, successes=0, failures=0, errors=[])
-    rows = _read_csv_rows(csv_path)
-    total = len(rows)
-    _update_job(job_id, total=total)
 
-    recipients_batch = []
-    attachment = _build_msg91_attachment(attachment_path)
+def _fail_job_on_error(worker):
+    """Mark the job failed if `worker(job_id, ...)` crashes, instead of leaving it "running"."""
+    @functools.wraps(worker)
+    def run(job_id, *args, **kwargs):
+        try:
+            return worker(job_id, *args, **kwargs)
+        except Exception as e:
+            _incr_job(job_id, error={"stage": "worker", "error": f"{type(e).__name__}: {e}"})
+            _update_job(job_id, status="failed")
+
+    return run
+
+
+@_fail_job_on_error
+def _ses_send_worker(job_id, csv_path, attachment_path, subject_template, from_email, config_set, youtube_link, email_template, column_mappings, max_send_rate=None, max_in_flight=14, skip_duplicates=True, skip_suppressed=True, send_mode="raw", send_engine="thread", resume=False):
+    # Every accepted row is checkpointed so a crashed job can be resumed without re-sending
+    checkpoint = SendCheckpoint(job_id)
+    # The ledger, the provider's sessions and the suppression list are closed however the job ends
+    with contextlib.ExitStack() as resources:
+        resources.callback(checkpoint.close)
+        done_rows = set()
+        if resume:
+            done_rows = checkpoint.completed_rows()
+            _update_job(job_id, status="running", processed=len(done_rows), successes=len(done_rows), failures=0, errors=[], resumed_rows=len(done_rows), stop_reason=None, heartbeat=time.time())
+        else:
+            csv_stat = os.stat(csv_path)
+            checkpoint.save_params({
+                "csv_path": csv_path,
+                "csv_size": csv_stat.st_size,
+                "csv_mtime": csv_stat.st_mtime,
+                "attachment_path": attachment_path,
+                "subject_template": subject_template,
+                "from_email": from_email,
+                "config_set": config_set,
+                "youtube_link": youtube_link,
+                "email_template": email_template,
+                "column_mappings": column_mappings,
+                "max_send_rate": max_send_rate,
+                "max_in_flight": max_in_flight,
+                "skip_duplicates": skip_duplicates,
+                "skip_suppressed": skip_suppressed,
+                "send_mode": send_mode,
+                "send_engine": send_engine,
+            })
+            _update_job(job_id, status="running", processed=0, successes=0, failures=0, errors=[], heartbeat=time.time())
+        rows = iter_csv_tuples(csv_path)
+        header = read_csv_header(csv_path)
+        _count_rows_async(job_id, csv_path)
+
+        # Pre-send filter: each normalized address is mailed once, and never if it hard-bounced or complained before
+        seen = None
+        if skip_duplicates:
+            seen = {normalize_email(email) for _, email, _, _ in checkpoint.entries()} if resume else set()
+        suppression = None
+        if skip_suppressed:
+            suppression = SuppressionIndex()
+            resources.callback(suppression.close)
+            _update_job(job_id, suppression_size=suppression.load())
+        _update_job(job_id, skipped_duplicates=0, skipped_bounced=0, skipped_complained=0)
+
+        provider = _create_provider(lambda: SesProvider(
+            _build_ses_client(max(10, max_in_flight)),
+            config_set,
+            _build_sesv2_client(),
+            _async_client_or_none(job_id, lambda: _build_ses_async_client(max_in_flight)) if send_engine == "async" else None,
+        ))
+        resources.callback(provider.close)
+
+        attachment_bytes = None
+        attachment_filename = None
+        if attachment_path and os.path.exists(attachment_path):
+            with open(attachment_path, "rb") as f:
+                attachment_bytes = f.read()
+            attachment_filename = os.path.basename(attachment_path)
+
+        # Load inline images for templates that need them
+        inline_images = {}
+        if email_template == "kym_template.html":
+            sign_image_path = os.path.join(BASE_DIR, "img", "sign.png")
+            if os.path.exists(sign_image_path):
+                with open(sign_image_path, "rb") as f:
+                    inline_images["signature"] = f.read()
+
+        # Bulk mode sends a stored template, which cannot carry the attachment or inline images
+        if send_mode == "bulk":
+            if not provider.capabilities.get("bulk_template"):
+                reason = f"{provider.name} does not support bulk templated sending"
+            elif attachment_bytes or inline_images:
+                reason = "bulk templated sending cannot include attachments or inline images"
+            else:
+                reason = None
+            if reason:
+                _incr_job(job_id, error={"stage": "bulk_template", "error": f"{reason}; sending one message per recipient"})
+                send_mode = "raw"
+        _update_job(job_id, send_mode=send_mode)
+
+        # Encode inline images and the attachment once; each recipient only adds headers + HTML
+        prebuilt = PrebuiltMessage(inline_images, attachment_bytes, attachment_filename)
+        prebuilt_verified = None
+
+        # Parse column mappings (JSON string from form)
+        mappings = {}
+        if column_mappings:
+            try:
+                mappings = json.loads(column_mappings)
+            except:
+                # Fallback: try to parse as default structure
+                mappings = {}
+
+        # Create reverse mapping: template_var -> csv_column
+        reverse_mapping = {v: k for k, v in mappings.items() if v}
+
+        # Auto-detect column mappings if not provided or incomplete
+        if header:
+            # Always try to find Email column (required)
+            if 'Email' not in reverse_mapping:
+                for key in header:
+                    key_lower = key.lower().strip()
+                    if key_lower in ['email', 'e-mail', 'email address']:
+                        reverse_mapping['Email'] = key
+                        break
+        
+            # Auto-detect other common columns if not mapped
+            for key in header:
+                key_lower = key.lower().strip()
+                if key_lower in ['name', 'full name', 'member name'] and 'Name' not in reverse_mapping:
+                    reverse_mapping['Name'] = key
+                elif key_lower in ['membershipid', 'membership id', 'member id', 'memberid'] and 'Membershipid' not in reverse_mapping:
+                    reverse_mapping['Membershipid'] = key
+                elif key_lower in ['mobile', 'phone', 'phone number', 'mobile number'] and 'Mobile' not in reverse_mapping:
+                    reverse_mapping['Mobile'] = key
+
+        # Start at the account's SES send rate (capped by the form value) and adapt on throttling
+        limiter = TokenBucket(max_send_rate or DEFAULT_SES_SEND_RATE)
+        try:
+            controller = AdaptiveRateController.from_limits(limiter, provider.rate_limits(), ceiling=max_send_rate)
+        except Exception as e:
+            controller = AdaptiveRateController(limiter, max_send_rate or DEFAULT_SES_SEND_RATE)
+            _incr_job(job_id, error={"stage": "get_send_quota", "error": f"Using {controller.max_rate:g}/sec without quota check: {e}"})
+        _update_job(job_id, provider=provider.name, send_engine=send_engine, send_rate=controller.rate, max_send_rate=controller.max_rate, quota_remaining=controller.remaining_24h, throttles=0)
+        stop_reason = []
+
+        def send_one(item):
+            if send_mode == "bulk":
+                return controller.call_bulk(provider.send_bulk, [(to_email, data) for _, to_email, data in item], from_email, bulk.name)
+            _, to_email, raw_message = item
+            return controller.call(provider.send_one, from_email, to_email, raw_message)
+
+        async def send_one_async(item):
+            if send_mode == "bulk":
+                return await controller.call_bulk_async(provider.send_bulk_async, [(to_email, data) for _, to_email, data in item], from_email, bulk.name)
+            _, to_email, raw_message = item
+            return await controller.call_async(provider.send_one_async, from_email, to_email, raw_message)
+
+        def on_sent(item, result, error):
+            row_index, to_email, _ = item
+            if error is None:
+                checkpoint.record(row_index, to_email, result or "")
+                _incr_job(job_id, processed=1, successes=1)
+            else:
+                controller.release()
+                if isinstance(error, QuotaExceeded) and not stop_reason:
+                    stop_reason.append(f"SES 24-hour sending quota exhausted: {error}")
+                    stages.stop()
+                _incr_job(job_id, processed=1, failures=1, error={"email": to_email, "error": str(error)})
+
+        def on_bulk_sent(chunk, results, error):
+            # One bulk chunk (throttled entries were already resent); each destination is checkpointed or failed on its own
+            _incr_job(job_id, bulk_calls=1)
+            if error is not None:
+                for entry in chunk:
+                    on_sent(entry, None, error)
+                return
+            for entry, (status, message_id, detail) in zip(chunk, results):
+                if status == "SUCCESS":
+                    on_sent(entry, message_id, None)
+                elif status == "ACCOUNT_DAILY_QUOTA_EXCEEDED":
+                    on_sent(entry, None, QuotaExceeded(f"{status}: {detail}"))
+                else:
+                    on_sent(entry, None, Exception(f"{status}: {detail}"))
+            for entry in chunk[len(results):]:
+                on_sent(entry, None, Exception("No result for this destination in the SendBulkEmail response"))
 
-    headers = {"Content-Type": "application/json", "authkey": auth_key}
-    url = "https://control.msg91.com/api/v5/email/send"
+        # Body and subject templates are compiled once; a missing or broken template fails the job up front
+        try:
+            pipeline = RenderPipeline(app.jinja_env, email_template, subject_template)
+        except Exception as e:
+            _incr_job(job_id, error={"stage": "template", "error": f"Template error in {email_template}: {e}"})
+            _update_job(job_id, status="failed")
+            return
+        bulk = None
+
+        # Sends run on a bounded pool (or event loop) paced by a shared token bucket
+        if send_engine == "async":
+            engine = AsyncSendEngine(send_one_async, limiter, max_in_flight=max_in_flight, on_close=provider.aclose)
+        else:
+            engine = SendEngine(send_one, limiter, max_in_flight=max_in_flight)
+
+        # Get email (required) - try multiple methods
+        email_col = reverse_mapping.get('Email')
+        if not email_col:
+            # Last resort: try common column names
+            for col in ['Email', 'email', 'E-mail', 'Email Address']:
+                if col in (header or []):
+                    email_col = col
+                    break
 
+        # Mapped columns, then every other column (for flexibility), then the YouTube link if provided,
+        # compiled once into column indexes for the csv.reader rows
+        plan = ColumnPlan(header or [], reverse_mapping, email_col, {'YouTubeLink': youtube_link} if youtube_link else None)
+
+        def start_bulk(template_vars):
+            """Store the job's SES template, checked against one rendered row; False if it cannot be used."""
+            nonlocal bulk
+            (subject, html_body, render_error), = pipeline.render_batch([template_vars])
+            candidate = BulkTemplate(app.jinja_env, email_template, subject_template, list(template_vars))
+            if render_error is not None or not candidate.verify(template_vars, subject, html_body):
+                reason = "the template does not render the same as an SES template"
+            else:
+                try:
+                    provider.sync_template(candidate.name, candidate.subject, candidate.html)
+                except Exception as e:
+                    reason = f"could not store the SES template: {e}"
+                else:
+                    bulk = candidate
+                    _update_job(job_id, ses_template=bulk.name, bulk_calls=0)
+                    return True
+            _incr_job(job_id, error={"stage": "bulk_template", "error": f"{reason}; sending one message per recipient"})
+            return False
+
+        if send_mode == "bulk":
+            # Checked before any row is read, with made-up values that need HTML escaping
+            with app.app_context():
+                bulk_ok = start_bulk(plan.apply([f"<{col}> & \"{col}\"" for col in header or []]))
+            if not bulk_ok:
+                send_mode = "raw"
+                _update_job(job_id, send_mode=send_mode)
+
+        # Each step below runs on its own thread, connected by bounded queues:
+        # read rows -> map variables -> render -> encode MIME -> send (or map -> batch -> send in bulk mode)
+        def map_row(item, emit):
+            row_index, row = item
+            if row_index in done_rows:
+                return
+            if not email_col:
+                _incr_job(job_id, processed=1, failures=1, error={"email": "N/A", "error": "Email column not found in CSV. Please map the email column."})
+                return
+
+            to_email = plan.email(row)
+            if not to_email:
+                _incr_job(job_id, processed=1, failures=1, error={"email": "N/A", "error": f"Email value is empty in row"})
+                return
+
+            normalized = normalize_email(to_email)
+            if seen is not None:
+                if normalized in seen:
+                    _incr_job(job_id, processed=1, skipped_duplicates=1)
+                    return
+                seen.add(normalized)
+            if suppression is not None:
+                suppressed = suppression.reason(normalized)
+                if suppressed:
+                    _incr_job(job_id, processed=1, **{"skipped_bounced" if suppressed[0] == "Bounce" else "skipped_complained": 1})
+                    return
+            emit((row_index, to_email, plan.apply(row)))
+
+        # Mapped rows are rendered in batches of `pipeline.batch_size`
+        render_chunk = []
+
+        def add_to_render_chunk(item, emit):
+            render_chunk.append(item)
+            if len(render_chunk) >= pipeline.batch_size:
+                render(emit)
+
+        def render(emit):
+            if not render_chunk:
+                return
+            results = pipeline.render_batch([template_vars for _, _, template_vars in render_chunk])
+            for (row_index, to_email, _), (subject, html_body, render_error) in zip(render_chunk, results):
+                if render_error is not None:
+                    _incr_job(job_id, processed=1, failures=1, error={"email": to_email, "error": f"Template rendering error: {str(render_error)}"})
+                else:
+                    emit((row_index, to_email, subject, html_body))
+            render_chunk.clear()
+
+        def encode(item, emit):
+            nonlocal prebuilt_verified
+            row_index, to_email, subject, html_body = item
+            if prebuilt_verified is None:
+                prebuilt_verified = prebuilt.verify(subject, from_email, to_email, html_body)
+                if not prebuilt_verified:
+                    _incr_job(job_id, error={"stage": "mime_cache", "error": "Prebuilt message did not match; building each message in full"})
+            if prebuilt_verified:
+                raw_message = prebuilt.render(subject, from_email, to_email, html_body)
+            else:
+                raw_message = build_message(subject, from_email, to_email, html_body, inline_images, attachment_bytes, attachment_filename).as_string()
+            emit((row_index, to_email, raw_message))
+
+        # Rows are not rendered in bulk mode: SES fills the stored template from each row's data
+        bulk_chunk = []
+
+        def add_to_chunk(item, emit):
+            row_index, to_email, template_vars = item
+            bulk_chunk.append((row_index, to_email, bulk.data(template_vars)))
+            if len(bulk_chunk) >= provider.capabilities["max_bulk_size"]:
+                finish_chunk(emit)
+
+        def finish_chunk(emit):
+            if bulk_chunk:
+                emit(bulk_chunk[:])
+                bulk_chunk.clear()
+
+        def send(item, emit):
+            count = len(item) if send_mode == "bulk" else 1
+            if not controller.reserve(count):
+                if not stop_reason:
+                    stop_reason.append(f"Stopped before exceeding the SES 24-hour quota of {controller.max_24h:g} emails")
+                stages.stop()
+                return
+            engine.submit(item, on_bulk_sent if send_mode == "bulk" else on_sent, tokens=count)
+
+        if send_mode == "bulk":
+            steps = [Stage("map", map_row), Stage("batch", add_to_chunk, finish_chunk), Stage("send", send)]
+        else:
+            steps = [Stage("map", map_row), Stage("render", add_to_render_chunk, render), Stage("encode", encode), Stage("send", send)]
+        stages = StagedPipeline(steps, queue_size=SES_PIPELINE_QUEUE_SIZE, thread_context=app.app_context)
+
+        def send_gauges():
+            return {
+                "stages": stages.stats(),
+                "render_rate": round(pipeline.renders_per_sec, 1),
+                "send_rate": controller.rate,
+                "throttles": controller.throttle_count,
+                "quota_remaining": controller.remaining_24h,
+            }
+
+        with engine:
+            stages.start(enumerate(rows))
+            # Stage throughput, queue depths and the send rate are written about once a second, not per message
+            while not stages.join(timeout=1.0):
+                _update_job(job_id, heartbeat=time.time(), **send_gauges())
+        _update_job(job_id, **send_gauges())
+
+    if stop_reason:
+        _update_job(job_id, status="stopped", stop_reason=stop_reason[0])
+    else:
+        _update_job(job_id, status="completed")
+
+
+def _job_is_active(job):
+    return is_active(job, JOB_STALE_SECONDS)
+
+
+def resume_ses_job(job_id):
+    """Restart an SES send job from its checkpoint, skipping rows SES already accepted."""
+    checkpoint = SendCheckpoint(job_id)
+    if not checkpoint.exists():
+        raise ValueError("No checkpoint found for this job.")
+    job = job_store.get(job_id)
+    if job and _job_is_active(job):
+        raise ValueError("Job is still running.")
+    params = checkpoint.load_params()
+    csv_path = params.pop("csv_path")
+    csv_size = params.pop("csv_size")
+    csv_mtime = params.pop("csv_mtime")
+    if not os.path.exists(csv_path) or os.path.getsize(csv_path) != csv_size or os.path.getmtime(csv_path) != csv_mtime:
+        raise ValueError("The recipients CSV for this job has been changed or removed; it cannot be resumed safely.")
+    # Marked running before the worker starts, in one step with the activity check,
+    # so two resume requests (or two gunicorn workers) cannot both start a worker
+    fields = {"type": "ses", "description": "SES send", "status": "running", "heartbeat": time.time()}
+    if job is None:
+        fields["created"] = time.time()
+    if not job_store.claim(job_id, JOB_STALE_SECONDS, **fields):
+        raise ValueError("Job is still running.")
+    thread = threading.Thread(
+        target=_ses_send_worker,
+        args=(job_id, csv_path),
+        kwargs=dict(params, resume=True),
+        daemon=True,
+    )
+    thread.start()
+
+
+def _msg91_attachment(job_id, attachment_path, attachment_mode, attachment_url):
+    """Resolve the job's attachment to `(mode, reference, inline)` JSON-encoded entries.
+
+    "url" references `attachment_url`, "hosted" serves the file from this app
+    under PUBLIC_BASE_URL, and "auto" picks "url" when a URL is given, then
+    "hosted" when PUBLIC_BASE_URL is set.
+    Otherwise, or when the reference cannot be built, the file goes inline.
+    """
+    has_file = bool(attachment_path) and os.path.exists(attachment_path)
+    inline = json.dumps(inline_attachment(attachment_path)) if has_file else None
+    filename = os.path.basename(attachment_path) if has_file else os.path.basename(urlparse(attachment_url or "").path)
+    if attachment_mode == "auto":
+        attachment_mode = "url" if attachment_url else "hosted" if PUBLIC_BASE_URL else "inline"
+    if attachment_mode == "url" and attachment_url:
+        return "url", json.dumps(url_attachment(attachment_url, filename or "attachment")), inline
+    if attachment_mode == "hosted" and PUBLIC_BASE_URL and has_file:
+        _remove_expired_attachments()
+        hosted_dir = os.path.join(HOSTED_ATTACHMENT_DIR, job_id)
+        os.makedirs(hosted_dir, exist_ok=True)
+        shutil.copyfile(attachment_path, os.path.join(hosted_dir, filename))
+        url = f"{PUBLIC_BASE_URL.rstrip('/')}/attachments/{job_id}/{quote(filename)}"
+        return "hosted", json.dumps(url_attachment(url, filename)), inline
+    return ("inline", inline, inline) if inline else (None, None, None)
+
+
+def _hosted_attachment_expired(job_dir, now=None):
+    return (now or time.time()) - os.path.getmtime(job_dir) > HOSTED_ATTACHMENT_TTL_SECONDS
+
+
+def _remove_expired_attachments():
+    """Delete hosted attachment copies older than HOSTED_ATTACHMENT_TTL_SECONDS."""
+    if not os.path.isdir(HOSTED_ATTACHMENT_DIR):
+        return
+    now = time.time()
+    for name in os.listdir(HOSTED_ATTACHMENT_DIR):
+        job_dir = os.path.join(HOSTED_ATTACHMENT_DIR, name)
+        try:
+            if _hosted_attachment_expired(job_dir, now):
+                shutil.rmtree(job_dir)
+        except OSError:
+            # Removed by another worker, or still open on Windows; tried again after the next job
+            pass
+
+
+def _is_msg91_attachment_error(status_code, detail):
+    if not 400 <= status_code < 500 or status_code in (401, 403, 429):
+        return False
+    detail = (detail or "").lower()
+    return any(hint in detail for hint in MSG91_ATTACHMENT_ERROR_HINTS)
+
+
+def _msg91_batches(rows, batch_size):
+    batch = []
     for row in rows:
-        recipient = {
+        batch.append({
             "to": [{"email": row.get("Email", "").strip(), "name": row.get("Name", "").strip()}],
             "variables": {
                 "VAR1": row.get("Name", "").strip(),
                 "VAR2": row.get("MembershipID", "").strip(),
                 "VAR3": row.get("Mobile", "").strip(),
             },
-        }
-        recipients_batch.append(recipient)
-
-        if len(recipients_batch) >= batch_size:
-            payload = {"recipients": recipients_batch, "from": {"email": from_email}, "domain": domain, "template_id": template_id}
-            if attachment:
-                payload["attachments"] = [attachment]
-            try:
-                resp = requests.post(url, headers=headers, data=json.dumps(payload), timeout=60)
-                if resp.status_code >= 200 and resp.status_code < 300:
-                    _update_job(job_id, processed=job_states[job_id]["processed"] + len(recipients_batch), successes=job_states[job_id]["successes"] + len(recipients_batch))
-                else:
-                    errors = job_states[job_id].get("errors", [])
-                    errors.append({"batch": len(recipients_batch), "error": f"HTTP {resp.status_code}: {resp.text[:300]}"})
-                    _update_job(job_id, processed=job_states[job_id]["processed"] + len(recipients_batch), failures=job_states[job_id]["failures"] + len(recipients_batch), errors=errors)
-            except Exception as e:
-                errors = job_states[job_id].get("errors", [])
-                errors.append({"batch": len(recipients_batch), "error": str(e)})
-                _update_job(job_id, processed=job_states[job_id]["processed"] + len(recipients_batch), failures=job_states[job_id]["failures"] + len(recipients_batch), errors=errors)
-            recipients_batch = []
-            time.sleep(delay_between_batches)
-
-    if recipients_batch:
-        payload = {"recipients": recipients_batch, "from": {"email": from_email}, "domain": domain, "template_id": template_id}
-        if attachment:
-            payload["attachments"] = [attachment]
-        try:
-            resp = requests.post(url, headers=headers, data=json.dumps(payload), timeout=60)
-            if resp.status_code >= 200 and resp.status_code < 300:
-                _update_job(job_id, processed=job_states[job_id]["processed"] + len(recipients_batch), successes=job_states[job_id]["successes"] + len(recipients_batch))
-            else:
-                errors = job_states[job_id].get("errors", [])
-                errors.append({"batch": len(recipients_batch), "error": f"HTTP {resp.status_code}: {resp.text[:300]}"})
-                _update_job(job_id, processed=job_states[job_id]["processed"] + len(recipients_batch), failures=job_states[job_id]["failures"] + len(recipients_batch), errors=errors)
-        except Exception as e:
-            errors = job_states[job_id].get("errors", [])
-            errors.append({"batch": len(recipients_batch), "error": str(e)})
-            _update_job(job_id, processed=job_states[job_id]["processed"] + len(recipients_batch), failures=job_states[job_id]["failures"] + len(recipients_batch), errors=errors)
+        })
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@_fail_job_on_error
+def _msg91_send_worker(job_id, csv_path, attachment_path, template_id, from_email, domain, auth_key, batch_size, delay_between_batches, concurrency=DEFAULT_MSG91_CONCURRENCY, attachment_mode="inline", attachment_url=None, send_engine="thread"):
+    _update_job(job_id, status="running", processed=0, successes=0, failures=0, errors=[], batches=0, retries=0, concurrency=concurrency, send_engine=send_engine)
+    rows = iter_csv_rows(csv_path)
+    _count_rows_async(job_id, csv_path)
+
+    mode, reference, inline = _msg91_attachment(job_id, attachment_path, attachment_mode, attachment_url)
+    attachment = {"mode": mode, "json": reference}
+    attachment_lock = threading.Lock()
+    # Every batch that references the file instead of embedding it skips this many request bytes
+    bytes_saved_per_batch = len(inline) - len(reference) if inline and mode != "inline" else 0
+    _update_job(job_id, attachment_mode=mode, attachment_bytes_saved=0)
+    provider = _create_provider(lambda: Msg91Provider(
+        Msg91Client(auth_key, session=create_session(concurrency)),
+        from_email,
+        domain,
+        template_id,
+        _async_client_or_none(job_id, lambda: AsyncMsg91Client(auth_key, pool_size=concurrency)) if send_engine == "async" else None,
+    ))
+    _update_job(job_id, provider=provider.name)
+    # delay_between_batches spaces out batch starts (0: as fast as `concurrency` allows), so slow responses no longer add to it
+    limiter = TokenBucket(1 / delay_between_batches if delay_between_batches > 0 else 0, capacity=1)
+    latency_lock = threading.Lock()
+    # avg covers every batch; p95 and max cover the most recent LATENCY_WINDOW batches
+    latencies = deque(maxlen=LATENCY_WINDOW)
+    latency_total = [0.0, 0]
+
+    def switch_to_inline(mode, status_code, detail):
+        """True if MSG91 rejected the referenced file (e.g. URL not reachable); it is embedded from now on.
+
+        Other client errors (bad authkey, invalid recipient, ...) leave the mode alone and fail the batch.
+        """
+        if not (mode in ("url", "hosted") and inline and _is_msg91_attachment_error(status_code, detail)):
+            return False
+        with attachment_lock:
+            if attachment["mode"] != "inline":
+                attachment.update(mode="inline", json=inline)
+                _update_job(job_id, attachment_mode="inline", attachment_fallback=f"HTTP {status_code}: {detail[:300]}")
+        return True
+
+    def send_one(batch):
+        mode, attachment_json = attachment["mode"], attachment["json"]
+        status_code, detail, attempts, seconds = provider.send_batch(batch, attachment_json)
+        if switch_to_inline(mode, status_code, detail):
+            status_code, detail, retry_attempts, retry_seconds = provider.send_batch(batch, inline)
+            return status_code, detail, attempts + retry_attempts, seconds + retry_seconds, 0
+        return status_code, detail, attempts, seconds, bytes_saved_per_batch if mode != "inline" else 0
+
+    async def send_one_async(batch):
+        mode, attachment_json = attachment["mode"], attachment["json"]
+        status_code, detail, attempts, seconds = await provider.send_batch_async(batch, attachment_json)
+        if switch_to_inline(mode, status_code, detail):
+            status_code, detail, retry_attempts, retry_seconds = await provider.send_batch_async(batch, inline)
+            return status_code, detail, attempts + retry_attempts, seconds + retry_seconds, 0
+        return status_code, detail, attempts, seconds, bytes_saved_per_batch if mode != "inline" else 0
+
+    def on_sent(batch, result, error):
+        size = len(batch)
+        if error is not None:
+            _incr_job(job_id, processed=size, failures=size, batches=1, error={"batch": size, "error": str(error)})
+            return
+        status_code, detail, attempts, seconds, bytes_saved = result
+        with latency_lock:
+            latencies.append(seconds)
+            latency_total[0] += seconds
+            latency_total[1] += 1
+            ordered = sorted(latencies)
+            latency = {
+                "last": round(seconds, 3),
+                "avg": round(latency_total[0] / latency_total[1], 3),
+                "p95": round(ordered[int(0.95 * (len(ordered) - 1))], 3),
+                "max": round(ordered[-1], 3),
+            }
+            _update_job(job_id, batch_seconds=latency)
+        if 200 <= status_code < 300:
+            _incr_job(job_id, processed=size, successes=size, batches=1, retries=attempts - 1, attachment_bytes_saved=bytes_saved)
+        else:
+            _incr_job(job_id, processed=size, failures=size, batches=1, retries=attempts - 1, error={"batch": size, "error": f"HTTP {status_code} after {attempts} attempt(s): {detail[:300]}"})
+
+    if send_engine == "async":
+        engine = AsyncSendEngine(send_one_async, limiter, max_in_flight=concurrency, on_close=provider.aclose)
+    else:
+        engine = SendEngine(send_one, limiter, max_in_flight=concurrency)
+    try:
+        with engine:
+            for batch in _msg91_batches(rows, batch_size):
+                engine.submit(batch, on_sent)
+    finally:
+        provider.close()
+        _remove_expired_attachments()
 
     _update_job(job_id, status="completed")
 
 
-def _s3_list_all_keys(s3_client, bucket, prefix):
-    keys = []
-    paginator = s3_client.get_paginator("list_objects_v2")
-    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-        for obj in page.get("Contents", []):
-            keys.append(obj["Key"])
-    return keys
+def _campaign_window(first_sent, last_sent):
+    """UTC days `(start, end)` a campaign's events can be found in, given its first and last send times."""
+    start = datetime.utcfromtimestamp(first_sent).replace(hour=0, minute=0, second=0, microsecond=0)
+    end = datetime.utcfromtimestamp(last_sent) + timedelta(days=REPORT_CAMPAIGN_TRAILING_DAYS)
+    return start, min(end, datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
 
 
-def _report_worker(job_id, bucket, start_date, end_date, input_csv_path, output_csv_path):
+def _report_worker(job_id, bucket, start_date, end_date, input_csv_path, output_csv_path, campaign_job_id=None):
     _update_job(job_id, status="running", processed=0, successes=0, failures=0, errors=[], total=0)
 
+    # A campaign report joins events on the MessageIds in the SES job's send ledger
+    # and only scans the days that campaign was sending
+    message_ids = None
+    if campaign_job_id:
+        message_ids, first_sent, last_sent = SendCheckpoint(campaign_job_id).message_index()
+        if not message_ids:
+            _incr_job(job_id, error={"stage": "ledger", "error": f"No sent messages recorded for job {campaign_job_id}"})
+            _update_job(job_id, status="failed")
+            return
+        start_date, end_date = _campaign_window(first_sent, last_sent)
+        _update_job(job_id, campaign_job_id=campaign_job_id, campaign_messages=len(message_ids),
+                    date_window=[start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")])
+
+    timings = {}
+    stage_started = time.perf_counter()
+
     try:
         recipients = []
         with open(input_csv_path, newline="", encoding="utf-8-sig") as f:
@@ -374,78 +792,68 @@ def _report_worker(job_id, bucket, start_date, end_date, input_csv_path, output_
                         "membership_id": row.get(membership_id_col, "").strip() if membership_id_col else "",
                         "mobile": row.get(mobile_col, "").strip() if mobile_col else "",
                     })
-        _update_job(job_id, total=len(recipients))
+        timings["read_csv"] = round(time.perf_counter() - stage_started, 3)
+        _update_job(job_id, total=len(recipients), timings=timings)
     except Exception as e:
+        _incr_job(job_id, error={"stage": "read_csv", "error": str(e)})
         _update_job(job_id, status="failed")
-        errors = job_states[job_id].get("errors", [])
-        errors.append({"stage": "read_csv", "error": str(e)})
-        _update_job(job_id, errors=errors)
         return
 
-    s3 = boto3.client("s3", region_name=os.environ.get("SES_REGION", "ap-south-1"))
+    # SES_EVENT_LOCAL_DIR reads a local copy of the bucket (e.g. from `aws s3 sync`) instead of S3
+    local_dir = os.environ.get("SES_EVENT_LOCAL_DIR")
+    if local_dir:
+        client_factory = functools.partial(LocalS3, local_dir)
+    else:
+        client_factory = functools.partial(boto3.client, "s3", region_name=os.environ.get("SES_REGION", "ap-south-1"))
 
-    # Build all date prefixes like ses/YYYY/MM/DD/
-    date_prefixes = []
-    day = start_date
-    while day <= end_date:
-        date_prefixes.append(f"ses/{day.strftime('%Y/%m/%d/')}")
-        day += timedelta(days=1)
+    fetch_workers = int(os.environ.get("REPORT_FETCH_WORKERS", "16"))
+    processes = int(os.environ.get("REPORT_PROCESSES", "0"))
+    # e.g. "Bounce,Complaint,Delivery,Send" to skip decoding Open/Click events on large ranges
+    event_types = set(filter(None, (t.strip() for t in os.environ.get("REPORT_EVENT_TYPES", "").split(",")))) or None
 
-    email_events = {}
+    def on_fetch_progress(stats):
+        timings["list"] = round(stats["list_seconds"], 3)
+        _update_job(job_id, objects_total=stats.get("objects_total", 0), objects_done=stats["objects"] + stats["skipped_objects"], events=stats["events"], timings=timings)
+
+    # Only the best-status event per email is kept, not every event
+    reducer = EventReducer()
     try:
-        for prefix in date_prefixes:
-            keys = _s3_list_all_keys(s3, bucket, prefix)
-            for key in keys:
-                obj = s3.get_object(Bucket=bucket, Key=key)
-                body = obj["Body"].read().decode("utf-8", errors="ignore")
-                for line in body.splitlines():
-                    if not line.strip():
-                        continue
-                    try:
-                        event = json.loads(line)
-                        event_type = event.get("eventType", "Unknown")
-                        mail = event.get("mail", {})
-                        destinations = mail.get("destination", [])
-                        message_id = mail.get("messageId", "")
-                        if not destinations or not message_id:
-                            continue
-                        error_msg = ""
-                        if event_type == "Bounce":
-                            error_msg = event.get("bounce", {}).get("diagnosticCode", "Unknown bounce reason")
-                        elif event_type == "Complaint":
-                            error_msg = event.get("complaint", {}).get("complaintFeedbackType", "Unknown complaint")
-                        elif event_type == "DeliveryDelay":
-                            delayed = event.get("deliveryDelay", {}).get("delayedRecipients", [{}])
-                            error_msg = delayed[0].get("diagnosticCode", "Unknown delay reason") if delayed else "Unknown delay reason"
-                        elif event_type in ["Reject", "HardBounce"]:
-                            error_msg = event.get("bounce", {}).get("diagnosticCode", "Unknown reason")
-
-                        for email in destinations:
-                            email_key = email.lower().strip()
-                            if not email_key:
-                                continue
-                            email_events.setdefault(email_key, []).append({"status": event_type, "message_id": message_id, "error": error_msg})
-                    except json.JSONDecodeError:
-                        # Ignore malformed JSON lines
-                        continue
-                    except Exception:
-                        # Ignore any unexpected line-level errors and continue
-                        continue
+        # List prefixes and download objects concurrently; bodies are parsed as line streams
+        stage_started = time.perf_counter()
+        prefixes = date_prefixes(start_date, end_date)
+        if processes > 1:
+            # Parsing is CPU-bound; worker processes each reduce part of the objects and the parts are merged
+            reducer, fetch_stats = reduce_events_in_processes(client_factory, bucket, prefixes, processes, store_path=EVENT_CACHE_PATH, event_types=event_types, on_progress=on_fetch_progress, message_ids=message_ids)
+        else:
+            with EventStore() as store:
+                events_by_object, fetch_stats = fetch_events(client_factory(), bucket, prefixes, max_workers=fetch_workers, on_progress=on_fetch_progress, store=store, event_types=event_types)
+                for _, events in events_by_object:
+                    reducer.add_events(events if message_ids is None else join_on_message_ids(events, message_ids))
+        _update_job(job_id, cached_objects=fetch_stats["cached_objects"], skipped_objects=fetch_stats["skipped_objects"], event_counts=reducer.type_totals())
+        # Objects that could not be read are left out of the report, as report.py always did
+        for error in fetch_stats["object_errors"]:
+            _incr_job(job_id, error={"stage": "fetch_object", "error": error})
+        # Hard bounces and complaints found by the report are not mailed again by later SES jobs
+        with SuppressionIndex() as suppression:
+            _update_job(job_id, suppression_added=suppression.add_from_reducer(reducer))
+        timings["fetch"] = round(time.perf_counter() - stage_started - fetch_stats["list_seconds"], 3)
+        timings["fetch_worker_seconds"] = round(fetch_stats["fetch_seconds"], 3)
+        timings["parse_worker_seconds"] = round(fetch_stats["parse_seconds"], 3)
+        if fetch_stats["parse_seconds"]:
+            _update_job(job_id, json_backend=JSON_BACKEND, parse_mb_per_sec=round(fetch_stats["bytes"] / fetch_stats["parse_seconds"] / 1e6, 1), skipped_lines=fetch_stats["skipped_lines"])
+        stage_started = time.perf_counter()
         # write report
         with open(output_csv_path, "w", newline="", encoding="utf-8-sig") as out:
             writer = csv.writer(out)
             writer.writerow(["Email", "Name", "Membership ID", "Mobile", "Status", "Message ID", "Error"])
             for r in recipients:
-                events = email_events.get(r["email"], [{"status": "Unknown", "message_id": "", "error": "No event data"}])
-                # priority mapping
-                priority = {"Bounce": 5, "Complaint": 4, "Delivery": 3, "DeliveryDelay": 2, "Send": 1}
-                latest = max(events, key=lambda e: priority.get(e["status"], -1))
-                writer.writerow([r["email"], r["name"], r["membership_id"], r["mobile"], latest["status"], latest["message_id"], latest["error"]])
-        _update_job(job_id, status="completed", output_path=output_csv_path)
+                status, message_id, error_msg = reducer.latest(r["email"])
+                writer.writerow([r["email"], r["name"], r["membership_id"], r["mobile"], status, message_id, error_msg])
+        timings["write"] = round(time.perf_counter() - stage_started, 3)
+        _update_job(job_id, status="completed", output_path=output_csv_path, timings=timings)
     except Exception as e:
-        errors = job_states[job_id].get("errors", [])
-        errors.append({"stage": "s3_or_write", "error": str(e)})
-        _update_job(job_id, status="failed", errors=errors)
+        _incr_job(job_id, error={"stage": "s3_or_write", "error": str(e)})
+        _update_job(job_id, status="failed")
 
 
 @app.route("/")
@@ -461,22 +869,13 @@ def preview_csv():
         return jsonify({"error": "No CSV file provided"}), 400
 
     try:
-        csv_filename = secure_filename(csv_file.filename or f"preview-{uuid.uuid4().hex}.csv")
-        csv_path = os.path.join(UPLOAD_DIR, csv_filename)
-        csv_file.save(csv_path)
-
-        rows = _read_csv_rows(csv_path)
+        # Only the header and the first few rows are read, straight from the upload stream
+        sample_size = min(int(request.form.get("rows") or 1), 50)
+        columns, rows = read_csv_preview(csv_file.stream, sample_size)
         if not rows:
             return jsonify({"error": "CSV file is empty"}), 400
 
-        columns = list(rows[0].keys())
-        # Clean up preview file
-        try:
-            os.remove(csv_path)
-        except:
-            pass
-
-        return jsonify({"columns": columns, "sample_row": rows[0] if rows else {}})
+        return jsonify({"columns": columns, "sample_row": rows[0], "sample_rows": rows})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -490,6 +889,10 @@ def send_ses():
     default_from = os.environ.get("SES_FROM_EMAIL", "valuervijai@romexconsultancy.com")
     default_youtube = os.environ.get("YOUTUBE_LINK", "https://www.youtube.com/watch?v=Nx-iCLXUYDw&feature=youtu.be")
     default_config_set = os.environ.get("SES_CONFIG_SET", "")
+    default_send_rate = os.environ.get("SES_MAX_SEND_RATE", "")
+    default_in_flight = int(os.environ.get("SES_MAX_IN_FLIGHT", "14"))
+    default_send_mode = os.environ.get("SES_SEND_MODE", "raw")
+    default_send_engine = os.environ.get("SEND_ENGINE", "thread")
 
     if request.method == "POST":
         csv_file = request.files.get("csv_file")
@@ -500,10 +903,24 @@ def send_ses():
         config_set = request.form.get("config_set") or default_config_set
         email_template = request.form.get("email_template") or "email_template.html"
         column_mappings = request.form.get("column_mappings") or "{}"
+        max_send_rate = request.form.get("max_send_rate") or default_send_rate
+        max_send_rate = float(max_send_rate) if max_send_rate else None
+        max_in_flight = int(request.form.get("max_in_flight") or default_in_flight)
+        skip_duplicates = bool(request.form.get("skip_duplicates"))
+        skip_suppressed = bool(request.form.get("skip_suppressed"))
+        send_mode = request.form.get("send_mode") or default_send_mode
+        if send_mode not in SES_SEND_MODES:
+            send_mode = "raw"
+        send_engine = request.form.get("send_engine") or default_send_engine
+        if send_engine not in SEND_ENGINES:
+            send_engine = "thread"
 
         if not csv_file:
             flash("CSV file is required.", "danger")
             return redirect(request.url)
+        if send_mode == "bulk" and attachment_file and attachment_file.filename:
+            flash("Bulk template mode cannot send attachments; remove the attachment or choose one message per recipient.", "danger")
+            return redirect(request.url)
 
         csv_filename = secure_filename(csv_file.filename or f"recipients-{uuid.uuid4().hex}.csv")
         csv_path = os.path.join(UPLOAD_DIR, csv_filename)
@@ -516,15 +933,10 @@ def send_ses():
             attachment_file.save(attachment_path)
 
         job_id = uuid.uuid4().hex
-        job_states[job_id] = {
-            "id": job_id,
-            "type": "ses",
-            "created": time.time(),
-            "description": "SES send",
-        }
+        job_store.create(job_id, type="ses", created=time.time(), description="SES send")
         thread = threading.Thread(
             target=_ses_send_worker,
-            args=(job_id, csv_path, attachment_path, subject_template, from_email, config_set, youtube_link, email_template, column_mappings),
+            args=(job_id, csv_path, attachment_path, subject_template, from_email, config_set, youtube_link, email_template, column_mappings, max_send_rate, max_in_flight, skip_duplicates, skip_suppressed, send_mode, send_engine),
             daemon=True,
         )
         thread.start()
@@ -536,6 +948,10 @@ def send_ses():
         default_from=default_from,
         default_youtube=default_youtube,
         default_config_set=default_config_set,
+        default_send_rate=default_send_rate,
+        default_in_flight=default_in_flight,
+        default_send_mode=default_send_mode,
+        default_send_engine=default_send_engine,
     )
 
 
@@ -545,7 +961,10 @@ def send_msg91():
     default_domain = os.environ.get("MSG91_DOMAIN", "romexconsultancy.com")
     default_template_id = os.environ.get("MSG91_TEMPLATE_ID", "")
     default_batch_size = int(os.environ.get("MSG91_BATCH_SIZE", "100"))
-    default_delay = int(os.environ.get("MSG91_DELAY_BETWEEN_BATCHES", "2"))
+    default_delay = float(os.environ.get("MSG91_DELAY_BETWEEN_BATCHES", "0"))
+    default_concurrency = int(os.environ.get("MSG91_CONCURRENCY", str(DEFAULT_MSG91_CONCURRENCY)))
+    default_attachment_mode = os.environ.get("MSG91_ATTACHMENT_MODE", "auto")
+    default_send_engine = os.environ.get("SEND_ENGINE", "thread")
 
     if request.method == "POST":
         csv_file = request.files.get("test-mails.csv")
@@ -554,7 +973,15 @@ def send_msg91():
         from_email = request.form.get("from_email") or default_from
         domain = request.form.get("domain") or default_domain
         batch_size = int(request.form.get("batch_size") or default_batch_size)
-        delay_between_batches = int(request.form.get("delay_between_batches") or default_delay)
+        delay_between_batches = max(0.0, float(request.form.get("delay_between_batches") or default_delay))
+        concurrency = max(1, int(request.form.get("concurrency") or default_concurrency))
+        attachment_url = (request.form.get("attachment_url") or "").strip()
+        attachment_mode = request.form.get("attachment_mode") or default_attachment_mode
+        if attachment_mode not in MSG91_ATTACHMENT_MODES:
+            attachment_mode = "auto"
+        send_engine = request.form.get("send_engine") or default_send_engine
+        if send_engine not in SEND_ENGINES:
+            send_engine = "thread"
         auth_key = os.environ.get("MSG91_AUTH_KEY")
 
         if not auth_key:
@@ -578,15 +1005,10 @@ def send_msg91():
             attachment_file.save(attachment_path)
 
         job_id = uuid.uuid4().hex
-        job_states[job_id] = {
-            "id": job_id,
-            "type": "msg91",
-            "created": time.time(),
-            "description": "MSG91 send",
-        }
+        job_store.create(job_id, type="msg91", created=time.time(), description="MSG91 send")
         thread = threading.Thread(
             target=_msg91_send_worker,
-            args=(job_id, csv_path, attachment_path, template_id, from_email, domain, auth_key, batch_size, delay_between_batches),
+            args=(job_id, csv_path, attachment_path, template_id, from_email, domain, auth_key, batch_size, delay_between_batches, concurrency, attachment_mode, attachment_url, send_engine),
             daemon=True,
         )
         thread.start()
@@ -599,6 +1021,11 @@ def send_msg91():
         default_template_id=default_template_id,
         default_batch_size=default_batch_size,
         default_delay=default_delay,
+        default_concurrency=default_concurrency,
+        default_attachment_mode=default_attachment_mode,
+        default_send_engine=default_send_engine,
+        attachment_modes=MSG91_ATTACHMENT_MODES,
+        public_base_url=PUBLIC_BASE_URL,
     )
 
 
@@ -610,27 +1037,39 @@ def report():
         start_date_str = request.form.get("start_date")
         end_date_str = request.form.get("end_date")
         input_csv = request.files.get("input_csv")
-
-        if not input_csv:
+        campaign_job_id = (request.form.get("campaign_job_id") or "").strip() or None
+
+        campaign = None
+        if campaign_job_id:
+            campaign = SendCheckpoint(campaign_job_id)
+            if secure_filename(campaign_job_id) != campaign_job_id or not campaign.exists():
+                flash(f"No SES send job {campaign_job_id} found.", "danger")
+                return redirect(request.url)
+        if not input_csv and not campaign:
             flash("Input CSV is required.", "danger")
             return redirect(request.url)
-        if not start_date_str or not end_date_str:
+        if (not start_date_str or not end_date_str) and not campaign:
             flash("Start and End dates are required.", "danger")
             return redirect(request.url)
 
-        start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
-        end_date = datetime.strptime(end_date_str, "%Y-%m-%d")
+        # For a campaign the dates come from its send ledger
+        start_date = datetime.strptime(start_date_str, "%Y-%m-%d") if start_date_str else None
+        end_date = datetime.strptime(end_date_str, "%Y-%m-%d") if end_date_str else None
 
-        input_csv_name = secure_filename(input_csv.filename or f"input-{uuid.uuid4().hex}.csv")
-        input_csv_path = os.path.join(UPLOAD_DIR, input_csv_name)
-        input_csv.save(input_csv_path)
+        if input_csv:
+            input_csv_name = secure_filename(input_csv.filename or f"input-{uuid.uuid4().hex}.csv")
+            input_csv_path = os.path.join(UPLOAD_DIR, input_csv_name)
+            input_csv.save(input_csv_path)
+        else:
+            # Default to the recipients CSV the campaign was sent from
+            input_csv_path = campaign.load_params()["csv_path"]
 
         out_name = f"email_campaign_report-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.csv"
         out_path = os.path.join(GENERATED_DIR, out_name)
 
         job_id = uuid.uuid4().hex
-        job_states[job_id] = {"id": job_id, "type": "report", "created": time.time(), "description": "Generate report"}
-        thread = threading.Thread(target=_report_worker, args=(job_id, bucket, start_date, end_date, input_csv_path, out_path), daemon=True)
+        job_store.create(job_id, type="report", created=time.time(), description="Generate report")
+        thread = threading.Thread(target=_report_worker, args=(job_id, bucket, start_date, end_date, input_csv_path, out_path, campaign_job_id), daemon=True)
         thread.start()
         return redirect(url_for("progress", job_id=job_id))
 
@@ -639,21 +1078,96 @@ def report():
 
 @app.route("/progress/<job_id>")
 def progress(job_id):
-    job = job_states.get(job_id)
-    if not job:
+    if job_id not in job_store:
         flash("Job not found", "danger")
         return redirect(url_for("index"))
     return render_template("progress.html", job_id=job_id)
 
 
+def _job_status(job_id, errors_since=None):
+    job = job_store.get(job_id, errors_since=errors_since)
+    if job:
+        job["resumable"] = job.get("type") == "ses" and not _job_is_active(job) and (job.get("status") != "completed" or job.get("failures", 0) > 0)
+    return job
+
+
 @app.route("/status/<job_id>")
 def status(job_id):
-    job = job_states.get(job_id)
+    # ?since=<error_cursor> returns only the errors recorded after the client's last poll
+    job = _job_status(job_id, errors_since=request.args.get("since", type=int))
     if not job:
         return jsonify({"error": "not found"}), 404
     return jsonify(job)
 
 
+def _progress_events(job_id, since):
+    """Yield SSE messages with the job status whenever it changes, coalesced to PROGRESS_UPDATES_PER_SEC."""
+    interval = 1 / max(PROGRESS_UPDATES_PER_SEC, 0.1)
+    deadline = time.monotonic() + PROGRESS_STREAM_SECONDS
+    last_state = None
+    last_sent = time.monotonic()
+    yield "retry: 1000\n\n"
+    while time.monotonic() < deadline:
+        job = _job_status(job_id, errors_since=since)
+        if not job:
+            yield f"event: missing\ndata: {json.dumps({'error': 'not found'})}\n\n"
+            return
+        # New errors always move error_cursor, so the error list itself need not be compared
+        state = json.dumps({k: v for k, v in job.items() if k != "errors"}, sort_keys=True)
+        if state != last_state:
+            # The id is the error cursor, so a reconnecting browser (Last-Event-ID) skips errors it has seen
+            since = job["error_cursor"]
+            yield f"id: {since}\ndata: {json.dumps(job)}\n\n"
+            last_state = state
+            last_sent = time.monotonic()
+            if job.get("status") in JOB_DONE_STATUSES:
+                return
+        elif time.monotonic() - last_sent >= PROGRESS_KEEPALIVE_SECONDS:
+            yield ": keepalive\n\n"
+            last_sent = time.monotonic()
+        time.sleep(interval)
+
+
+@app.route("/events/<job_id>")
+def progress_events(job_id):
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", type=int)
+    return Response(
+        _progress_events(job_id, since),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/resume/<job_id>", methods=["POST"])
+def resume(job_id):
+    try:
+        resume_ses_job(job_id)
+    except ValueError as e:
+        flash(str(e), "danger")
+    return redirect(url_for("progress", job_id=job_id))
+
+
+@app.route("/errors/<job_id>.csv")
+def download_errors(job_id):
+    path = _error_log_path(secure_filename(job_id))
+    if not os.path.exists(path):
+        flash("No errors recorded for this job", "info")
+        return redirect(url_for("progress", job_id=job_id))
+    return send_file(path, as_attachment=True, download_name=f"errors-{job_id}.csv")
+
+
+@app.route("/attachments/<job_id>/<filename>")
+def hosted_attachment(job_id, filename):
+    # Fetched by MSG91 for jobs in "hosted" attachment mode
+    job_dir = os.path.join(HOSTED_ATTACHMENT_DIR, secure_filename(job_id))
+    path = os.path.join(job_dir, secure_filename(filename))
+    if not os.path.exists(path) or _hosted_attachment_expired(job_dir):
+        return jsonify({"error": "not found"}), 404
+    return send_file(path)
+
+
 @app.route("/download/<path:filename>")
 def download(filename):
     path = os.path.join(GENERATED_DIR, filename)
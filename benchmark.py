@@ -0,0 +1,659 @@
+"""Benchmarks for the CSV, render, MIME, send and report pipelines.
+
+Generates synthetic member CSVs and SES event JSON-lines objects, times each
+stage and writes the results as JSON. Nothing touches AWS or MSG91: sends go
+through FakeProvider or a local stub HTTP server, and S3 is served from local files.
+
+    python benchmark.py --rows 100000
+    python benchmark.py --only csv_ingest,render --baseline generated/benchmarks/last.json
+    python benchmark.py --only stub_ses_thread,stub_ses_async --stub-concurrency 50,200,500
+"""
+import argparse
+import asyncio
+import contextlib
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+# The app's stores are pointed at a scratch directory before anything imports them.
+# Worker processes re-import this module and inherit the directory through the environment.
+_WORK_DIR = os.environ.get("SES_BENCH_WORK_DIR") or tempfile.mkdtemp(prefix="ses-bench-")
+os.environ["SES_BENCH_WORK_DIR"] = _WORK_DIR
+os.environ["JOB_STORE"] = "memory"
+os.environ["SES_EVENT_CACHE_PATH"] = os.path.join(_WORK_DIR, "ses_events.sqlite3")
+os.environ["SUPPRESSION_DB_PATH"] = os.path.join(_WORK_DIR, "suppression.sqlite3")
+
+import app as webapp  # noqa: E402
+from csv_stream import ColumnPlan, iter_csv_rows, iter_csv_tuples  # noqa: E402
+from event_store import DEFAULT_PATH as EVENT_CACHE_PATH  # noqa: E402
+from local_s3 import LocalS3  # noqa: E402
+from mime_cache import PrebuiltMessage, build_message  # noqa: E402
+from msg91_client import AsyncMsg91Client, Msg91Client, create_session  # noqa: E402
+from providers import FakeProvider, Msg91Provider, SesProvider  # noqa: E402
+from render_pipeline import RenderPipeline  # noqa: E402
+from send_engine import AdaptiveRateController, AsyncSendEngine, SendEngine, TokenBucket  # noqa: E402
+from ses_async import AsyncSesClient  # noqa: E402
+from ses_events import JSON_BACKEND, EventReducer, date_prefixes, parse_lines  # noqa: E402
+
+
+BENCH_DATE = datetime(2025, 10, 16)
+BENCH_BUCKET = "bench-bucket"
+FROM_EMAIL = "bench@example.com"
+SUBJECT_TEMPLATE = "{Name} - campaign update ({Membershipid})"
+EVENT_MIX = [("Send", 40), ("Delivery", 35), ("Open", 10), ("Click", 5), ("DeliveryDelay", 3), ("Bounce", 4), ("Complaint", 3)]
+
+
+# -------- Synthetic data --------
+
+def member_email(i):
+    return f"member{i}@example.com"
+
+
+def generate_members_csv(path, rows, seed=1, extra_columns=0):
+    """Member CSV; `extra_columns` adds unmapped columns like "Extra Field_1" (wide exports)."""
+    rng = random.Random(seed)
+    extra = [f"Extra Field_{n}" for n in range(extra_columns)]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Email", "Name", "MembershipID", "Mobile"] + extra)
+        for i in range(rows):
+            writer.writerow([member_email(i), f"Member {i}", f"F-{i:07d}", f"9{rng.randrange(10**9):09d}"]
+                            + [f"value {i}-{n}" for n in range(extra_columns)])
+    return path
+
+
+def synthetic_event(rng, email, event_type, when):
+    mail = {"messageId": f"0109{rng.getrandbits(64):016x}", "destination": [email], "timestamp": when.isoformat() + "Z"}
+    # Real events carry the message headers too, which dominate the line size
+    mail["headers"] = [{"name": name, "value": value} for name, value in (
+        ("From", FROM_EMAIL), ("To", email), ("Subject", "Campaign update " * 4), ("MIME-Version", "1.0"),
+        ("Content-Type", 'multipart/related; boundary="===============%019d=="' % rng.getrandbits(60)),
+    )]
+    mail["commonHeaders"] = {"from": [FROM_EMAIL], "to": [email], "subject": "Campaign update " * 4}
+    event = {"eventType": event_type, "mail": mail}
+    detail_key = event_type[:1].lower() + event_type[1:]
+    detail = {"timestamp": (when + timedelta(seconds=rng.randrange(600))).isoformat() + "Z"}
+    if event_type == "Bounce":
+        detail["bounceType"] = "Permanent"
+        detail["bouncedRecipients"] = [{"emailAddress": email, "status": "5.1.1", "diagnosticCode": "smtp; 550 5.1.1 user unknown"}]
+    elif event_type == "Complaint":
+        detail["complaintFeedbackType"] = "abuse"
+    elif event_type == "DeliveryDelay":
+        detail["delayedRecipients"] = [{"diagnosticCode": "smtp; 421 try again later"}]
+    event[detail_key] = detail
+    return event
+
+
+def generate_event_objects(directory, events, members, objects=20, compress=True, seed=2):
+    """Write `events` SES events for `members` recipients as Firehose-style objects under directory/ses/Y/M/D/."""
+    rng = random.Random(seed)
+    types = [event_type for event_type, weight in EVENT_MIX for _ in range(weight)]
+    prefix = date_prefixes(BENCH_DATE, BENCH_DATE)[0]
+    os.makedirs(os.path.join(directory, prefix), exist_ok=True)
+    per_object = max(1, events // objects)
+    written = 0
+    total_bytes = 0
+    for n in range(objects):
+        count = per_object if n < objects - 1 else events - written
+        lines = []
+        for _ in range(count):
+            email = member_email(rng.randrange(members))
+            lines.append(json.dumps(synthetic_event(rng, email, rng.choice(types), BENCH_DATE)))
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        total_bytes += len(data)
+        name = f"{prefix}bench-stream-{n:05d}" + (".gz" if compress else "")
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(gzip.compress(data, compresslevel=5) if compress else data)
+        written += count
+    return total_bytes
+
+
+def _event_lines(root):
+    lines = []
+    for dirpath, _, filenames in os.walk(os.path.join(root, "ses")):
+        for filename in sorted(filenames):
+            with open(os.path.join(dirpath, filename), "rb") as f:
+                data = f.read()
+            if data[:2] == b"\x1f\x8b":
+                data = gzip.decompress(data)
+            lines.extend(data.splitlines(keepends=True))
+    return lines
+
+
+# -------- Benchmarks --------
+
+def _result(items, seconds, **extra):
+    result = {"items": items, "seconds": round(seconds, 4), "per_sec": round(items / seconds, 1) if seconds else None}
+    result.update(extra)
+    return result
+
+
+def _template_vars(row):
+    return {"Name": row["Name"], "Membershipid": row["MembershipID"], "Mobile": row["Mobile"], "YouTubeLink": "https://youtu.be/example"}
+
+
+def bench_csv_ingest(ctx):
+    started = time.perf_counter()
+    count = sum(1 for _ in iter_csv_rows(ctx.members_csv))
+    return _result(count, time.perf_counter() - started, unit="rows")
+
+
+# Column mapping of the wide CSV as the SES form sends it for the member columns
+WIDE_MAPPING = {"Email": "Email", "Name": "Name", "Membershipid": "MembershipID", "Mobile": "Mobile"}
+
+
+def _map_row_dict(row, reverse_mapping, email_col, youtube_link):
+    """The per-row mapping SES jobs did on DictReader rows before ColumnPlan (kept as the baseline)."""
+    to_email = row.get(email_col, "").strip()
+    template_vars = {}
+    for template_var, csv_col in reverse_mapping.items():
+        if template_var != 'Email':
+            template_vars[template_var] = row.get(csv_col, "").strip()
+    for csv_col, value in row.items():
+        if csv_col not in reverse_mapping.values() and csv_col != email_col:
+            var_name = csv_col.replace(' ', '').replace('-', '').replace('_', '')
+            if var_name and var_name not in template_vars:
+                template_vars[var_name] = value.strip()
+    if youtube_link:
+        template_vars['YouTubeLink'] = youtube_link
+    return to_email, template_vars
+
+
+def _wide_csv(ctx):
+    rows = min(ctx.args.rows, ctx.args.render_rows)
+    path = os.path.join(ctx.work_dir, f"wide-{rows}x{ctx.args.wide_columns}.csv")
+    if not os.path.exists(path):
+        generate_members_csv(path, rows, extra_columns=ctx.args.wide_columns)
+    return path
+
+
+def bench_column_map_dict(ctx):
+    """Mapping wide DictReader rows to template variables the old way (rows read beforehand)."""
+    rows = list(iter_csv_rows(_wide_csv(ctx)))
+    started = time.perf_counter()
+    for row in rows:
+        _map_row_dict(row, WIDE_MAPPING, "Email", "https://youtu.be/example")
+    seconds = time.perf_counter() - started
+    return _result(len(rows), seconds, unit="rows", columns=len(rows[0]) if rows else 0)
+
+
+def bench_column_map_plan(ctx):
+    """The same mapping with a ColumnPlan over csv.reader rows (rows read beforehand)."""
+    path = _wide_csv(ctx)
+    rows = list(iter_csv_tuples(path))
+    with open(path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f))
+    started = time.perf_counter()
+    plan = ColumnPlan(header, WIDE_MAPPING, "Email", {"YouTubeLink": "https://youtu.be/example"})
+    for row in rows:
+        plan.email(row)
+        plan.apply(row)
+    seconds = time.perf_counter() - started
+    return _result(len(rows), seconds, unit="rows", columns=len(header))
+
+
+def bench_render(ctx):
+    rows = list(iter_csv_rows(ctx.members_csv))[:ctx.args.render_rows]
+    with webapp.app.app_context():
+        pipeline = RenderPipeline(webapp.app.jinja_env, "email_template.html", SUBJECT_TEMPLATE)
+        started = time.perf_counter()
+        for start in range(0, len(rows), pipeline.batch_size):
+            pipeline.render_batch([_template_vars(row) for row in rows[start:start + pipeline.batch_size]])
+        seconds = time.perf_counter() - started
+    return _result(len(rows), seconds, unit="messages")
+
+
+def _mime_inputs(ctx):
+    with open(os.path.join(webapp.BASE_DIR, "img", "sign.png"), "rb") as f:
+        inline_images = {"signature": f.read()}
+    with open(os.path.join(webapp.BASE_DIR, "img", "IEI NEW CE-10-KVK.jpg"), "rb") as f:
+        attachment = f.read()
+    html = "<html><body>" + "<p>Hello {name}, thank you for your support.</p>" * 40 + "</body></html>"
+    return inline_images, attachment, html
+
+
+def bench_mime_prebuilt(ctx):
+    inline_images, attachment, html = _mime_inputs(ctx)
+    prebuilt = PrebuiltMessage(inline_images, attachment, "attachment.jpg")
+    count = ctx.args.mime_rows
+    started = time.perf_counter()
+    total_bytes = 0
+    for i in range(count):
+        total_bytes += len(prebuilt.render(f"Subject {i}", FROM_EMAIL, member_email(i), html.format(name=i)))
+    seconds = time.perf_counter() - started
+    return _result(count, seconds, unit="messages", mb_per_sec=round(total_bytes / seconds / 1e6, 1))
+
+
+def bench_mime_full_build(ctx):
+    inline_images, attachment, html = _mime_inputs(ctx)
+    # The per-message builder is much slower; a tenth of the rows is enough for a stable rate
+    count = max(1, ctx.args.mime_rows // 10)
+    started = time.perf_counter()
+    for i in range(count):
+        build_message(f"Subject {i}", FROM_EMAIL, member_email(i), html.format(name=i), inline_images, attachment, "attachment.jpg").as_string()
+    return _result(count, time.perf_counter() - started, unit="messages")
+
+
+def bench_fake_send(ctx):
+    provider = FakeProvider(latency=ctx.args.send_latency, max_send_rate=0)
+    count = ctx.args.send_rows
+    started = time.perf_counter()
+    with SendEngine(lambda item: provider.send_one(FROM_EMAIL, item, "raw"), TokenBucket(0), max_in_flight=ctx.args.send_in_flight) as engine:
+        for i in range(count):
+            engine.submit(member_email(i), lambda item, result, error: None)
+    seconds = time.perf_counter() - started
+    return _result(count, seconds, unit="messages", latency=ctx.args.send_latency, in_flight=ctx.args.send_in_flight)
+
+
+def _run_ses_job(ctx, job_id, send_mode):
+    rows = min(ctx.args.rows, ctx.args.send_rows)
+    path = generate_members_csv(os.path.join(ctx.work_dir, f"send-{rows}.csv"), rows)
+    provider = FakeProvider(latency=ctx.args.send_latency, max_send_rate=0)
+    webapp.job_store.create(job_id, type="ses")
+    started = time.perf_counter()
+    with mock.patch.object(webapp, "_create_provider", lambda create_real: provider), \
+            mock.patch.object(webapp, "SendCheckpoint", lambda job_id: _NullCheckpoint()):
+        webapp._ses_send_worker(job_id, path, None, SUBJECT_TEMPLATE, FROM_EMAIL, "", "https://youtu.be/example",
+                                "email_template.html", "{}", max_send_rate=1e9, max_in_flight=ctx.args.send_in_flight,
+                                send_mode=send_mode)
+    seconds = time.perf_counter() - started
+    job = webapp.job_store.get(job_id)
+    return _result(job.get("successes", 0), seconds, unit="messages", failures=job.get("failures", 0),
+                   api_calls=job.get("bulk_calls") if send_mode == "bulk" else job.get("processed", 0))
+
+
+def bench_ses_job_fake(ctx):
+    """The whole SES send worker (CSV, render, MIME, send) against FakeProvider."""
+    return _run_ses_job(ctx, "bench-ses", "raw")
+
+
+def bench_ses_bulk_job_fake(ctx):
+    """The SES send worker in bulk template mode: no per-row render or MIME, 50 recipients per call."""
+    return _run_ses_job(ctx, "bench-ses-bulk", "bulk")
+
+
+class _NullCheckpoint:
+    def save_params(self, params):
+        pass
+
+    def entries(self):
+        return iter(())
+
+    def completed_rows(self):
+        return set()
+
+    def record(self, row, email, message_id):
+        pass
+
+    def close(self):
+        pass
+
+
+def bench_event_parse(ctx):
+    lines = _event_lines(ctx.events_dir)
+    stats = {}
+    started = time.perf_counter()
+    events = parse_lines(lines, stats=stats)
+    parse_seconds = time.perf_counter() - started
+    reducer = EventReducer()
+    started = time.perf_counter()
+    reducer.add_events(events)
+    reduce_seconds = time.perf_counter() - started
+    return _result(len(lines), parse_seconds, unit="events", backend=JSON_BACKEND,
+                   mb_per_sec=round(stats["bytes"] / parse_seconds / 1e6, 1), reduce_seconds=round(reduce_seconds, 4))
+
+
+def bench_event_parse_filtered(ctx):
+    """Parsing when only the status-deciding types are wanted; other lines are skipped undecoded."""
+    lines = _event_lines(ctx.events_dir)
+    stats = {}
+    started = time.perf_counter()
+    parse_lines(lines, event_types={"Bounce", "Complaint", "Delivery", "DeliveryDelay"}, stats=stats)
+    seconds = time.perf_counter() - started
+    return _result(len(lines), seconds, unit="events", backend=JSON_BACKEND,
+                   mb_per_sec=round(stats["bytes"] / seconds / 1e6, 1), skipped_lines=stats["skipped_lines"])
+
+
+def _run_report_worker(ctx, job_id, processes=0):
+    out_path = os.path.join(ctx.work_dir, f"{job_id}.csv")
+    webapp.job_store.create(job_id, type="report")
+    env = {"SES_EVENT_LOCAL_DIR": ctx.events_dir, "REPORT_PROCESSES": str(processes)}
+    started = time.perf_counter()
+    with mock.patch.dict(os.environ, env):
+        webapp._report_worker(job_id, BENCH_BUCKET, BENCH_DATE, BENCH_DATE, ctx.members_csv, out_path)
+    seconds = time.perf_counter() - started
+    job = webapp.job_store.get(job_id)
+    if job.get("status") != "completed":
+        raise RuntimeError(f"report worker failed: {job.get('errors')}")
+    return _result(job["total"], seconds, unit="recipients", events=job.get("events"), timings=job.get("timings"))
+
+
+def _clear_event_cache():
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(EVENT_CACHE_PATH + suffix):
+            os.remove(EVENT_CACHE_PATH + suffix)
+
+
+def bench_report_worker(ctx):
+    # Cold run parses every object; the warm run reads them back from the event cache
+    _clear_event_cache()
+    cold = _run_report_worker(ctx, "bench-report-cold")
+    warm = _run_report_worker(ctx, "bench-report-warm")
+    cold["warm_seconds"] = warm["seconds"]
+    cold["warm_timings"] = warm["timings"]
+    return cold
+
+
+def bench_report_worker_processes(ctx):
+    """Cold report run with parsing spread over --processes worker processes."""
+    _clear_event_cache()
+    result = _run_report_worker(ctx, "bench-report-processes", processes=ctx.args.processes)
+    result["processes"] = ctx.args.processes
+    return result
+
+
+def bench_report_script(ctx):
+    import report
+
+    out_path = os.path.join(ctx.work_dir, "report-script.csv")
+    patches = {
+        "s3_client": LocalS3(ctx.events_dir),
+        "BUCKET_NAME": BENCH_BUCKET,
+        "DATE_PREFIXES": date_prefixes(BENCH_DATE, BENCH_DATE),
+        "INPUT_CSV": ctx.members_csv,
+        "OUTPUT_CSV": out_path,
+    }
+    with mock.patch.multiple(report, **patches), mock.patch("sys.stdout", new=io.StringIO()):
+        started = time.perf_counter()
+        report.generate_report()
+        seconds = time.perf_counter() - started
+    return _result(ctx.args.rows, seconds, unit="recipients")
+
+
+# -------- Send engines against a local stub server --------
+
+STUB_SES_RESPONSE = (
+    '<SendRawEmailResponse xmlns="http://ses.amazonaws.com/doc/2010-12-01/"><SendRawEmailResult>'
+    '<MessageId>stub-{n}</MessageId></SendRawEmailResult>'
+    '<ResponseMetadata><RequestId>stub</RequestId></ResponseMetadata></SendRawEmailResponse>'
+)
+
+
+async def _serve_stub(ready, latency):
+    """HTTP/1.1 keep-alive server answering every POST after `latency` seconds, like SES or MSG91 would."""
+    served = 0
+
+    async def handle(reader, writer):
+        nonlocal served
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                body = await reader.readexactly(length)
+                await asyncio.sleep(latency)
+                served += 1
+                if b"Action=SendRawEmail" in body:
+                    payload, content_type = STUB_SES_RESPONSE.format(n=served).encode(), b"text/xml"
+                else:
+                    payload, content_type = b'{"status": "success"}', b"application/json"
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: " + content_type
+                             + b"\r\nContent-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=2048)
+    ready.put(server.sockets[0].getsockname()[1])
+    await server.serve_forever()
+
+
+def _run_stub_server(ready, latency):
+    asyncio.run(_serve_stub(ready, latency))
+
+
+@contextlib.contextmanager
+def _stub_server(latency):
+    """Run the stub in its own process (so it is not measured) and yield its URL."""
+    mp = multiprocessing.get_context("spawn")
+    ready = mp.Queue()
+    process = mp.Process(target=_run_stub_server, args=(ready, latency), daemon=True)
+    process.start()
+    try:
+        yield f"http://127.0.0.1:{ready.get(timeout=60)}/"
+    finally:
+        process.terminate()
+        process.join()
+
+
+def _stub_send_run(api, engine, concurrency, url, requests):
+    """One run in a fresh process: `requests` sends through `engine` at `concurrency`; returns throughput and memory."""
+    import resource
+
+    import boto3
+    from botocore.config import Config
+    from botocore.credentials import Credentials
+
+    failures = []
+    threads = [threading.active_count()]
+    if api == "ses":
+        credentials = Credentials("bench-access-key", "bench-secret-key")
+        if engine == "async":
+            provider = SesProvider(None, async_client=AsyncSesClient("us-east-1", credentials, endpoint_url=url, pool_size=concurrency))
+        else:
+            ses = boto3.client("ses", region_name="us-east-1", endpoint_url=url,
+                               aws_access_key_id=credentials.access_key, aws_secret_access_key=credentials.secret_key,
+                               config=Config(max_pool_connections=concurrency))
+            provider = SesProvider(ses)
+        raw = build_message("Stub benchmark", FROM_EMAIL, member_email(0), "<p>Hello</p>" * 20).as_string()
+        items = [member_email(i) for i in range(requests)]
+    else:
+        client = Msg91Client("bench-key", session=create_session(concurrency), url=url)
+        async_client = AsyncMsg91Client("bench-key", pool_size=concurrency, url=url) if engine == "async" else None
+        provider = Msg91Provider(client, FROM_EMAIL, "example.com", "bench-template", async_client)
+        items = [[{"to": [{"email": member_email(i * 10 + n), "name": f"Member {n}"}]} for n in range(10)] for i in range(requests)]
+    # Paced and retried the way the send workers do it, at a rate cap no run reaches
+    limiter = TokenBucket(1e9)
+    controller = AdaptiveRateController(limiter, 1e9)
+
+    def send(item):
+        if api == "ses":
+            return controller.call(provider.send_one, FROM_EMAIL, item, raw)
+        return provider.send_batch(item)
+
+    async def send_async(item):
+        if api == "ses":
+            return await controller.call_async(provider.send_one_async, FROM_EMAIL, item, raw)
+        return await provider.send_batch_async(item)
+
+    def on_done(item, result, error):
+        threads[0] = max(threads[0], threading.active_count())
+        if error is not None or (api == "msg91" and result[0] != 200):
+            failures.append(error or result[:2])
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if engine == "async":
+        sender = AsyncSendEngine(send_async, limiter, max_in_flight=concurrency, on_close=provider.aclose)
+    else:
+        sender = SendEngine(send, limiter, max_in_flight=concurrency)
+    started = time.perf_counter()
+    with sender:
+        for item in items:
+            sender.submit(item, on_done)
+    seconds = time.perf_counter() - started
+    provider.close()
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "requests": requests,
+        "seconds": round(seconds, 4),
+        "per_sec": round(requests / seconds, 1),
+        "failures": len(failures),
+        "peak_threads": threads[0],
+        "peak_rss_mb": round(rss_peak / 1024, 1),
+        "rss_growth_mb": round((rss_peak - rss_before) / 1024, 1),
+    }
+
+
+def _bench_stub_send(ctx, api, engine):
+    runs = {}
+    mp = multiprocessing.get_context("spawn")
+    with _stub_server(ctx.args.stub_latency) as url:
+        for concurrency in ctx.args.stub_concurrency:
+            # A fresh process per run, so peak memory is that run's alone
+            with mp.Pool(1) as pool:
+                runs[str(concurrency)] = pool.apply(_stub_send_run, (api, engine, concurrency, url, ctx.args.stub_requests))
+    requests = sum(run["requests"] for run in runs.values())
+    seconds = sum(run["seconds"] for run in runs.values())
+    return _result(requests, seconds, unit="requests", latency=ctx.args.stub_latency, concurrency=runs)
+
+
+def bench_stub_ses_thread(ctx):
+    """SendRawEmail through boto3 on the thread engine, against the local stub server."""
+    return _bench_stub_send(ctx, "ses", "thread")
+
+
+def bench_stub_ses_async(ctx):
+    """SendRawEmail signed with botocore and sent over aiohttp on the asyncio engine."""
+    return _bench_stub_send(ctx, "ses", "async")
+
+
+def bench_stub_msg91_thread(ctx):
+    """MSG91 batches of 10 through requests on the thread engine, against the local stub server."""
+    return _bench_stub_send(ctx, "msg91", "thread")
+
+
+def bench_stub_msg91_async(ctx):
+    """MSG91 batches of 10 through aiohttp on the asyncio engine."""
+    return _bench_stub_send(ctx, "msg91", "async")
+
+
+BENCHMARKS = {
+    "csv_ingest": bench_csv_ingest,
+    "column_map_dict": bench_column_map_dict,
+    "column_map_plan": bench_column_map_plan,
+    "render": bench_render,
+    "mime_prebuilt": bench_mime_prebuilt,
+    "mime_full_build": bench_mime_full_build,
+    "fake_send": bench_fake_send,
+    "ses_job_fake": bench_ses_job_fake,
+    "ses_bulk_job_fake": bench_ses_bulk_job_fake,
+    "event_parse": bench_event_parse,
+    "event_parse_filtered": bench_event_parse_filtered,
+    "report_worker": bench_report_worker,
+    "report_worker_processes": bench_report_worker_processes,
+    "report_script": bench_report_script,
+    "stub_ses_thread": bench_stub_ses_thread,
+    "stub_ses_async": bench_stub_ses_async,
+    "stub_msg91_thread": bench_stub_msg91_thread,
+    "stub_msg91_async": bench_stub_msg91_async,
+}
+
+
+class _Context:
+    def __init__(self, args, work_dir):
+        self.args = args
+        self.work_dir = work_dir
+        self.members_csv = generate_members_csv(os.path.join(work_dir, f"members-{args.rows}.csv"), args.rows)
+        self.events_dir = os.path.join(work_dir, "s3")
+        self.event_bytes = generate_event_objects(self.events_dir, args.events, args.rows, objects=args.objects, compress=not args.plain_events)
+
+
+def compare(results, baseline, tolerance):
+    """Names of benchmarks whose per_sec dropped more than `tolerance` (0-1) below the baseline."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name, {}).get("per_sec")
+        after = result.get("per_sec")
+        if before and after is not None and after < before * (1 - tolerance):
+            regressions.append(f"{name}: {after:g}/s vs {before:g}/s")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=10000, help="members in the synthetic CSV (default 10000)")
+    parser.add_argument("--events", type=int, default=None, help="SES events to generate (default 3 per member)")
+    parser.add_argument("--objects", type=int, default=20, help="S3 objects the events are split over")
+    parser.add_argument("--plain-events", action="store_true", help="write event objects uncompressed")
+    parser.add_argument("--render-rows", type=int, default=10000)
+    parser.add_argument("--wide-columns", type=int, default=40, help="extra columns in the CSV for the column_map benchmarks")
+    parser.add_argument("--mime-rows", type=int, default=5000)
+    parser.add_argument("--send-rows", type=int, default=5000)
+    parser.add_argument("--send-latency", type=float, default=0.002, help="fake provider seconds per call")
+    parser.add_argument("--send-in-flight", type=int, default=14)
+    parser.add_argument("--stub-requests", type=int, default=2000, help="requests per run in the stub_* send engine benchmarks")
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="stub server seconds per response")
+    parser.add_argument("--stub-concurrency", type=lambda value: [int(n) for n in value.split(",")], default=[50, 200, 500],
+                        help="comma-separated in-flight limits for the stub_* benchmarks (default 50,200,500)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 2, help="worker processes for report_worker_processes")
+    parser.add_argument("--only", help="comma-separated benchmarks to run: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--output", help="results JSON path (default generated/benchmarks/bench-<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs the baseline (default 0.2)")
+    args = parser.parse_args(argv)
+    if args.events is None:
+        args.events = args.rows * 3
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    print(f"Generating {args.rows} members and {args.events} events in {_WORK_DIR} ...")
+    try:
+        ctx = _Context(args, _WORK_DIR)
+        results = {}
+        for name in names:
+            results[name] = BENCHMARKS[name](ctx)
+            print(f"{name:16} {results[name]['per_sec']:>12,.1f} {results[name]['unit']}/s  ({results[name]['seconds']:.3f}s)")
+    finally:
+        shutil.rmtree(_WORK_DIR, ignore_errors=True)
+
+    output = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "json_backend": JSON_BACKEND,
+            "rows": args.rows,
+            "events": args.events,
+            "event_bytes": ctx.event_bytes,
+            "objects": args.objects,
+        },
+        "results": results,
+    }
+    out_path = args.output or os.path.join(webapp.GENERATED_DIR, "benchmarks", f"bench-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2)
+    print(f"Results written to {out_path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import csv
+import io
+from itertools import islice
+
+
+CSV_ENCODING = "utf-8-sig"
+
+
+def iter_csv_rows(csv_path):
+    """Yield CSV rows as dicts one at a time instead of loading the whole file."""
+    with open(csv_path, newline="", encoding=CSV_ENCODING) as f:
+        yield from csv.DictReader(f)
+
+
+def iter_csv_tuples(csv_path):
+    """Yield data rows as lists of strings (header skipped), numbered like iter_csv_rows.
+
+    Blank lines are skipped the way csv.DictReader skips them, so row
+    indexes (e.g. in send checkpoints) match between the two.
+    """
+    with open(csv_path, newline="", encoding=CSV_ENCODING) as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if row:
+                yield row
+
+
+def read_csv_header(csv_path):
+    with open(csv_path, newline="", encoding=CSV_ENCODING) as f:
+        return next(csv.reader(f), [])
+
+
+def count_csv_rows(csv_path):
+    """Count data rows (excluding the header and blank lines) without parsing the file.
+
+    Falls back to a streaming csv.reader pass when quoted fields are present,
+    since those may contain embedded newlines.
+    """
+    count = 0
+    with open(csv_path, "rb") as f:
+        for line in f:
+            if b'"' in line:
+                break
+            if line.strip():
+                count += 1
+        else:
+            return max(0, count - 1)
+
+    with open(csv_path, newline="", encoding=CSV_ENCODING) as f:
+        count = sum(1 for row in csv.reader(f) if row)
+    return max(0, count - 1)
+
+
+def read_csv_preview(fileobj, rows=1):
+    """Read only the header and the first `rows` rows from an uploaded (binary) file object."""
+    text = io.TextIOWrapper(fileobj, encoding=CSV_ENCODING, newline="")
+    try:
+        reader = csv.DictReader(text)
+        sample = list(islice(reader, max(1, rows)))
+        return reader.fieldnames or [], sample
+    finally:
+        text.detach()
+
+
+class ColumnPlan:
+    """Column mapping compiled once per job into a projection of csv.reader rows.
+
+    `mapping` is template variable -> CSV column. Every other column becomes
+    a variable named after the column with spaces, dashes and underscores
+    removed (unless that name is already taken), and `constants` are added
+    to (or override) every row. `email_column` is read separately and never
+    becomes a variable. The result is the same as mapping the DictReader row
+    column by column, but the names, indexes and lookups are worked out once
+    instead of for every row.
+    """
+
+    def __init__(self, header, mapping, email_column=None, constants=None):
+        # Like DictReader, the last of several same-named columns wins
+        index = {name: i for i, name in enumerate(header)}
+        # variable -> (column index or None, constant used when there is no column)
+        sources = {}
+        for name, column in mapping.items():
+            if name != "Email":
+                sources[name] = (index.get(column), "")
+        mapped = set(mapping.values())
+        for column in index:
+            if column not in mapped and column != email_column:
+                name = column.replace(" ", "").replace("-", "").replace("_", "")
+                if name and name not in sources:
+                    sources[name] = (index[column], None)
+        for name, value in (constants or {}).items():
+            sources[name] = (None, value)
+        self.plan = [(name, i, constant) for name, (i, constant) in sources.items()]
+        self.names = list(sources)
+        self.email_column = email_column
+        self.email_index = index.get(email_column) if email_column else None
+
+    def email(self, row):
+        i = self.email_index
+        return row[i].strip() if i is not None and i < len(row) else ""
+
+    def apply(self, row):
+        """Template variables for one csv.reader row; missing trailing fields count as empty."""
+        width = len(row)
+        return {
+            name: (row[i].strip() if i < width else "") if i is not None else constant
+            for name, i, constant in self.plan
+        }
@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_PATH = os.environ.get(
+    "SES_EVENT_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "generated", "ses_events.sqlite3"),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    bucket TEXT NOT NULL,
+    object_key TEXT NOT NULL,
+    etag TEXT NOT NULL,
+    event_count INTEGER NOT NULL,
+    processed_at REAL NOT NULL,
+    PRIMARY KEY (bucket, object_key)
+);
+CREATE TABLE IF NOT EXISTS events (
+    bucket TEXT NOT NULL,
+    object_key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    email TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    error TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    bounce_type TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (bucket, object_key, seq)
+) WITHOUT ROWID;
+"""
+
+
+class EventStore:
+    """Local SQLite index of SES event objects that have already been downloaded and parsed.
+
+    Firehose objects are immutable, so an object whose (key, ETag) is already
+    stored never needs to be fetched again; its parsed
+    `(email, event_type, message_id, error, timestamp, bounce_type)` tuples are read back
+    from disk in their original order.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, commit_every=50):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.commit_every = commit_every
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._migrate()
+
+    def _migrate(self):
+        """Drop a cache written before bounce types were recorded, so its objects are parsed again."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(events)")}
+            if "bounce_type" not in columns:
+                self._conn.execute("DELETE FROM events")
+                self._conn.execute("DELETE FROM objects")
+                self._conn.execute("ALTER TABLE events ADD COLUMN bounce_type TEXT NOT NULL DEFAULT ''")
+            self._conn.commit()
+
+    def known_etags(self, bucket, keys):
+        """Map of object key -> ETag for those of `keys` already cached from `bucket`."""
+        keys = list(keys)
+        rows = []
+        with self._lock:
+            # Looked up in chunks, so a run over a few days does not read every key ever cached
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows += self._conn.execute(
+                    f"SELECT object_key, etag FROM objects WHERE bucket = ? AND object_key IN ({','.join('?' * len(chunk))})",
+                    [bucket] + chunk,
+                ).fetchall()
+        return dict(rows)
+
+    def load(self, bucket, key):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT email, event_type, message_id, error, timestamp, bounce_type FROM events"
+                " WHERE bucket = ? AND object_key = ? ORDER BY seq",
+                (bucket, key),
+            ).fetchall()
+
+    def save(self, bucket, key, etag, events):
+        """Replace the cached events for one object; commits in batches of `commit_every` objects."""
+        with self._lock:
+            self._conn.execute("DELETE FROM events WHERE bucket = ? AND object_key = ?", (bucket, key))
+            self._conn.executemany(
+                "INSERT INTO events (bucket, object_key, seq, email, event_type, message_id, error, timestamp, bounce_type)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(bucket, key, seq) + tuple(event) for seq, event in enumerate(events)],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO objects (bucket, object_key, etag, event_count, processed_at) VALUES (?, ?, ?, ?, ?)",
+                (bucket, key, etag, len(events), time.time()),
+            )
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,9 @@
+# Loaded automatically by `gunicorn app:app` when run from this directory.
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+# Each open progress tab holds a Server-Sent Events stream (/events/<job_id>) for up to
+# PROGRESS_STREAM_SECONDS; threaded workers serve other requests meanwhile, sync workers cannot
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "16"))
@@ -0,0 +1,314 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+DEFAULT_HISTORY_LIMIT = 500
+# Only the newest errors are kept per job (the app writes the full list to a CSV)
+ERROR_RING_SIZE = int(os.environ.get("JOB_ERROR_RING_SIZE", "100"))
+
+_DIGITS = re.compile(r"\d+")
+
+
+def is_active(job, stale_seconds, now=None):
+    """True if `job` is pending or running and its worker has reported within `stale_seconds`."""
+    heartbeat = job.get("heartbeat") or job.get("created") or 0
+    return job.get("status") in (None, "running") and (now or time.time()) - heartbeat < stale_seconds
+
+
+def classify_error(error):
+    """Short class for grouping errors, e.g. "HTTP #" or "Template rendering error"."""
+    if error.get("stage"):
+        return f"stage: {error['stage']}"
+    message = str(error.get("error", ""))
+    # SES/botocore messages look like "An error occurred (Code) when calling ...: detail"
+    head = message.split(":", 1)[0].strip() or "Unknown error"
+    return _DIGITS.sub("#", head)[:120]
+
+
+class MemoryJobStore:
+    """Job state kept in this process only (fine for `python app.py` and single-worker servers)."""
+
+    def __init__(self, history_limit=DEFAULT_HISTORY_LIMIT, error_ring_size=ERROR_RING_SIZE):
+        self.history_limit = history_limit
+        self.error_ring_size = error_ring_size
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def _job(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self._jobs[job_id] = {"id": job_id}
+        if "_errors" not in job:
+            job.update(_errors=deque(maxlen=self.error_ring_size), error_cursor=0, error_count=0, error_classes={})
+        return job
+
+    def _add_error(self, job, error):
+        # error_cursor only ever grows, so clients can ask for "errors after N" across resets
+        job["error_cursor"] += 1
+        job["_errors"].append(dict(error, seq=job["error_cursor"]))
+        job["error_count"] += 1
+        error_class = classify_error(error)
+        job["error_classes"][error_class] = job["error_classes"].get(error_class, 0) + 1
+        return job["error_cursor"]
+
+    def create(self, job_id, **fields):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._job(job_id).update(fields)
+            # dicts keep insertion order, so the oldest jobs come first
+            while len(self._jobs) > self.history_limit:
+                del self._jobs[next(iter(self._jobs))]
+
+    def update(self, job_id, **fields):
+        """Set fields; passing `errors` replaces the stored errors and resets the error counts."""
+        with self._lock:
+            job = self._job(job_id)
+            if "errors" in fields:
+                job["_errors"].clear()
+                job.update(error_count=0, error_classes={})
+                for error in fields.pop("errors"):
+                    self._add_error(job, error)
+            job.update(fields)
+
+    def incr(self, job_id, error=None, **deltas):
+        """Atomically add `deltas` to numeric fields and optionally record an error.
+
+        Returns the error's sequence number (None without an error).
+        """
+        with self._lock:
+            job = self._job(job_id)
+            for key, delta in deltas.items():
+                job[key] = job.get(key, 0) + delta
+            if error is not None:
+                return self._add_error(job, error)
+
+    def claim(self, job_id, stale_seconds, **fields):
+        """Atomically set `fields` unless the job is active (see is_active); False if it is."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and is_active(job, stale_seconds):
+                return False
+            self._job(job_id).update(fields)
+            return True
+
+    def get(self, job_id, errors_since=None):
+        """The job's fields plus recent `errors`; only those after `errors_since` if given."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            result = {k: v for k, v in job.items() if not k.startswith("_")}
+            result["error_classes"] = dict(job["error_classes"])
+            result["errors"] = [e for e in job["_errors"] if e["seq"] > (errors_since or 0)]
+            return result
+
+    def __contains__(self, job_id):
+        with self._lock:
+            return job_id in self._jobs
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created);
+CREATE TABLE IF NOT EXISTS job_fields (
+    job_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value,
+    is_json INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS job_errors (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    error TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS job_error_classes (
+    job_id TEXT NOT NULL,
+    error_class TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (job_id, error_class)
+) WITHOUT ROWID;
+"""
+
+
+def _encode(value):
+    # Numbers are stored natively so counters can be incremented inside SQLite
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value, 0
+    return json.dumps(value), 1
+
+
+class SQLiteJobStore:
+    """Job state in a SQLite file shared by every worker process on the host.
+
+    Each field is its own row, so counters are incremented with a single
+    UPSERT instead of a read-modify-write, and reading one job is a handful
+    of primary-key lookups no matter how many jobs are kept in history.
+    """
+
+    def __init__(self, path, history_limit=DEFAULT_HISTORY_LIMIT, error_ring_size=ERROR_RING_SIZE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.history_limit = history_limit
+        self.error_ring_size = error_ring_size
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self):
+        # One connection per thread; SQLite serializes writers across threads and processes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _connect(self, mode="IMMEDIATE"):
+        return _Transaction(self._conn(), mode)
+
+    def _set_fields(self, conn, job_id, fields):
+        for name, value in fields.items():
+            if name == "errors":
+                for table in ("job_errors", "job_error_classes"):
+                    conn.execute(f"DELETE FROM {table} WHERE job_id = ?", (job_id,))
+                conn.execute("DELETE FROM job_fields WHERE job_id = ? AND name = 'error_count'", (job_id,))
+                for error in value:
+                    self._add_error(conn, job_id, error)
+                continue
+            value, is_json = _encode(value)
+            conn.execute(
+                "INSERT INTO job_fields (job_id, name, value, is_json) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (job_id, name) DO UPDATE SET value = excluded.value, is_json = excluded.is_json",
+                (job_id, name, value, is_json),
+            )
+
+    def _incr_field(self, conn, job_id, name, delta):
+        conn.execute(
+            "INSERT INTO job_fields (job_id, name, value, is_json) VALUES (?, ?, ?, 0)"
+            " ON CONFLICT (job_id, name) DO UPDATE SET value = value + excluded.value, is_json = 0",
+            (job_id, name, delta),
+        )
+
+    def _add_error(self, conn, job_id, error):
+        # error_cursor only ever grows, so clients can ask for "errors after N" across resets
+        self._incr_field(conn, job_id, "error_cursor", 1)
+        self._incr_field(conn, job_id, "error_count", 1)
+        seq = conn.execute(
+            "SELECT value FROM job_fields WHERE job_id = ? AND name = 'error_cursor'", (job_id,)
+        ).fetchone()[0]
+        conn.execute(
+            "INSERT INTO job_errors (job_id, seq, error) VALUES (?, ?, ?)",
+            (job_id, seq, json.dumps(dict(error, seq=seq))),
+        )
+        conn.execute("DELETE FROM job_errors WHERE job_id = ? AND seq <= ?", (job_id, seq - self.error_ring_size))
+        conn.execute(
+            "INSERT INTO job_error_classes (job_id, error_class, count) VALUES (?, ?, 1)"
+            " ON CONFLICT (job_id, error_class) DO UPDATE SET count = count + 1",
+            (job_id, classify_error(error)),
+        )
+        return seq
+
+    def create(self, job_id, **fields):
+        with self._connect() as conn:
+            created = fields.get("created", time.time())
+            conn.execute("INSERT OR REPLACE INTO jobs (id, created) VALUES (?, ?)", (job_id, created))
+            self._set_fields(conn, job_id, dict(fields, id=job_id))
+            stale = [row[0] for row in conn.execute(
+                "SELECT id FROM jobs ORDER BY created DESC LIMIT -1 OFFSET ?", (self.history_limit,)
+            )]
+            for old_id in stale:
+                conn.execute("DELETE FROM jobs WHERE id = ?", (old_id,))
+                for table in ("job_fields", "job_errors", "job_error_classes"):
+                    conn.execute(f"DELETE FROM {table} WHERE job_id = ?", (old_id,))
+
+    def update(self, job_id, **fields):
+        """Set fields; passing `errors` replaces the stored errors and resets the error counts."""
+        with self._connect() as conn:
+            self._set_fields(conn, job_id, fields)
+
+    def incr(self, job_id, error=None, **deltas):
+        """Atomically add `deltas` to numeric fields and optionally record an error.
+
+        Returns the error's sequence number (None without an error).
+        """
+        with self._connect() as conn:
+            for name, delta in deltas.items():
+                self._incr_field(conn, job_id, name, delta)
+            if error is not None:
+                return self._add_error(conn, job_id, error)
+
+    def claim(self, job_id, stale_seconds, **fields):
+        """Atomically set `fields` unless the job is active (see is_active); False if it is.
+
+        The check and the write share one IMMEDIATE transaction, so of two
+        processes claiming the same job only one succeeds.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT name, value, is_json FROM job_fields WHERE job_id = ? AND name IN ('status', 'heartbeat', 'created')",
+                (job_id,),
+            ).fetchall()
+            job = {name: json.loads(value) if is_json else value for name, value, is_json in rows}
+            if rows and is_active(job, stale_seconds):
+                return False
+            conn.execute("INSERT OR IGNORE INTO jobs (id, created) VALUES (?, ?)", (job_id, fields.get("created", time.time())))
+            self._set_fields(conn, job_id, dict(fields, id=job_id))
+            return True
+
+    def get(self, job_id, errors_since=None):
+        """The job's fields plus recent `errors`; only those after `errors_since` if given."""
+        with self._connect("DEFERRED") as conn:
+            rows = conn.execute("SELECT name, value, is_json FROM job_fields WHERE job_id = ?", (job_id,)).fetchall()
+            if not rows:
+                return None
+            job = {name: json.loads(value) if is_json else value for name, value, is_json in rows}
+            errors = conn.execute(
+                "SELECT error FROM job_errors WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, errors_since or 0),
+            ).fetchall()
+            classes = conn.execute(
+                "SELECT error_class, count FROM job_error_classes WHERE job_id = ? ORDER BY count DESC", (job_id,)
+            ).fetchall()
+        job["errors"] = [json.loads(error) for error, in errors]
+        job["error_classes"] = dict(classes)
+        job.setdefault("error_count", 0)
+        job.setdefault("error_cursor", 0)
+        return job
+
+    def __contains__(self, job_id):
+        return self._conn().execute("SELECT 1 FROM jobs WHERE id = ?", (job_id,)).fetchone() is not None
+
+
+class _Transaction:
+    """`with` block that runs the statements on `conn` in one transaction."""
+
+    def __init__(self, conn, mode="IMMEDIATE"):
+        self.conn = conn
+        self.mode = mode
+
+    def __enter__(self):
+        self.conn.execute(f"BEGIN {self.mode}")
+        return self.conn
+
+    def __exit__(self, exc_type, *exc):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def create_job_store(backend=None, path=None):
+    """Job store selected by `JOB_STORE` ("sqlite", the default, or "memory")."""
+    backend = (backend or os.environ.get("JOB_STORE", "sqlite")).lower()
+    if backend == "memory":
+        return MemoryJobStore()
+    if backend == "sqlite":
+        return SQLiteJobStore(path or os.environ.get("JOB_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "generated", "jobs.sqlite3")))
+    raise ValueError(f"Unknown JOB_STORE backend: {backend}")
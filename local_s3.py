@@ -0,0 +1,33 @@
+import hashlib
+import os
+
+
+class LocalS3:
+    """The slice of the boto3 S3 client the report code uses, served from a local directory.
+
+    `root` plays the part of the bucket, so an `aws s3 sync s3://bucket/ses/ root/ses/`
+    copy of the Firehose output can be reported on offline. ETags are derived
+    from each file's path, size and mtime, so the event cache notices changes.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def get_paginator(self, name):
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        contents = []
+        base = os.path.join(self.root, Prefix)
+        if os.path.isdir(base):
+            for filename in sorted(os.listdir(base)):
+                path = os.path.join(base, filename)
+                if not os.path.isfile(path):
+                    continue
+                stat = os.stat(path)
+                etag = hashlib.md5(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+                contents.append({"Key": Prefix + filename, "ETag": f'"{etag}"', "Size": stat.st_size})
+        return [{"Contents": contents}]
+
+    def get_object(self, Bucket, Key):
+        return {"Body": open(os.path.join(self.root, Key), "rb")}
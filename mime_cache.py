@@ -0,0 +1,90 @@
+from email.mime.application import MIMEApplication
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+
+def build_message(subject, from_email, to_email, html_body, inline_images=None, attachment_bytes=None,
+                  attachment_filename=None, boundary=None, alt_boundary=None):
+    """Build a campaign email the way the SES worker always has (one full MIME tree per recipient)."""
+    # Use 'related' multipart if we have inline images, otherwise use regular multipart
+    if inline_images:
+        msg = MIMEMultipart('related', boundary=boundary)
+    else:
+        msg = MIMEMultipart(boundary=boundary)
+
+    msg["Subject"] = subject
+    msg["From"] = from_email
+    msg["To"] = to_email
+
+    # Create alternative part for HTML content
+    if inline_images:
+        alt = MIMEMultipart('alternative', boundary=alt_boundary)
+        alt.attach(MIMEText(html_body, "html"))
+        msg.attach(alt)
+    else:
+        msg.attach(MIMEText(html_body, "html"))
+
+    # Attach inline images
+    for cid, image_data in (inline_images or {}).items():
+        img = MIMEImage(image_data)
+        img.add_header('Content-ID', f'<{cid}>')
+        img.add_header('Content-Disposition', 'inline', filename=f'{cid}.png')
+        msg.attach(img)
+
+    if attachment_bytes:
+        part = MIMEApplication(attachment_bytes)
+        part.add_header("Content-Disposition", "attachment", filename=attachment_filename)
+        msg.attach(part)
+
+    return msg
+
+
+class PrebuiltMessage:
+    """MIME skeleton for one job with the static parts encoded once.
+
+    Inline images and the attachment are base64-encoded a single time when
+    the skeleton is built; `render` only serializes the per-recipient headers
+    and HTML part and splices them between the cached bytes.
+    """
+
+    _BODY_SENTINEL = "@@PREBUILT-HTML-BODY@@"
+
+    def __init__(self, inline_images=None, attachment_bytes=None, attachment_filename=None):
+        self.inline_images = inline_images or {}
+        self.attachment_bytes = attachment_bytes
+        self.attachment_filename = attachment_filename
+
+        skeleton = build_message("", "", "", self._BODY_SENTINEL, self.inline_images, attachment_bytes, attachment_filename)
+        # Serializing assigns the random boundaries, which every recipient then shares
+        text = skeleton.as_string()
+        self.boundary = skeleton.get_boundary()
+        self.alt_boundary = skeleton.get_payload(0).get_boundary() if self.inline_images else None
+        body_part = MIMEText(self._BODY_SENTINEL, "html").as_string()
+        if text.count(body_part) != 1:
+            raise ValueError("Could not locate the HTML part in the MIME skeleton")
+        start = text.index("\n\n") + 2
+        self._prefix, self._suffix = text[start:].split(body_part)
+
+    def _header_block(self, subject, from_email, to_email):
+        headers = MIMEMultipart('related' if self.inline_images else 'mixed', boundary=self.boundary)
+        headers["Subject"] = subject
+        headers["From"] = from_email
+        headers["To"] = to_email
+        text = headers.as_string()
+        return text[:text.index("\n\n") + 2]
+
+    def render(self, subject, from_email, to_email, html_body):
+        """Return the full message text for one recipient."""
+        if self.boundary in html_body or (self.alt_boundary and self.alt_boundary in html_body):
+            # A body that happens to contain our cached boundary needs a fresh one
+            return build_message(subject, from_email, to_email, html_body, self.inline_images,
+                                 self.attachment_bytes, self.attachment_filename).as_string()
+        body_part = MIMEText(html_body, "html").as_string()
+        return self._header_block(subject, from_email, to_email) + self._prefix + body_part + self._suffix
+
+    def verify(self, subject, from_email, to_email, html_body):
+        """True if `render` matches the legacy builder byte-for-byte (given the same boundaries)."""
+        expected = build_message(subject, from_email, to_email, html_body, self.inline_images, self.attachment_bytes,
+                                 self.attachment_filename, boundary=self.boundary, alt_boundary=self.alt_boundary)
+        return self.render(subject, from_email, to_email, html_body).encode("utf-8") == expected.as_string().encode("utf-8")
@@ -1,9 +1,11 @@
 import csv
 import json
-import requests
 import time
 import base64
 
+from msg91_client import Msg91Client
+from providers import Msg91Provider
+
 # MSG91 credentials
 AUTH_KEY = "395929A2YW1qXt4afm682c115cP1"
 TEMPLATE_ID = "bulk2"
@@ -37,22 +39,12 @@ def get_attachment(file_path):
 
 attachment = get_attachment(ATTACHMENT_FILE)
 
-def send_email_batch(batch):
-    payload = {
-        "recipients": batch,
-        "from": {"email": FROM_EMAIL},
-        "domain": DOMAIN,
-        "template_id": TEMPLATE_ID,
-        "attachments": [attachment]  # Attach file correctly
-    }
-    headers = {
-        "Content-Type": "application/json",
-        "authkey": AUTH_KEY
-    }
+provider = Msg91Provider(Msg91Client(AUTH_KEY), FROM_EMAIL, DOMAIN, TEMPLATE_ID)
+attachment_json = json.dumps(attachment)
 
-    response = requests.post("https://control.msg91.com/api/v5/email/send", 
-                             headers=headers, data=json.dumps(payload))
-    print(response.status_code, response.text)
+def send_email_batch(batch):
+    status_code, text, attempts, seconds = provider.send_batch(batch, attachment_json)
+    print(status_code, text)
 
 def main():
     recipients_batch = []
@@ -0,0 +1,157 @@
+import asyncio
+import base64
+import json
+import os
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# aiohttp is only needed by the asyncio send engine; without it that engine
+# runs the requests-based client on a thread pool instead
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+MSG91_SEND_URL = "https://control.msg91.com/api/v5/email/send"
+# Responses worth retrying: rate limiting and server-side failures
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+ATTACHMENT_MIME_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".pdf": "application/pdf"}
+
+
+def inline_attachment(path):
+    """Attachment entry carrying the whole file as a base64 data URI."""
+    with open(path, "rb") as f:
+        encoded = base64.b64encode(f.read()).decode("utf-8")
+    filename = os.path.basename(path)
+    mime_type = ATTACHMENT_MIME_TYPES.get(os.path.splitext(filename)[1].lower(), "application/octet-stream")
+    return {"file": f"data:{mime_type};base64,{encoded}", "fileName": filename}
+
+
+def url_attachment(url, filename):
+    """Attachment entry that MSG91 downloads from `url` itself."""
+    return {"filePath": url, "fileName": filename}
+
+
+def batch_payload_json(recipients, from_email, domain, template_id, attachment_json=None):
+    """JSON body for one batch; `attachment_json` is an attachment entry encoded once per job."""
+    data = json.dumps({"recipients": recipients, "from": {"email": from_email}, "domain": domain, "template_id": template_id})
+    if attachment_json is None:
+        return data
+    return f'{data[:-1]}, "attachments": [{attachment_json}]}}'
+
+
+def create_session(pool_size=4):
+    """requests.Session that keeps up to `pool_size` keep-alive connections to MSG91 open."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def backoff_delay(attempt, retry_after, base, cap):
+    """Seconds to wait before retry `attempt`: full-jitter exponential backoff, at least `retry_after`."""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    try:
+        delay = max(delay, min(cap, float(retry_after)))
+    except (TypeError, ValueError):
+        pass
+    return delay
+
+
+class Msg91Client:
+    """Posts MSG91 email batches over a shared session, retrying transient failures.
+
+    429 and 5xx responses, timeouts and connection errors are retried up to
+    `max_retries` times with exponential backoff and full jitter (a Retry-After
+    header, when present, is used as the minimum wait). Safe to share between threads.
+    """
+
+    def __init__(self, auth_key, session=None, url=MSG91_SEND_URL, timeout=60, max_retries=4, backoff_base=1.0, backoff_max=30.0):
+        self.url = url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = session or create_session()
+        self.headers = {"Content-Type": "application/json", "authkey": auth_key}
+
+    def _backoff(self, attempt, retry_after=None):
+        time.sleep(backoff_delay(attempt, retry_after, self.backoff_base, self.backoff_max))
+
+    def send_batch(self, payload):
+        """POST one batch (a dict or pre-encoded JSON); returns `(response, attempts, seconds)` or raises the last request error."""
+        data = payload if isinstance(payload, str) else json.dumps(payload)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self.session.post(self.url, headers=self.headers, data=data, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt > self.max_retries:
+                    raise
+                self._backoff(attempt - 1)
+                continue
+            if response.status_code not in RETRY_STATUS_CODES or attempt > self.max_retries:
+                return response, attempt, time.perf_counter() - started
+            self._backoff(attempt - 1, response.headers.get("Retry-After"))
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncMsg91Client:
+    """Msg91Client for the asyncio send engine, on an aiohttp session with up to `pool_size` connections.
+
+    Retries the same failures with the same backoff. The session is created
+    on first use, so it belongs to the event loop that sends; `aclose()` it
+    on that loop.
+    """
+
+    def __init__(self, auth_key, pool_size=4, url=MSG91_SEND_URL, timeout=60, max_retries=4, backoff_base=1.0, backoff_max=30.0):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is not installed")
+        self.url = url
+        self.timeout = timeout
+        self.pool_size = max(1, pool_size)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.headers = {"Content-Type": "application/json", "authkey": auth_key}
+        self.session = None
+
+    async def send_batch(self, payload):
+        """POST one batch; returns `(status_code, text, attempts, seconds)` or raises the last request error."""
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        data = payload if isinstance(payload, str) else json.dumps(payload)
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async with self.session.post(self.url, headers=self.headers, data=data) as response:
+                    status_code, text = response.status, await response.text()
+                    retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt > self.max_retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt - 1, None, self.backoff_base, self.backoff_max))
+                continue
+            if status_code not in RETRY_STATUS_CODES or attempt > self.max_retries:
+                return status_code, text, attempt, time.perf_counter() - started
+            await asyncio.sleep(backoff_delay(attempt - 1, retry_after, self.backoff_base, self.backoff_max))
+
+    async def aclose(self):
+        if self.session is not None:
+            await self.session.close()
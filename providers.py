@@ -0,0 +1,301 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import uuid
+from collections import deque
+
+from msg91_client import batch_payload_json
+
+
+class ProviderError(Exception):
+    """Send failure shaped like a botocore ClientError, so send_engine can classify it."""
+
+    def __init__(self, code, message):
+        super().__init__(f"An error occurred ({code}): {message}")
+        self.response = {"Error": {"Code": code, "Message": message}}
+
+
+class Provider:
+    """Interface the send workers use to hand messages to an email service.
+
+    `send_one(from_email, to_email, raw_message)` sends one raw MIME message
+    and returns its message ID; `send_batch(recipients, attachment_json)`
+    sends one templated batch and returns `(status_code, detail, attempts, seconds)`.
+    `send_bulk(from_email, template_name, entries)` sends a stored template
+    (see `sync_template`) to `(to_email, template_data_json)` entries and
+    returns `(status, message_id, error)` per entry, status "SUCCESS" if sent.
+    `capabilities` says which of these a provider supports, and
+    `rate_limits()` reports the send rate and 24-hour quota (None when unknown).
+
+    The asyncio send engine awaits the `*_async` versions of the send methods.
+    Unless a provider has a native async client, they run the blocking method
+    on the event loop's default thread pool. `aclose()` runs on that loop.
+    """
+
+    name = "provider"
+    capabilities = {"raw_mime": False, "batch": False, "max_batch_size": 1, "bulk_template": False, "max_bulk_size": 1}
+
+    def send_one(self, from_email, to_email, raw_message):
+        raise NotImplementedError(f"{self.name} does not send raw messages")
+
+    def send_batch(self, recipients, attachment_json=None):
+        raise NotImplementedError(f"{self.name} does not send batches")
+
+    def sync_template(self, name, subject, html):
+        raise NotImplementedError(f"{self.name} does not store templates")
+
+    def send_bulk(self, from_email, template_name, entries):
+        raise NotImplementedError(f"{self.name} does not send bulk templated email")
+
+    async def send_one_async(self, from_email, to_email, raw_message):
+        return await asyncio.to_thread(self.send_one, from_email, to_email, raw_message)
+
+    async def send_batch_async(self, recipients, attachment_json=None):
+        return await asyncio.to_thread(self.send_batch, recipients, attachment_json)
+
+    async def send_bulk_async(self, from_email, template_name, entries):
+        return await asyncio.to_thread(self.send_bulk, from_email, template_name, entries)
+
+    def rate_limits(self):
+        return {"max_send_rate": None, "max_24h": None, "sent_24h": 0}
+
+    async def aclose(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SesProvider(Provider):
+    """Raw messages through SES (v1) SendRawEmail; bulk templated email through SES v2 SendBulkEmail.
+
+    With an `async_client` (ses_async.AsyncSesClient) raw sends from the
+    asyncio engine do not need a thread each.
+    """
+
+    name = "ses"
+    capabilities = {"raw_mime": True, "batch": False, "max_batch_size": 1, "bulk_template": True, "max_bulk_size": 50}
+
+    def __init__(self, ses_client, config_set=None, sesv2_client=None, async_client=None):
+        self.ses = ses_client
+        self.config_set = config_set
+        self.sesv2 = sesv2_client
+        self.async_client = async_client
+
+    def send_one(self, from_email, to_email, raw_message):
+        kwargs = {"Source": from_email, "Destinations": [to_email], "RawMessage": {"Data": raw_message}}
+        if self.config_set:
+            kwargs["ConfigurationSetName"] = self.config_set
+        return self.ses.send_raw_email(**kwargs).get("MessageId", "")
+
+    async def send_one_async(self, from_email, to_email, raw_message):
+        if self.async_client is None:
+            return await super().send_one_async(from_email, to_email, raw_message)
+        return await self.async_client.send_raw_email(from_email, to_email, raw_message, self.config_set)
+
+    def sync_template(self, name, subject, html):
+        """Store the template unless it already exists; names carry a content hash, so they are never updated."""
+        try:
+            self.sesv2.get_email_template(TemplateName=name)
+            return
+        except self.sesv2.exceptions.NotFoundException:
+            pass
+        try:
+            self.sesv2.create_email_template(TemplateName=name, TemplateContent={"Subject": subject, "Html": html})
+        except self.sesv2.exceptions.AlreadyExistsException:
+            # Another job created it first
+            pass
+
+    def send_bulk(self, from_email, template_name, entries):
+        kwargs = {
+            "FromEmailAddress": from_email,
+            "DefaultContent": {"Template": {"TemplateName": template_name, "TemplateData": "{}"}},
+            "BulkEmailEntries": [
+                {
+                    "Destination": {"ToAddresses": [to_email]},
+                    "ReplacementEmailContent": {"ReplacementTemplate": {"ReplacementTemplateData": data}},
+                }
+                for to_email, data in entries
+            ],
+        }
+        if self.config_set:
+            kwargs["ConfigurationSetName"] = self.config_set
+        results = self.sesv2.send_bulk_email(**kwargs).get("BulkEmailEntryResults", [])
+        return [(result.get("Status", ""), result.get("MessageId", ""), result.get("Error", "")) for result in results]
+
+    async def aclose(self):
+        if self.async_client is not None:
+            await self.async_client.aclose()
+
+    def rate_limits(self):
+        quota = self.ses.get_send_quota()
+        return {
+            "max_send_rate": quota.get("MaxSendRate"),
+            "max_24h": quota.get("Max24HourSend"),
+            "sent_24h": quota.get("SentLast24Hours", 0),
+        }
+
+
+class Msg91Provider(Provider):
+    """MSG91 batches through a Msg91Client, or an AsyncMsg91Client (`async_client`) from the asyncio engine."""
+
+    name = "msg91"
+    capabilities = {"raw_mime": False, "batch": True, "max_batch_size": 1000}
+
+    def __init__(self, client, from_email, domain, template_id, async_client=None):
+        self.client = client
+        self.from_email = from_email
+        self.domain = domain
+        self.template_id = template_id
+        self.async_client = async_client
+
+    def send_batch(self, recipients, attachment_json=None):
+        data = batch_payload_json(recipients, self.from_email, self.domain, self.template_id, attachment_json)
+        response, attempts, seconds = self.client.send_batch(data)
+        return response.status_code, response.text, attempts, seconds
+
+    async def send_batch_async(self, recipients, attachment_json=None):
+        if self.async_client is None:
+            return await super().send_batch_async(recipients, attachment_json)
+        data = batch_payload_json(recipients, self.from_email, self.domain, self.template_id, attachment_json)
+        return await self.async_client.send_batch(data)
+
+    async def aclose(self):
+        if self.async_client is not None:
+            await self.async_client.aclose()
+
+    def close(self):
+        self.client.close()
+
+
+class FakeProvider(Provider):
+    """In-process stand-in for SES and MSG91 for load tests and offline runs.
+
+    Each call sleeps `latency` (+/- `jitter`) seconds. Calls beyond
+    `max_send_rate` per trailing second are throttled the way SES and MSG91
+    do it, sends past `max_24h` fail with the SES daily-quota message, and
+    `failure_rate` of the remaining calls fail at random. The `*_async`
+    methods wait with asyncio.sleep instead of taking a thread.
+    """
+
+    name = "fake"
+    capabilities = {"raw_mime": True, "batch": True, "max_batch_size": 1000, "bulk_template": True, "max_bulk_size": 50}
+
+    def __init__(self, latency=0.05, jitter=0.0, max_send_rate=14, max_24h=None, sent_24h=0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.max_send_rate = max_send_rate
+        self.max_24h = max_24h
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self.sent_24h = sent_24h
+        self.stats = {"sent": 0, "throttled": 0, "failed": 0, "quota_exceeded": 0}
+        self.templates = {}
+
+    @classmethod
+    def from_env(cls):
+        """Configured by FAKE_PROVIDER_LATENCY, _JITTER, _MAX_RATE, _MAX_24H and _FAILURE_RATE."""
+        max_24h = os.environ.get("FAKE_PROVIDER_MAX_24H")
+        return cls(
+            latency=float(os.environ.get("FAKE_PROVIDER_LATENCY", "0.05")),
+            jitter=float(os.environ.get("FAKE_PROVIDER_JITTER", "0")),
+            max_send_rate=float(os.environ.get("FAKE_PROVIDER_MAX_RATE", "14")),
+            max_24h=int(max_24h) if max_24h else None,
+            failure_rate=float(os.environ.get("FAKE_PROVIDER_FAILURE_RATE", "0")),
+        )
+
+    def _admit(self, count):
+        """Decide the outcome of one call: None to accept, else an error code."""
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if self.max_send_rate and len(self._recent) >= self.max_send_rate:
+                self.stats["throttled"] += 1
+                return "Throttling"
+            self._recent.append(now)
+            if self.max_24h is not None and self.sent_24h + count > self.max_24h:
+                self.stats["quota_exceeded"] += 1
+                return "QuotaExceeded"
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                self.stats["failed"] += 1
+                return "InjectedFailure"
+            self.sent_24h += count
+            self.stats["sent"] += count
+            return None
+
+    def _sleep(self):
+        delay = self._delay()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _delay(self):
+        return self.latency + self._random.uniform(-self.jitter, self.jitter) if self.jitter else self.latency
+
+    async def _sleep_async(self):
+        delay = self._delay()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _raise_for(self, outcome):
+        if outcome == "Throttling":
+            raise ProviderError("Throttling", "Maximum sending rate exceeded.")
+        if outcome == "QuotaExceeded":
+            raise ProviderError("Throttling", "Daily message quota exceeded.")
+        if outcome:
+            raise ProviderError("MessageRejected", "Injected failure")
+
+    def send_one(self, from_email, to_email, raw_message):
+        self._sleep()
+        self._raise_for(self._admit(1))
+        return f"fake-{uuid.uuid4().hex}"
+
+    async def send_one_async(self, from_email, to_email, raw_message):
+        await self._sleep_async()
+        self._raise_for(self._admit(1))
+        return f"fake-{uuid.uuid4().hex}"
+
+    def sync_template(self, name, subject, html):
+        self.templates.setdefault(name, (subject, html))
+
+    def _bulk_results(self, template_name, entries):
+        if template_name not in self.templates:
+            raise ProviderError("NotFoundException", f"Template {template_name} does not exist.")
+        self._raise_for(self._admit(len(entries)))
+        return [("SUCCESS", f"fake-{uuid.uuid4().hex}", "") for _ in entries]
+
+    def send_bulk(self, from_email, template_name, entries):
+        self._sleep()
+        return self._bulk_results(template_name, entries)
+
+    async def send_bulk_async(self, from_email, template_name, entries):
+        await self._sleep_async()
+        return self._bulk_results(template_name, entries)
+
+    def send_batch(self, recipients, attachment_json=None):
+        started = time.perf_counter()
+        self._sleep()
+        return self._batch_result(recipients, started)
+
+    async def send_batch_async(self, recipients, attachment_json=None):
+        started = time.perf_counter()
+        await self._sleep_async()
+        return self._batch_result(recipients, started)
+
+    def _batch_result(self, recipients, started):
+        outcome = self._admit(len(recipients))
+        seconds = time.perf_counter() - started
+        if outcome == "Throttling":
+            return 429, "Too many requests", 1, seconds
+        if outcome == "QuotaExceeded":
+            return 403, "Daily quota exceeded", 1, seconds
+        if outcome:
+            return 500, "Injected failure", 1, seconds
+        return 200, '{"status": "success"}', 1, seconds
+
+    def rate_limits(self):
+        return {"max_send_rate": self.max_send_rate, "max_24h": self.max_24h, "sent_24h": self.sent_24h}
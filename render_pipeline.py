@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+
+_SUBJECT_PLACEHOLDER = re.compile(r"\{([^{}]*)\}")
+# Names SES (Handlebars) accepts as plain `{{Name}}` placeholders
+_TEMPLATE_VAR = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_HTML_PLACEHOLDER = re.compile(r"\{\{([A-Za-z_][A-Za-z0-9_]*)\}\}")
+_TEXT_PLACEHOLDER = re.compile(r"\{\{\{([A-Za-z_][A-Za-z0-9_]*)\}\}\}")
+# Handlebars' escapeExpression table, which SES applies to `{{Name}}` values
+_HANDLEBARS_ESCAPES = str.maketrans({
+    "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#x27;", "`": "&#x60;", "=": "&#x3D;",
+})
+# Entities Jinja and Handlebars spell differently for the same character
+_EQUIVALENT_ENTITY = re.compile(r"&(?:#34|quot|#39|#x27|#x60|#x3D);")
+_ENTITY_CHARS = {"&#34;": '"', "&quot;": '"', "&#39;": "'", "&#x27;": "'", "&#x60;": "`", "&#x3D;": "="}
+
+
+def _decode_equivalent_entities(html):
+    return _EQUIVALENT_ENTITY.sub(lambda m: _ENTITY_CHARS[m.group(0)], html)
+
+
+class SubjectTemplate:
+    """Compiled `{Var}` subject line.
+
+    Resolves placeholders the same way the old per-variable `str.replace`
+    passes did: `{Var}`, `{var}` and `{VAR}` all pick up the value of `Var`,
+    the first variable (in row order) wins a clash, and unknown placeholders
+    are left as written. The template is compiled again only if the set of
+    variable names changes between rows.
+    """
+
+    def __init__(self, template):
+        self.template = template or ""
+        self._keys = None
+        self._parts = []
+
+    def _compile(self, keys):
+        lookup = {}
+        for name in keys:
+            for form in (name, name.lower(), name.upper()):
+                lookup.setdefault(form, name)
+
+        parts = []
+        pos = 0
+        for match in _SUBJECT_PLACEHOLDER.finditer(self.template):
+            if match.group(1) in lookup:
+                parts.append((self.template[pos:match.start()], lookup[match.group(1)]))
+                pos = match.end()
+        parts.append((self.template[pos:], None))
+        self._keys = keys
+        self._parts = parts
+
+    def render(self, values):
+        keys = tuple(values)
+        if keys != self._keys:
+            self._compile(keys)
+        out = []
+        for literal, name in self._parts:
+            out.append(literal)
+            if name is not None:
+                out.append(values[name])
+        return "".join(out)
+
+
+class RenderPipeline:
+    """Renders subject + HTML body for a job from templates compiled once.
+
+    The Jinja body template is looked up a single time and rendered directly,
+    skipping Flask's per-call lookup and context processors (the campaign
+    templates only use the row variables).
+    """
+
+    def __init__(self, jinja_env, template_name, subject_template, batch_size=100):
+        self.template = jinja_env.get_template(template_name)
+        self.subject = SubjectTemplate(subject_template)
+        self.batch_size = max(1, int(batch_size))
+        self.rendered = 0
+        self.render_seconds = 0.0
+
+    def render(self, template_vars):
+        return self.subject.render(template_vars), self.template.render(**template_vars)
+
+    def render_batch(self, batch):
+        """Render a list of variable dicts; returns `(subject, html_body, error)` per entry."""
+        started = time.perf_counter()
+        results = []
+        for template_vars in batch:
+            try:
+                subject, html_body = self.render(template_vars)
+            except Exception as e:
+                results.append((None, None, e))
+            else:
+                results.append((subject, html_body, None))
+        self.render_seconds += time.perf_counter() - started
+        self.rendered += len(batch)
+        return results
+
+    @property
+    def renders_per_sec(self):
+        if not self.render_seconds:
+            return 0.0
+        return self.rendered / self.render_seconds
+
+
+class BulkTemplate:
+    """A job's body and subject as an SES stored template with Handlebars placeholders.
+
+    The Jinja template is rendered once with each variable set to its own
+    `{{Name}}` placeholder (`{{{Name}}}` in the subject, which is not HTML),
+    so SES fills in every destination's values from its replacement data.
+    That only holds for templates that print variables as they are, so
+    templates with `{% %}` statements are not `supported`, and `verify`
+    compares one real row rendered both ways before a job relies on it.
+    The template name ends in a hash of its content, so a changed template
+    is stored under a new name instead of updating one a running job uses.
+    """
+
+    def __init__(self, jinja_env, template_name, subject_template, names):
+        source = jinja_env.loader.get_source(jinja_env, template_name)[0]
+        self.supported = "{%" not in source
+        names = [name for name in names if _TEMPLATE_VAR.fullmatch(name)]
+        self.html = jinja_env.get_template(template_name).render(**{name: "{{%s}}" % name for name in names})
+        self.subject = SubjectTemplate(subject_template).render({name: "{{{%s}}}" % name for name in names})
+        # Replacement data only carries the variables the template uses
+        used = set(_HTML_PLACEHOLDER.findall(self.html)) | set(_TEXT_PLACEHOLDER.findall(self.subject))
+        self.names = [name for name in names if name in used]
+        digest = hashlib.sha1(f"{self.subject}\0{self.html}".encode("utf-8")).hexdigest()[:16]
+        base = re.sub(r"[^A-Za-z0-9_-]", "-", os.path.splitext(os.path.basename(template_name))[0])[:40]
+        self.name = f"{base}-{digest}"
+
+    def data(self, template_vars):
+        """Replacement template data (JSON) for one destination."""
+        return json.dumps({name: template_vars.get(name, "") for name in self.names}, ensure_ascii=False)
+
+    def fill(self, template_vars):
+        """`(subject, html)` as SES would produce them for `template_vars`."""
+        subject = _TEXT_PLACEHOLDER.sub(lambda m: str(template_vars.get(m.group(1), "")), self.subject)
+        html = _HTML_PLACEHOLDER.sub(lambda m: str(template_vars.get(m.group(1), "")).translate(_HANDLEBARS_ESCAPES), self.html)
+        return subject, html
+
+    def verify(self, template_vars, subject, html_body):
+        """True if the stored template reproduces the Jinja-rendered `subject` and `html_body` for this row.
+
+        Quotes, backticks and `=` may be escaped with different entities on
+        each side (e.g. `&#34;` vs `&quot;`), which display the same, so those
+        are compared decoded; `<`, `>` and `&` must match exactly.
+        """
+        if not self.supported:
+            return False
+        filled_subject, filled_html = self.fill(template_vars)
+        return filled_subject == subject and _decode_equivalent_entities(filled_html) == _decode_equivalent_entities(html_body)
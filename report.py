@@ -1,9 +1,12 @@
 import boto3
 import csv
-import json
 from botocore.exceptions import ClientError
 from datetime import datetime, timedelta
 
+from event_store import EventStore
+from suppression import SuppressionIndex
+from ses_events import EVENT_PRIORITY, JSON_BACKEND, EventReducer, fetch_events  # EVENT_PRIORITY kept importable from here
+
 # -------- Configuration --------
 BUCKET_NAME = "ses-event-logs-example"
 START_DATE = datetime(2025, 10, 16)
@@ -13,18 +16,6 @@ DATE_PREFIXES = [f"ses/2025/10/{(START_DATE + timedelta(days=x)).strftime('%d')}
 INPUT_CSV = "camp4.csv"
 OUTPUT_CSV = "email_campaign_report-16-10-2025.csv"
 
-EVENT_PRIORITY = {
-    "Bounce": 5,
-    "Complaint": 4,
-    "Delivery": 3,
-    "DeliveryDelay": 2,
-    "Send": 1,
-    "Open": 0,
-    "Click": 0,
-    "Reject": 0,
-    "Unknown": -1,
-}
-
 # AWS S3 client
 try:
     s3_client = boto3.client("s3", region_name="ap-south-1")
@@ -32,89 +23,38 @@ except Exception as e:
     print(f"⚠️ Failed to initialize S3 client: {e}")
     exit(1)
 
-def list_all_keys(bucket: str, prefix: str):
-    """List every object key under prefix, handling pagination."""
-    keys = []
+def fetch_s3_events():
+    """Fetch SES events from S3 for multiple date prefixes, reduced to the best-status event per email.
+
+    Objects already parsed into the local event store (generated/ses_events.sqlite3)
+    are read from disk; only new objects are downloaded.
+    """
+    email_events = EventReducer()
+    stats = {"objects": 0, "cached_objects": 0}
     try:
-        paginator = s3_client.get_paginator("list_objects_v2")
-        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-            for obj in page.get("Contents", []):
-                keys.append(obj["Key"])
-        print(f"📋 Found {len(keys)} objects in bucket '{bucket}' with prefix '{prefix}'")
-        return keys
+        with EventStore() as store:
+            events_by_object, stats = fetch_events(s3_client, BUCKET_NAME, DATE_PREFIXES, store=store)
+            for obj, events in events_by_object:
+                print(f"📂 Processed file {stats['objects']}: {obj['Key']} ({len(events)} events)")
+                email_events.add_events(events)
     except ClientError as e:
-        print(f"⚠️ Error listing objects for prefix '{prefix}': {e}")
+        print(f"⚠️ Error reading events from bucket '{BUCKET_NAME}': {e}")
         if e.response['Error']['Code'] == 'NoSuchBucket':
-            print(f"Bucket '{bucket}' does not exist.")
+            print(f"Bucket '{BUCKET_NAME}' does not exist.")
         elif e.response['Error']['Code'] == 'AccessDenied':
-            print(f"Access denied to bucket '{bucket}'. Check IAM permissions.")
-        return []
+            print(f"Access denied to bucket '{BUCKET_NAME}'. Check IAM permissions.")
     except Exception as e:
-        print(f"⚠️ General error listing objects for prefix '{prefix}': {e}")
-        return []
-
-def fetch_s3_events():
-    """Fetch SES events from S3 for multiple date prefixes and return a dict keyed by email."""
-    email_events = {}
-    file_count = 0
-
-    # Process each date prefix
-    for prefix in DATE_PREFIXES:
-        print(f"🔍 Checking prefix: {prefix}")
-        for key in list_all_keys(BUCKET_NAME, prefix):
-            # Process all files (no extension check for SES Firehose files)
-            file_count += 1
-            print(f"📂 Processing file {file_count}: {key}")
-            try:
-                s3_object = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)
-                body = s3_object["Body"].read().decode("utf-8", errors="ignore")
-                lines = body.splitlines()
-                print(f"📜 {len(lines)} lines in {key}")
-
-                for line in lines:
-                    if not line.strip():
-                        continue
-                    try:
-                        event = json.loads(line)
-                        print(f"✅ Parsed JSON: {event.get('eventType')} for {event.get('mail', {}).get('destination', [])}")
-                        event_type = event.get("eventType", "Unknown")
-                        mail = event.get("mail", {})
-                        destinations = mail.get("destination", [])
-                        message_id = mail.get("messageId", "")
-                        if not destinations or not message_id:
-                            print(f"⚠️ Skipping event with missing email or message_id: {event}")
-                            continue
-
-                        error = ""
-                        if event_type == "Bounce":
-                            error = event.get("bounce", {}).get("diagnosticCode", "Unknown bounce reason")
-                        elif event_type == "Complaint":
-                            error = event.get("complaint", {}).get("complaintFeedbackType", "Unknown complaint")
-                        elif event_type == "DeliveryDelay":
-                            delayed = event.get("deliveryDelay", {}).get("delayedRecipients", [{}])
-                            error = delayed[0].get("diagnosticCode", "Unknown delay reason") if delayed else "Unknown delay reason"
-                        elif event_type in ["Reject", "HardBounce"]:
-                            error = event.get("bounce", {}).get("diagnosticCode", "Unknown reason")
-
-                        for email in destinations:
-                            email = email.lower().strip()
-                            if not email:
-                                continue
-                            print(f"📧 JSON email: '{email}'")
-                            email_events.setdefault(email, []).append(
-                                {"status": event_type, "message_id": message_id, "error": error}
-                            )
-                            print(f"✅ Recorded {event_type} for {email}")
-                    except json.JSONDecodeError as e:
-                        print(f"⚠️ JSON decode error in {key}: {e}")
-                    except Exception as e:
-                        print(f"⚠️ General error processing line in {key}: {e}")
-            except ClientError as e:
-                print(f"⚠️ Error reading {key}: {e}")
-            except Exception as e:
-                print(f"⚠️ General error reading {key}: {e}")
-
-    print(f"📦 Processed {file_count} JSON files, {len(email_events)} unique emails with events")
+        print(f"⚠️ General error reading events: {e}")
+
+    print(f"📦 Processed {stats['objects']} JSON files ({stats['cached_objects']} from local cache), {len(email_events)} unique emails with events")
+    for error in stats.get("object_errors", []):
+        print(f"⚠️ Skipped unreadable object {error}")
+    if stats.get("skipped_objects", 0) > len(stats.get("object_errors", [])):
+        print(f"⚠️ Skipped {stats['skipped_objects']} unreadable objects in total")
+    if stats.get("parse_seconds"):
+        print(f"⏱️ Parsed {stats['bytes'] / 1e6:.1f} MB of events at {stats['bytes'] / stats['parse_seconds'] / 1e6:.1f} MB/s ({JSON_BACKEND})")
+    with SuppressionIndex() as suppression:
+        print(f"🚫 Suppression list: {suppression.add_from_reducer(email_events)} hard bounces/complaints recorded, {len(suppression)} addresses suppressed")
     return email_events
 
 def generate_report():
@@ -150,20 +90,16 @@ def generate_report():
             writer.writerow(["Email", "Name", "Membership ID", "Mobile", "Status", "Message ID", "Error"])
 
             for r in recipients:
-                events = email_events.get(
-                    r["email"],
-                    [{"status": "Unknown", "message_id": "", "error": "No event data"}],
-                )
-                latest = max(events, key=lambda e: EVENT_PRIORITY.get(e["status"], -1))
+                status, message_id, error = email_events.latest(r["email"])
                 writer.writerow(
                     [
                         r["email"],
                         r["name"],
                         r["membership_id"],
                         r["mobile"],
-                        latest["status"],
-                        latest["message_id"],
-                        latest["error"],
+                        status,
+                        message_id,
+                        error,
                     ]
                 )
         print(f"✅ Report generated locally: {OUTPUT_CSV}")
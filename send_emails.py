@@ -1,6 +1,7 @@
 import boto3
 import csv
 import os
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from email.mime.multipart import MIMEMultipart
@@ -8,7 +9,11 @@ from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
 from email.mime.image import MIMEImage
 
+from providers import SesProvider
+from send_engine import AdaptiveRateController, QuotaExceeded, TokenBucket
+
 ses_client = boto3.client('ses', region_name='ap-south-1')
+provider = SesProvider(ses_client, config_set='ses-event-config')
 
 FROM_EMAIL = 'valuervijai@romexconsultancy.com'
 
@@ -145,14 +150,14 @@ def send_email(to_email, name, membership_id, mobile):
     #         msg.attach(part)
 
     try:
-        ses_client.send_raw_email(
-            Source=FROM_EMAIL,
-            Destinations=[to_email],
-            RawMessage={'Data': msg.as_string()},
-            ConfigurationSetName='ses-event-config'
-        )
+        controller.call(provider.send_one, FROM_EMAIL, to_email, msg.as_string())
         print(f"✅ Sent: {to_email}")
+    except QuotaExceeded as e:
+        controller.release()
+        quota_exhausted.set()
+        print(f"🛑 SES 24-hour sending quota exhausted at {to_email}: {e}")
     except Exception as e:
+        controller.release()
         print(f"❌ Error sending to {to_email}: {e}")
 
 # CSV reading and threaded sending
@@ -164,8 +169,19 @@ with open(CSV_FILE, 'r') as file:
 
 start = time.time()
 futures = []
+# Pace at the account's SES MaxSendRate and back off on throttling
+limiter = TokenBucket(1)
+controller = AdaptiveRateController.from_limits(limiter, provider.rate_limits())
+# Set once SES reports the daily quota used up; no more emails are queued after that
+quota_exhausted = threading.Event()
 with ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
     for row in recipients:
+        if quota_exhausted.is_set():
+            break
+        if not controller.reserve():
+            print(f"🛑 Stopping before exceeding the SES 24-hour quota of {controller.max_24h:g} emails")
+            break
+        limiter.acquire()
         futures.append(executor.submit(
             send_email,
             row['Email'].strip(),
@@ -173,9 +189,7 @@ with ThreadPoolExecutor(max_workers=MAX_THREADS) as executor:
             row['MembershipID'].strip(),
             row['Mobile'].strip()
         ))
-        if len(futures) % 14 == 0:
-            time.sleep(1)
     for f in as_completed(futures):
         f.result()
 
-print(f"✅ All {len(recipients)} emails sent in {time.time()-start:.2f} seconds!")
\ No newline at end of file
+print(f"✅ {len(futures)} of {len(recipients)} emails processed in {time.time()-start:.2f} seconds!")
\ No newline at end of file
@@ -0,0 +1,377 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` sends per second, bursting up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self._lock = threading.Lock()
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def set_rate(self, rate, capacity=None):
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+            self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def _take(self, tokens):
+        """Spend `tokens` and return None, or return the seconds to wait before trying again."""
+        with self._lock:
+            if self.rate <= 0:
+                return None
+            self._refill()
+            # Requests larger than the bucket may overdraw it; later callers wait it off
+            if self._tokens >= min(tokens, self.capacity):
+                self._tokens -= tokens
+                return None
+            return (min(tokens, self.capacity) - self._tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` can be spent. A rate <= 0 means unlimited."""
+        while True:
+            wait = self._take(tokens)
+            if wait is None:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        """`acquire` for coroutines: waits without blocking the event loop."""
+        while True:
+            wait = self._take(tokens)
+            if wait is None:
+                return
+            await asyncio.sleep(wait)
+
+
+class SendEngine:
+    """Bounded worker pool that paces calls to `send_fn` through a shared TokenBucket.
+
+    At most `max_in_flight` sends are queued or running at once, so the caller
+    blocks in `submit` instead of buffering the whole recipient list.
+    """
+
+    def __init__(self, send_fn, limiter, max_in_flight=14):
+        self.send_fn = send_fn
+        self.limiter = limiter
+        self.max_in_flight = max(1, int(max_in_flight))
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="send")
+
+    def submit(self, item, on_done, tokens=1):
+        """Queue `item`, spending `tokens` from the limiter (e.g. one per recipient of a bulk call).
+
+        `on_done(item, result, error)` runs on a worker thread.
+        """
+        self._slots.acquire()
+        try:
+            self.limiter.acquire(tokens)
+            return self._executor.submit(self._run, item, on_done)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _run(self, item, on_done):
+        try:
+            try:
+                result = self.send_fn(item)
+            except Exception as e:
+                on_done(item, None, e)
+            else:
+                on_done(item, result, None)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncSendEngine:
+    """SendEngine counterpart whose sends are coroutines on one asyncio event loop.
+
+    `send_fn(item)` must be a coroutine function. Hundreds of sends can be
+    in flight without a thread each; `submit` blocks and paces exactly like
+    SendEngine's. The loop runs on its own thread, and `on_done` callbacks
+    run one at a time on another thread, so slow bookkeeping (e.g. job store
+    writes) never stalls the loop. `on_close`, if given, is a coroutine
+    function awaited on the loop after the last send (e.g. to close HTTP
+    sessions created on it).
+    """
+
+    def __init__(self, send_fn, limiter, max_in_flight=14, on_close=None):
+        self.send_fn = send_fn
+        self.limiter = limiter
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.on_close = on_close
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, name="send-loop", daemon=True)
+        self._loop_thread.start()
+        self._done = queue.SimpleQueue()
+        self._done_thread = threading.Thread(target=self._run_callbacks, name="send-done", daemon=True)
+        self._done_thread.start()
+
+    def submit(self, item, on_done, tokens=1):
+        """Queue `item`, spending `tokens` from the limiter; `on_done(item, result, error)` runs on the callback thread."""
+        self._slots.acquire()
+        try:
+            self.limiter.acquire(tokens)
+            return asyncio.run_coroutine_threadsafe(self._run(item, on_done), self._loop)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def _run(self, item, on_done):
+        try:
+            result = await self.send_fn(item)
+        except Exception as e:
+            self._done.put((on_done, item, None, e))
+        else:
+            self._done.put((on_done, item, result, None))
+
+    def _run_callbacks(self):
+        while True:
+            entry = self._done.get()
+            if entry is None:
+                return
+            on_done, item, result, error = entry
+            try:
+                on_done(item, result, error)
+            except Exception:
+                # As in SendEngine, a failing callback does not stop the other sends
+                pass
+            finally:
+                self._slots.release()
+
+    def close(self):
+        # Every slot is free again once the last callback has run
+        for _ in range(self.max_in_flight):
+            self._slots.acquire()
+        try:
+            if self.on_close is not None:
+                asyncio.run_coroutine_threadsafe(self.on_close(), self._loop).result()
+        finally:
+            # The loop and callback threads stop even if on_close raised
+            self._done.put(None)
+            self._done_thread.join()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join()
+            self._loop.close()
+            for _ in range(self.max_in_flight):
+                self._slots.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Error codes SES (v1 and v2) uses when a send is rejected for going too fast
+THROTTLE_ERROR_CODES = {"Throttling", "ThrottlingException", "MaxSendRateExceeded", "TooManyRequestsException"}
+DAILY_QUOTA_MESSAGE = "daily message quota exceeded"
+# Per-destination status SendBulkEmail gives entries it throttled while sending the rest
+BULK_THROTTLED_STATUS = "ACCOUNT_THROTTLED"
+
+
+class QuotaExceeded(Exception):
+    """Raised when the account's 24-hour SES sending quota is used up."""
+
+
+def _error_code_and_message(error):
+    details = getattr(error, "response", None) or {}
+    details = details.get("Error", {}) if isinstance(details, dict) else {}
+    return details.get("Code", ""), details.get("Message", str(error))
+
+
+def is_throttle_error(error):
+    code, _ = _error_code_and_message(error)
+    return code in THROTTLE_ERROR_CODES
+
+
+def is_daily_quota_error(error):
+    _, message = _error_code_and_message(error)
+    return DAILY_QUOTA_MESSAGE in (message or "").lower()
+
+
+class AdaptiveRateController:
+    """AIMD controller that drives a TokenBucket between `min_rate` and `max_rate`.
+
+    The rate is cut by `decrease_factor` on throttling and grows by
+    `increase_step` for each `increase_interval` seconds of throttle-free sending.
+    Throttles within `increase_interval` of the last cut are counted but do not
+    cut again, so sends throttled in the same burst are one congestion event.
+    It also tracks the remaining 24-hour quota so a job can stop before SES
+    starts rejecting the whole tail of the list.
+    """
+
+    def __init__(self, limiter, max_rate, min_rate=1.0, increase_step=None, decrease_factor=0.5,
+                 increase_interval=1.0, max_24h=None, sent_24h=0, max_retries=5):
+        self._lock = threading.Lock()
+        self.limiter = limiter
+        self.max_rate = float(max_rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.increase_step = increase_step or max(1.0, self.max_rate * 0.05)
+        self.decrease_factor = decrease_factor
+        self.increase_interval = increase_interval
+        self.max_retries = max_retries
+        self.throttle_count = 0
+        # Max24HourSend of -1 means the account has no daily cap
+        self.max_24h = max_24h if max_24h is not None and max_24h >= 0 else None
+        self.sent_24h = sent_24h
+        self._reserved = 0
+        self._last_change = time.monotonic()
+        self._last_decrease = float("-inf")
+        limiter.set_rate(self.max_rate)
+
+    @classmethod
+    def from_limits(cls, limiter, limits, ceiling=None, **kwargs):
+        """Build a controller from a provider's `rate_limits()`, optionally capped at `ceiling` emails/sec."""
+        max_rate = float(limits.get("max_send_rate") or ceiling or 1.0)
+        if ceiling:
+            max_rate = min(max_rate, float(ceiling))
+        return cls(
+            limiter,
+            max_rate,
+            max_24h=limits.get("max_24h"),
+            sent_24h=limits.get("sent_24h") or 0,
+            **kwargs
+        )
+
+    @property
+    def rate(self):
+        return self.limiter.rate
+
+    @property
+    def remaining_24h(self):
+        if self.max_24h is None:
+            return None
+        return max(0, int(self.max_24h - self.sent_24h - self._reserved))
+
+    def reserve(self, count=1):
+        """Claim `count` sends against the daily quota; False once it is used up."""
+        with self._lock:
+            if self.max_24h is not None and self.sent_24h + self._reserved + count > self.max_24h:
+                return False
+            self._reserved += count
+            return True
+
+    def release(self, count=1):
+        """Return a reservation for sends that SES did not accept."""
+        with self._lock:
+            self._reserved = max(0, self._reserved - count)
+
+    def on_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.limiter.rate < self.max_rate and now - self._last_change >= self.increase_interval:
+                self.limiter.set_rate(min(self.max_rate, self.limiter.rate + self.increase_step))
+                self._last_change = now
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttle_count += 1
+            now = time.monotonic()
+            if now - self._last_decrease < self.increase_interval:
+                return
+            self.limiter.set_rate(max(self.min_rate, self.limiter.rate * self.decrease_factor))
+            self._last_change = self._last_decrease = now
+
+    def _should_retry(self, error, attempt):
+        """True (after slowing down) if a send that raised `error` on try `attempt` should be retried."""
+        if is_daily_quota_error(error):
+            raise QuotaExceeded(str(error)) from error
+        if not is_throttle_error(error) or attempt >= self.max_retries:
+            return False
+        self.on_throttle()
+        return True
+
+    def call(self, fn, *args, **kwargs):
+        """Run `fn`, backing off and retrying on throttling errors.
+
+        Raises QuotaExceeded when SES reports the daily quota is exhausted.
+        """
+        attempt = 0
+        while True:
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                attempt += 1
+                self.limiter.acquire()
+                continue
+            self.on_success()
+            return result
+
+    async def call_async(self, fn, *args, **kwargs):
+        """`call` for a coroutine function `fn`, for the asyncio send engine."""
+        attempt = 0
+        while True:
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                attempt += 1
+                await self.limiter.acquire_async()
+                continue
+            self.on_success()
+            return result
+
+    def _throttled_entries(self, results, attempt):
+        """Indexes of `results` to send again after try `attempt` (slowing down if any were throttled)."""
+        throttled = [i for i, (status, _, _) in enumerate(results) if status == BULK_THROTTLED_STATUS]
+        if not throttled:
+            return []
+        self.on_throttle()
+        return throttled if attempt < self.max_retries else []
+
+    def call_bulk(self, fn, entries, *args):
+        """`call` for a bulk send `fn(*args, entries)` returning one `(status, message_id, detail)` per entry.
+
+        Entries SES reports as ACCOUNT_THROTTLED are sent again, once their
+        tokens are available, up to `max_retries` times; any still throttled
+        keep that status in the returned list.
+        """
+        results = list(self.call(fn, *args, entries))
+        attempt = 0
+        while True:
+            throttled = self._throttled_entries(results, attempt)
+            if not throttled:
+                return results
+            attempt += 1
+            self.limiter.acquire(len(throttled))
+            for i, result in zip(throttled, self.call(fn, *args, [entries[i] for i in throttled])):
+                results[i] = result
+
+    async def call_bulk_async(self, fn, entries, *args):
+        """`call_bulk` for a coroutine function `fn`, for the asyncio send engine."""
+        results = list(await self.call_async(fn, *args, entries))
+        attempt = 0
+        while True:
+            throttled = self._throttled_entries(results, attempt)
+            if not throttled:
+                return results
+            attempt += 1
+            await self.limiter.acquire_async(len(throttled))
+            for i, result in zip(throttled, await self.call_async(fn, *args, [entries[i] for i in throttled])):
+                results[i] = result
@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+import time
+
+
+CHECKPOINT_DIR = os.environ.get(
+    "SEND_CHECKPOINT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "generated", "checkpoints"),
+)
+
+
+class SendCheckpoint:
+    """Append-only log of the CSV rows a send job has handed to SES.
+
+    Each accepted message is one tab-separated line: row index, email,
+    SES MessageId and unix send time. Lines are flushed as they are written,
+    so after a crash the log tells a resumed job exactly which rows to skip.
+    The job's parameters are kept next to it so the job can be restarted.
+    """
+
+    def __init__(self, job_id, directory=CHECKPOINT_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.job_id = job_id
+        self.path = os.path.join(directory, f"{job_id}.log")
+        self.params_path = os.path.join(directory, f"{job_id}.json")
+        self._lock = threading.Lock()
+        self._file = None
+
+    def exists(self):
+        return os.path.exists(self.params_path)
+
+    def save_params(self, params):
+        tmp_path = self.params_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(params, f)
+        os.replace(tmp_path, self.params_path)
+
+    def load_params(self):
+        with open(self.params_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def entries(self):
+        """Yield `(row, email, message_id, sent_at)` for every complete line in the log."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                # A crash can leave a half-written last line; it is simply not counted
+                if len(parts) != 4 or not line.endswith("\n"):
+                    continue
+                try:
+                    yield int(parts[0]), parts[1], parts[2], float(parts[3])
+                except ValueError:
+                    continue
+
+    def completed_rows(self):
+        return {row for row, _, _, _ in self.entries()}
+
+    def message_index(self):
+        """`({message_id: email}, first_sent_at, last_sent_at)` for the messages in the log.
+
+        Emails are lowercased and stripped like report events; the times are
+        None when nothing has been sent yet.
+        """
+        index = {}
+        first = last = None
+        for _, email, message_id, sent_at in self.entries():
+            if not message_id:
+                continue
+            index[message_id] = email.lower().strip()
+            first = sent_at if first is None else min(first, sent_at)
+            last = sent_at if last is None else max(last, sent_at)
+        return index, first, last
+
+    def record(self, row, email, message_id):
+        line = f"{row}\t{email}\t{message_id}\t{time.time():.3f}\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+                # End a line a crash left half-written, so the first new entry is not merged into it
+                if self._file.tell() and not self._ends_with_newline():
+                    self._file.write("\n")
+            self._file.write(line)
+            self._file.flush()
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,130 @@
+import asyncio
+import base64
+import xml.etree.ElementTree as ET
+from urllib.parse import urlencode
+
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.exceptions import ClientError, NoCredentialsError
+
+from msg91_client import backoff_delay
+
+# Only the asyncio send engine needs aiohttp; see msg91_client
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+SES_API_VERSION = "2010-12-01"
+# Server-side failures worth retrying; throttling (400/429) is left to the rate controller
+RETRY_STATUS_CODES = {500, 502, 503, 504}
+
+
+def _xml_text(root, name):
+    """Text of the first element called `name` (any namespace), or ""."""
+    for element in root.iter():
+        if element.tag == name or element.tag.endswith("}" + name):
+            return element.text or ""
+    return ""
+
+
+class AsyncSesClient:
+    """SES (v1) SendRawEmail for the asyncio send engine: SigV4-signed requests on an aiohttp session.
+
+    Signing uses botocore, so credentials come from the usual boto3 chain and
+    are refreshed the same way; a refresh (an STS or instance-metadata call)
+    runs on a worker thread so it never blocks the event loop. Errors are raised as botocore ClientErrors,
+    so throttling and quota errors are classified as with the boto3 client.
+    Connection errors, timeouts and 5xx responses are retried up to
+    `max_retries` times with exponential backoff and full jitter, like the
+    boto3 client's own retries. The session is created on first use;
+    `aclose()` it on the same loop.
+    """
+
+    def __init__(self, region, credentials, endpoint_url=None, pool_size=100, timeout=60,
+                 max_retries=4, backoff_base=0.5, backoff_max=20.0):
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is not installed")
+        self.region = region
+        self.credentials = credentials
+        self.endpoint_url = endpoint_url or f"https://email.{region}.amazonaws.com/"
+        self.pool_size = max(1, pool_size)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = None
+        self._frozen = None
+        self._refresh_lock = asyncio.Lock()
+
+    async def _frozen_credentials(self):
+        """Current credentials, refreshed off the event loop when they are missing or about to expire."""
+        if self.credentials is None:
+            raise NoCredentialsError()
+        refresh_needed = getattr(self.credentials, "refresh_needed", None)
+        if self._frozen is None or (refresh_needed is not None and refresh_needed()):
+            async with self._refresh_lock:
+                if self._frozen is None or (refresh_needed is not None and refresh_needed()):
+                    loop = asyncio.get_running_loop()
+                    self._frozen = await loop.run_in_executor(None, self.credentials.get_frozen_credentials)
+        return self._frozen
+
+    def _signed_headers(self, body, credentials):
+        request = AWSRequest(method="POST", url=self.endpoint_url, data=body,
+                             headers={"Content-Type": "application/x-www-form-urlencoded; charset=utf-8"})
+        SigV4Auth(credentials, "ses", self.region).add_auth(request)
+        return dict(request.headers.items())
+
+    async def send_raw_email(self, source, destination, raw_message, config_set=None):
+        """Send one raw MIME message (str or bytes); returns its MessageId."""
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        if isinstance(raw_message, str):
+            raw_message = raw_message.encode("utf-8")
+        params = {
+            "Action": "SendRawEmail",
+            "Version": SES_API_VERSION,
+            "Source": source,
+            "Destinations.member.1": destination,
+            "RawMessage.Data": base64.b64encode(raw_message).decode("ascii"),
+        }
+        if config_set:
+            params["ConfigurationSetName"] = config_set
+        body = urlencode(params).encode("utf-8")
+        status, text = await self._post(body)
+        try:
+            root = ET.fromstring(text)
+        except ET.ParseError:
+            root = ET.Element("Unparsed")
+        if status >= 300:
+            code = _xml_text(root, "Code") or ("Throttling" if status == 429 else f"HTTP{status}")
+            message = _xml_text(root, "Message") or text[:300]
+            raise ClientError({"Error": {"Code": code, "Message": message}, "ResponseMetadata": {"HTTPStatusCode": status}}, "SendRawEmail")
+        return _xml_text(root, "MessageId")
+
+    async def _post(self, body):
+        """POST a signed request, retrying connection errors, timeouts and 5xx; returns `(status, text)`."""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                # Signed again for every attempt, as the signature carries the request time
+                headers = self._signed_headers(body, await self._frozen_credentials())
+                async with self.session.post(self.endpoint_url, data=body, headers=headers) as response:
+                    status, text = response.status, await response.text()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt > self.max_retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt - 1, None, self.backoff_base, self.backoff_max))
+                continue
+            if status not in RETRY_STATUS_CODES or attempt > self.max_retries:
+                return status, text
+            await asyncio.sleep(backoff_delay(attempt - 1, None, self.backoff_base, self.backoff_max))
+
+    async def aclose(self):
+        if self.session is not None:
+            await self.session.close()
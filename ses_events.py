@@ -0,0 +1,529 @@
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from event_store import EventStore
+
+
+DEFAULT_FETCH_WORKERS = 16
+GZIP_MAGIC = b"\x1f\x8b"
+
+EVENT_PRIORITY = {
+    "Bounce": 5,
+    "Complaint": 4,
+    "Delivery": 3,
+    "DeliveryDelay": 2,
+    "Send": 1,
+    "Open": 0,
+    "Click": 0,
+    "Reject": 0,
+    "Unknown": -1,
+}
+EVENT_TYPES = list(EVENT_PRIORITY)
+_TYPE_INDEX = {event_type: i for i, event_type in enumerate(EVENT_TYPES)}
+NO_EVENT_DATA = ("Unknown", "", "No event data")
+
+# orjson decodes SES events several times faster than the json module; it is optional
+try:
+    import orjson
+except ImportError:
+    orjson = None
+if orjson is not None and os.environ.get("SES_EVENT_JSON", "").lower() != "json":
+    JSON_BACKEND = "orjson"
+    _json_loads = orjson.loads
+else:
+    JSON_BACKEND = "json"
+    _json_loads = json.loads
+
+_EVENT_TYPE_KEY = b'"eventType"'
+
+
+def date_prefixes(start_date, end_date):
+    """S3 prefixes like ses/YYYY/MM/DD/ for every day in the range (inclusive)."""
+    prefixes = []
+    day = start_date
+    while day <= end_date:
+        prefixes.append(f"ses/{day.strftime('%Y/%m/%d/')}")
+        day += timedelta(days=1)
+    return prefixes
+
+
+def list_objects(s3_client, bucket, prefix):
+    """Every object under `prefix` as dicts with Key, ETag and Size, handling pagination."""
+    objects = []
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            objects.append({"Key": obj["Key"], "ETag": obj.get("ETag", "").strip('"'), "Size": obj.get("Size", 0)})
+    return objects
+
+
+def parse_event(event):
+    """Reduce one decoded SES event to `(event_type, recipients, message_id, timestamp, bounce_type)`, or None.
+
+    `recipients` is a list of `(email, error)` pairs. For bounces these are
+    the `bouncedRecipients`, each with its own diagnostic, and `bounce_type`
+    is the bounce's `bounceType` (Permanent, Transient or Undetermined);
+    for other events it is "".
+    """
+    event_type = event.get("eventType", "Unknown")
+    mail = event.get("mail", {})
+    destinations = mail.get("destination", [])
+    message_id = mail.get("messageId", "")
+    if not destinations or not message_id:
+        return None
+    error_msg = ""
+    bounce_type = ""
+    if event_type == "Bounce":
+        bounce = event.get("bounce", {})
+        bounce_type = bounce.get("bounceType", "")
+        error_msg = bounce.get("diagnosticCode", "Unknown bounce reason")
+        bounced = [r for r in bounce.get("bouncedRecipients", []) if r.get("emailAddress")]
+        if bounced:
+            recipients = [(r["emailAddress"], r.get("diagnosticCode") or error_msg) for r in bounced]
+        else:
+            recipients = [(email, error_msg) for email in destinations]
+    else:
+        if event_type == "Complaint":
+            error_msg = event.get("complaint", {}).get("complaintFeedbackType", "Unknown complaint")
+        elif event_type == "DeliveryDelay":
+            delayed = event.get("deliveryDelay", {}).get("delayedRecipients", [{}])
+            error_msg = delayed[0].get("diagnosticCode", "Unknown delay reason") if delayed else "Unknown delay reason"
+        elif event_type in ["Reject", "HardBounce"]:
+            error_msg = event.get("bounce", {}).get("diagnosticCode", "Unknown reason")
+        recipients = [(email, error_msg) for email in destinations]
+    # Event-specific blocks (bounce, delivery, open, ...) carry their own timestamp
+    details = event.get(event_type[:1].lower() + event_type[1:], None)
+    timestamp = (details.get("timestamp") if isinstance(details, dict) else None) or mail.get("timestamp", "")
+    return event_type, recipients, message_id, timestamp, bounce_type
+
+
+def peek_event_type(line):
+    """The eventType of a raw (bytes) event line without decoding it, or None if not found cheaply."""
+    start = line.find(_EVENT_TYPE_KEY)
+    if start < 0:
+        return None
+    colon = line.find(b":", start + len(_EVENT_TYPE_KEY))
+    open_quote = line.find(b'"', colon + 1)
+    close_quote = line.find(b'"', open_quote + 1)
+    if colon < 0 or open_quote < 0 or close_quote < 0 or line[colon + 1:open_quote].strip():
+        return None
+    return line[open_quote + 1:close_quote].decode("utf-8", errors="ignore")
+
+
+def parse_lines(lines, event_types=None, stats=None):
+    """Parse JSON-lines (bytes or str) into per-recipient `(email, event_type, message_id, error, timestamp, bounce_type)` tuples.
+
+    Blank and malformed lines are skipped; emails are lowercased and stripped.
+    With `event_types`, lines of other types are dropped before they are
+    decoded. With `stats`, adds the bytes, lines, skipped lines and seconds
+    spent parsing (excluding reading `lines`) to it.
+    """
+    events = []
+    total_bytes = line_count = skipped = 0
+    seconds = 0.0
+    clock = time.perf_counter
+    for line in lines:
+        started = clock()
+        line_count += 1
+        total_bytes += len(line)
+        if not line.strip():
+            seconds += clock() - started
+            continue
+        if event_types is not None:
+            raw = line if isinstance(line, bytes) else line.encode("utf-8")
+            peeked = peek_event_type(raw)
+            if peeked is not None and peeked not in event_types:
+                skipped += 1
+                seconds += clock() - started
+                continue
+        try:
+            try:
+                decoded = _json_loads(line)
+            except ValueError:
+                if not isinstance(line, bytes):
+                    raise
+                decoded = json.loads(line.decode("utf-8", errors="ignore"))
+            parsed = parse_event(decoded)
+        except Exception:
+            # Ignore malformed JSON lines and any unexpected line-level errors
+            seconds += clock() - started
+            continue
+        if parsed and (event_types is None or parsed[0] in event_types):
+            event_type, recipients, message_id, timestamp, bounce_type = parsed
+            for email, error_msg in recipients:
+                email_key = email.lower().strip()
+                if email_key:
+                    events.append((email_key, event_type, message_id, error_msg, timestamp, bounce_type))
+        seconds += clock() - started
+    if stats is not None:
+        stats["bytes"] = stats.get("bytes", 0) + total_bytes
+        stats["lines"] = stats.get("lines", 0) + line_count
+        stats["skipped_lines"] = stats.get("skipped_lines", 0) + skipped
+        stats["parse_seconds"] = stats.get("parse_seconds", 0.0) + seconds
+    return events
+
+
+def join_on_message_ids(events, message_ids):
+    """Keep only parsed events whose message_id is in `message_ids`, keyed by the email it maps to.
+
+    `message_ids` is a send ledger's `{message_id: email}` index, so a report
+    sees exactly the messages of one campaign and nothing else sent to the
+    same addresses.
+    """
+    get = message_ids.get
+    for _, event_type, message_id, error, timestamp, bounce_type in events:
+        email = get(message_id)
+        if email is not None:
+            yield email, event_type, message_id, error, timestamp, bounce_type
+
+
+class _BodyReader(io.RawIOBase):
+    """Raw IO adapter over a botocore StreamingBody whose first bytes were already read."""
+
+    def __init__(self, body, head=b""):
+        self._body = body
+        self._head = head
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        if self._head:
+            n = min(len(buf), len(self._head))
+            buf[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        data = self._body.read(len(buf))
+        buf[:len(data)] = data
+        return len(data)
+
+
+def open_event_stream(response):
+    """Line-iterable binary stream over a GetObject response, gunzipping on the fly.
+
+    Compression is detected from the gzip magic bytes rather than trusting
+    ContentEncoding, which Firehose does not set on its .gz objects.
+    """
+    body = response["Body"]
+    head = body.read(2)
+    raw = io.BufferedReader(_BodyReader(body, head), buffer_size=64 * 1024)
+    if head == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    return raw
+
+
+def iter_object_lines(s3_client, bucket, key):
+    """Stream an S3 object as raw byte lines without holding the (decompressed) body in memory."""
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    stream = open_event_stream(response)
+    try:
+        yield from stream
+    finally:
+        stream.close()
+        response["Body"].close()
+
+
+def _bounded_map(executor, fn, items, window):
+    """Like executor.map, but with at most `window` tasks queued at a time.
+
+    Results come back in input order so reports stay identical to a serial run.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+# Errors kept per run for objects that could not be read (all of them are counted)
+MAX_OBJECT_ERRORS = 20
+# Below this much uncached work per process, spawning the pool (about 1.5s) costs more than parsing in it saves
+MIN_OBJECTS_PER_PROCESS = 4
+MIN_BYTES_PER_PROCESS = 8 * 1024 * 1024
+
+
+def _fetch_object(s3_client, bucket, key, event_types):
+    """Download and parse one object: `(events, seconds, parse_stats, error)`.
+
+    A failed download or a corrupt body returns `events` None and the error
+    instead of raising, so one bad object does not abort a whole report.
+    """
+    started = time.perf_counter()
+    parse_stats = {}
+    try:
+        events = parse_lines(iter_object_lines(s3_client, bucket, key), event_types, parse_stats)
+    except Exception as e:
+        return None, time.perf_counter() - started, {}, f"{key}: {e}"
+    return events, time.perf_counter() - started, parse_stats, None
+
+
+def _skip_object(stats, error):
+    stats["skipped_objects"] += 1
+    if len(stats["object_errors"]) < MAX_OBJECT_ERRORS:
+        stats["object_errors"].append(error)
+
+
+def fetch_events(s3_client, bucket, prefixes, max_workers=DEFAULT_FETCH_WORKERS, on_progress=None, store=None, event_types=None):
+    """List `prefixes` and download + parse every object through a bounded thread pool.
+
+    Yields `(object, events)` per S3 object in listing order, and fills the
+    returned `stats` dict with per-stage timings as it goes. Bodies are parsed
+    while they stream, so `fetch_seconds` (summed across workers) covers both;
+    `parse_seconds` and `bytes` cover the JSON parsing alone.
+    With an EventStore, objects whose ETag is already cached are read from
+    disk instead of S3, and newly fetched ones are added to it.
+    `event_types` limits the events kept to those types (see parse_lines).
+    Objects that cannot be read are skipped (not yielded or cached) and
+    counted in `skipped_objects`, with the first errors in `object_errors`.
+    """
+    stats = {"objects": 0, "events": 0, "cached_objects": 0, "list_seconds": 0.0, "fetch_seconds": 0.0,
+             "parse_seconds": 0.0, "bytes": 0, "lines": 0, "skipped_lines": 0, "skipped_objects": 0, "object_errors": []}
+    # Cache entries parsed with a type filter only match later runs using the same filter
+    cache_suffix = ":" + ",".join(sorted(event_types)) if event_types is not None else ""
+
+    def fetch_one(obj):
+        return (obj,) + _fetch_object(s3_client, bucket, obj["Key"], event_types)
+
+    def generate():
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-fetch") as executor:
+            started = time.perf_counter()
+            objects = []
+            for listed in executor.map(lambda prefix: list_objects(s3_client, bucket, prefix), prefixes):
+                objects.extend(listed)
+            stats["list_seconds"] = time.perf_counter() - started
+            stats["objects_total"] = len(objects)
+            if on_progress:
+                on_progress(stats)
+
+            known = store.known_etags(bucket, [obj["Key"] for obj in objects]) if store else {}
+            cached = [known.get(obj["Key"]) == obj["ETag"] + cache_suffix for obj in objects]
+            fresh = (obj for obj, hit in zip(objects, cached) if not hit)
+
+            started = time.perf_counter()
+            fetched = _bounded_map(executor, fetch_one, fresh, max_workers * 2)
+            for obj, hit in zip(objects, cached):
+                if hit:
+                    events = store.load(bucket, obj["Key"])
+                    stats["cached_objects"] += 1
+                else:
+                    obj, events, fetch_seconds, parse_stats, error = next(fetched)
+                    stats["fetch_seconds"] += fetch_seconds
+                    if error is not None:
+                        _skip_object(stats, error)
+                        if on_progress:
+                            on_progress(stats)
+                        continue
+                    for key, value in parse_stats.items():
+                        stats[key] += value
+                    if store:
+                        store.save(bucket, obj["Key"], obj["ETag"] + cache_suffix, events)
+                stats["objects"] += 1
+                stats["events"] += len(events)
+                yield obj, events
+                if on_progress:
+                    on_progress(stats)
+            stats["wall_seconds"] = time.perf_counter() - started
+
+    return generate(), stats
+
+
+class EventReducer:
+    """Reduces events on the fly to one best-status record per recipient.
+
+    Each email keeps `[priority, status, message_id, error, bounce_type, counts]`,
+    where `counts` holds one counter per entry in EVENT_TYPES (types not in the
+    table count as "Unknown"). A later event only replaces the record when
+    its priority is strictly higher, the same tie-break as `max()` over the
+    full event list, so memory grows with recipients rather than events.
+    """
+
+    def __init__(self):
+        self.records = {}
+        self.totals = [0] * len(EVENT_TYPES)
+
+    def add(self, email, event_type, message_id, error, bounce_type=""):
+        priority = EVENT_PRIORITY.get(event_type, -1)
+        index = _TYPE_INDEX.get(event_type, _TYPE_INDEX["Unknown"])
+        record = self.records.get(email)
+        if record is None:
+            record = self.records[email] = [priority, event_type, message_id, error, bounce_type, [0] * len(EVENT_TYPES)]
+        elif priority > record[0]:
+            record[0:5] = [priority, event_type, message_id, error, bounce_type]
+        record[5][index] += 1
+        self.totals[index] += 1
+
+    def add_events(self, events):
+        """Add parsed `(email, event_type, message_id, error, timestamp, bounce_type)` tuples."""
+        add = self.add
+        for email, event_type, message_id, error, _, bounce_type in events:
+            add(email, event_type, message_id, error, bounce_type)
+
+    def merge(self, other):
+        """Fold in a reducer built from events that came after this one's.
+
+        Ties keep this reducer's record, so merging partial reducers in object
+        order gives the same result as one reducer over all the events.
+        """
+        records = self.records
+        for email, theirs in other.records.items():
+            mine = records.get(email)
+            if mine is None:
+                records[email] = theirs
+                continue
+            if theirs[0] > mine[0]:
+                mine[0:5] = theirs[0:5]
+            mine[5] = [a + b for a, b in zip(mine[5], theirs[5])]
+        self.totals = [a + b for a, b in zip(self.totals, other.totals)]
+
+    def latest(self, email):
+        """`(status, message_id, error)` of the highest-priority event for `email`."""
+        record = self.records.get(email)
+        if record is None:
+            return NO_EVENT_DATA
+        return record[1], record[2], record[3]
+
+    def counts(self, email):
+        record = self.records.get(email)
+        if record is None:
+            return {}
+        return {event_type: n for event_type, n in zip(EVENT_TYPES, record[5]) if n}
+
+    def type_totals(self):
+        return {event_type: n for event_type, n in zip(EVENT_TYPES, self.totals) if n}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, email):
+        return email in self.records
+
+
+# Set once per worker process by _init_worker, so a large ledger index is not pickled with every chunk
+_worker_message_ids = None
+
+
+def _init_worker(message_ids):
+    global _worker_message_ids
+    _worker_message_ids = message_ids
+
+
+def _reduce_chunk(task):
+    """Process-pool worker: fetch (or load from the cache) a run of objects and reduce their events."""
+    return _reduce_objects(task, _worker_message_ids)
+
+
+def _reduce_objects(task, message_ids):
+    client_factory, bucket, chunk, store_path, event_types, cache_suffix, threads = task
+    s3_client = client_factory()
+    reducer = EventReducer()
+    stats = {"objects": 0, "events": 0, "cached_objects": 0, "fetch_seconds": 0.0,
+             "parse_seconds": 0.0, "bytes": 0, "lines": 0, "skipped_lines": 0, "skipped_objects": 0, "object_errors": []}
+    # Commit after every object so the other processes never wait long on the write lock
+    store = EventStore(store_path, commit_every=1) if store_path else None
+
+    def fetch_one(obj):
+        return _fetch_object(s3_client, bucket, obj["Key"], event_types)
+
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            fetched = _bounded_map(executor, fetch_one, (obj for obj, hit in chunk if not hit), threads * 2)
+            for obj, hit in chunk:
+                if hit:
+                    events = store.load(bucket, obj["Key"])
+                    stats["cached_objects"] += 1
+                else:
+                    events, fetch_seconds, parse_stats, error = next(fetched)
+                    stats["fetch_seconds"] += fetch_seconds
+                    if error is not None:
+                        _skip_object(stats, error)
+                        continue
+                    for key, value in parse_stats.items():
+                        stats[key] += value
+                    if store:
+                        store.save(bucket, obj["Key"], obj["ETag"] + cache_suffix, events)
+                reducer.add_events(events if message_ids is None else join_on_message_ids(events, message_ids))
+                stats["objects"] += 1
+                stats["events"] += len(events)
+    finally:
+        if store:
+            store.close()
+    return reducer, stats
+
+
+def reduce_events_in_processes(client_factory, bucket, prefixes, processes, store_path=None, event_types=None,
+                               threads_per_process=4, on_progress=None, message_ids=None):
+    """Like fetch_events + EventReducer, but parsing runs in `processes` worker processes.
+
+    The object list is split into contiguous chunks; each worker process
+    builds its own S3 client with `client_factory()` (which must be
+    picklable, e.g. a functools.partial of boto3.client), fetches or loads
+    its chunk and returns a partial EventReducer. The partials are merged
+    in object order, so the result matches a single-process run.
+    With `message_ids`, events are joined on it as in join_on_message_ids.
+    Unreadable objects are skipped and counted as in fetch_events.
+    With fewer than MIN_OBJECTS_PER_PROCESS objects or MIN_BYTES_PER_PROCESS
+    uncached bytes per process, the objects are reduced in this process
+    instead (`stats["processes"]` is 0).
+    Returns `(reducer, stats)`.
+    """
+    stats = {"objects": 0, "events": 0, "cached_objects": 0, "list_seconds": 0.0, "fetch_seconds": 0.0,
+             "parse_seconds": 0.0, "bytes": 0, "lines": 0, "skipped_lines": 0, "skipped_objects": 0, "object_errors": [],
+             "processes": processes}
+    cache_suffix = ":" + ",".join(sorted(event_types)) if event_types is not None else ""
+
+    started = time.perf_counter()
+    s3_client = client_factory()
+    with ThreadPoolExecutor(max_workers=DEFAULT_FETCH_WORKERS) as executor:
+        objects = [obj for listed in executor.map(lambda prefix: list_objects(s3_client, bucket, prefix), prefixes) for obj in listed]
+    stats["list_seconds"] = time.perf_counter() - started
+    stats["objects_total"] = len(objects)
+    if on_progress:
+        on_progress(stats)
+
+    known = {}
+    if store_path:
+        with EventStore(store_path) as store:
+            known = store.known_etags(bucket, [obj["Key"] for obj in objects])
+    marked = [(obj, known.get(obj["Key"]) == obj["ETag"] + cache_suffix) for obj in objects]
+    uncached_bytes = sum(obj["Size"] for obj, hit in marked if not hit)
+    if len(marked) < processes * MIN_OBJECTS_PER_PROCESS or uncached_bytes < processes * MIN_BYTES_PER_PROCESS:
+        started = time.perf_counter()
+        task = (lambda: s3_client, bucket, marked, store_path, event_types, cache_suffix, DEFAULT_FETCH_WORKERS)
+        reducer, chunk_stats = _reduce_objects(task, message_ids)
+        for key, value in chunk_stats.items():
+            stats[key] += value
+        stats["processes"] = 0
+        if on_progress:
+            on_progress(stats)
+        stats["wall_seconds"] = time.perf_counter() - started
+        return reducer, stats
+
+    # Several chunks per process so a slow chunk does not leave the other processes idle
+    chunk_size = max(1, -(-len(marked) // (processes * 4)))
+    tasks = [
+        (client_factory, bucket, marked[i:i + chunk_size], store_path, event_types, cache_suffix, threads_per_process)
+        for i in range(0, len(marked), chunk_size)
+    ]
+
+    started = time.perf_counter()
+    reducer = EventReducer()
+    # spawn, not fork: the web app has threads running, which fork does not copy safely
+    with multiprocessing.get_context("spawn").Pool(processes, _init_worker, (message_ids,)) as pool:
+        for partial, chunk_stats in pool.imap(_reduce_chunk, tasks):
+            reducer.merge(partial)
+            for key, value in chunk_stats.items():
+                stats[key] += value
+            del stats["object_errors"][MAX_OBJECT_ERRORS:]
+            if on_progress:
+                on_progress(stats)
+    stats["wall_seconds"] = time.perf_counter() - started
+    return reducer, stats
@@ -0,0 +1,184 @@
+import contextlib
+import queue
+import threading
+import time
+
+
+_DONE = object()
+
+
+class Stage:
+    """One step of a StagedPipeline.
+
+    `fn(item, emit)` handles one input and calls `emit(output)` for each
+    output it produces (none to drop the item, several to fan out).
+    `finish(emit)`, if given, runs once after the last input, e.g. to emit
+    a partly filled batch.
+    """
+
+    def __init__(self, name, fn, finish=None):
+        self.name = name
+        self.fn = fn
+        self.finish = finish
+        self.items = 0
+        self.busy_seconds = 0.0
+        # Time spent waiting for room in the next stage's queue, not working
+        self.blocked_seconds = 0.0
+        # Items put into / taken out of this stage's input queue, each written by one thread only
+        self.received = 0
+        self.taken = 0
+        self.input = None
+
+
+class StagedPipeline:
+    """Runs a source iterable through a chain of stages, each on its own thread.
+
+    Stages are connected by bounded queues, so a fast stage works at most
+    about `queue_size` items ahead of the next one instead of buffering the
+    whole input, and a slow stage (say, waiting on the network) does not
+    stop the others from preparing the next items. Items travel between
+    stages in lists of up to `batch_size` to keep the per-item queue
+    overhead low. `stats()` reports every stage's throughput, how busy it
+    is and how many items wait in front of it; the busiest stage with a
+    full queue in front of it is the bottleneck.
+    """
+
+    def __init__(self, stages, queue_size=32, batch_size=16, thread_context=None):
+        self.stages = stages
+        self.batch_size = max(1, int(batch_size))
+        self.queue_size = max(1, int(queue_size) // self.batch_size)
+        # e.g. app.app_context, entered by every stage thread
+        self.thread_context = thread_context or contextlib.nullcontext
+        # Reading the source is reported like a stage of its own
+        self.reader = Stage("read", None)
+        self._stopped = threading.Event()
+        self._error = None
+        self._started = None
+        self._threads = []
+
+    def stop(self):
+        """Stop reading the source; items already queued are discarded."""
+        self._stopped.set()
+
+    @property
+    def stopped(self):
+        return self._stopped.is_set()
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self.stop()
+
+    def _put(self, stage, target, batch):
+        """Hand `batch` from `stage` to the `target` stage, counting the wait as blocked time."""
+        started = time.perf_counter()
+        target.received += len(batch)
+        target.input.put(batch)
+        stage.blocked_seconds += time.perf_counter() - started
+
+    def _run_stage(self, stage, target):
+        out = []
+        with self.thread_context():
+            while True:
+                batch = stage.input.get()
+                if batch is _DONE:
+                    if stage.finish is not None and not self.stopped:
+                        self._call(stage, stage.finish, out.append)
+                    if target is not None:
+                        if out:
+                            self._put(stage, target, out)
+                        target.input.put(_DONE)
+                    return
+                stage.taken += len(batch)
+                if self.stopped:
+                    continue
+                self._call(stage, self._handle, stage, batch, out.append)
+                if out and target is not None:
+                    self._put(stage, target, out)
+                out = []
+
+    def _handle(self, stage, batch, emit):
+        fn = stage.fn
+        for item in batch:
+            if self.stopped:
+                return
+            fn(item, emit)
+            stage.items += 1
+
+    def _call(self, stage, fn, *args):
+        started = time.perf_counter()
+        try:
+            fn(*args)
+        except Exception as e:
+            # Keep draining so upstream stages never block on a full queue
+            self._fail(e)
+        finally:
+            stage.busy_seconds += time.perf_counter() - started
+
+    def start(self, source):
+        """Start the stage threads and a reader thread feeding `source` into the first stage."""
+        self._started = time.perf_counter()
+        for stage in self.stages:
+            stage.input = queue.Queue(self.queue_size)
+        for i, stage in enumerate(self.stages):
+            target = self.stages[i + 1] if i + 1 < len(self.stages) else None
+            self._threads.append(threading.Thread(target=self._run_stage, args=(stage, target), name=f"stage-{stage.name}", daemon=True))
+        self._threads.append(threading.Thread(target=self._read, args=(source,), name="stage-reader", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def _read(self, source):
+        reader = self.reader
+        first = self.stages[0]
+        items = iter(source)
+        batch = []
+        try:
+            while not self.stopped:
+                started = time.perf_counter()
+                item = next(items, _DONE)
+                reader.busy_seconds += time.perf_counter() - started
+                if item is _DONE:
+                    break
+                reader.items += 1
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    self._put(reader, first, batch)
+                    batch = []
+            if batch and not self.stopped:
+                self._put(reader, first, batch)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            first.input.put(_DONE)
+
+    def join(self, timeout=None):
+        """Wait for every stage to finish; False if still running after `timeout` seconds.
+
+        Re-raises the first exception a stage or the source raised.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            if thread.is_alive():
+                return False
+        if self._error is not None:
+            raise self._error
+        return True
+
+    def stats(self):
+        """`{stage: {items, per_sec, busy, queue}}` per stage.
+
+        `per_sec` is items handled per second of wall time, `busy` the fraction
+        of wall time spent working (excluding waits for a full downstream
+        queue) and `queue` how many items are waiting in front of the stage.
+        """
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        return {
+            stage.name: {
+                "items": stage.items,
+                "per_sec": round(stage.items / elapsed, 1) if elapsed else 0.0,
+                "busy": round(min(1.0, max(0.0, stage.busy_seconds - stage.blocked_seconds) / elapsed), 2) if elapsed else 0.0,
+                "queue": max(0, stage.received - stage.taken),
+            }
+            for stage in [self.reader] + self.stages
+        }
@@ -0,0 +1,101 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_PATH = os.environ.get(
+    "SUPPRESSION_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "generated", "suppression.sqlite3"),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS suppressed (
+    email TEXT PRIMARY KEY,
+    reason TEXT NOT NULL,
+    detail TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
+class SuppressionIndex:
+    """Persistent set of addresses that must not be mailed again (hard bounces and complaints).
+
+    Entries live in SQLite. `load()` builds an in-memory set of the
+    addresses' hashes, so checking a row is one set lookup even with
+    millions of entries; only hash hits are confirmed against SQLite.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+        self._hashes = None
+
+    def add(self, entries):
+        """Add or refresh `(email, reason, detail)` entries; returns how many were given."""
+        now = time.time()
+        rows = [(normalize_email(email), reason, detail or "", now, now) for email, reason, detail in entries]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO suppressed (email, reason, detail, first_seen, last_seen) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (email) DO UPDATE SET reason = excluded.reason, detail = excluded.detail, last_seen = excluded.last_seen",
+                rows,
+            )
+            self._conn.commit()
+            if self._hashes is not None:
+                self._hashes.update(hash(row[0]) for row in rows)
+        return len(rows)
+
+    def add_from_reducer(self, reducer):
+        """Suppress every recipient whose best status in an EventReducer is a complaint or a Permanent bounce.
+
+        Transient and Undetermined bounces (mailbox full, message too large, ...)
+        may succeed on a later send, so they are not suppressed.
+        """
+        entries = []
+        for email, (_, status, _, error, bounce_type, _) in reducer.records.items():
+            if status == "Complaint" or (status == "Bounce" and bounce_type == "Permanent"):
+                entries.append((email, status, error))
+        return self.add(entries)
+
+    def remove(self, email):
+        with self._lock:
+            self._conn.execute("DELETE FROM suppressed WHERE email = ?", (normalize_email(email),))
+            self._conn.commit()
+
+    def load(self):
+        """Read every suppressed address into the in-memory hash set; returns the entry count."""
+        with self._lock:
+            self._hashes = {hash(email) for email, in self._conn.execute("SELECT email FROM suppressed")}
+            return len(self._hashes)
+
+    def reason(self, email):
+        """`(reason, detail)` for a suppressed address, or None. `email` must be normalized."""
+        if self._hashes is not None and hash(email) not in self._hashes:
+            return None
+        with self._lock:
+            return self._conn.execute("SELECT reason, detail FROM suppressed WHERE email = ?", (email,)).fetchone()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM suppressed").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
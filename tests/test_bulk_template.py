@@ -0,0 +1,70 @@
+import json
+
+import pytest
+from jinja2 import DictLoader, Environment
+
+from render_pipeline import BulkTemplate
+
+TEMPLATES = {
+    "welcome.html": '<p>Dear {{ Name }},</p><a href="https://example.com/m/{{ Membershipid }}">{{ Membershipid }}</a>',
+    "conditional.html": "{% if Name %}<p>Dear {{ Name }},</p>{% endif %}",
+    "filtered.html": "<p>Dear {{ Name | upper }},</p>",
+}
+
+# Every character Handlebars escapes, and the ones Jinja spells differently or leaves alone
+AWKWARD = {"Name": "<b>\"Tom\" & 'Jerry'</b> `a=b`", "Membershipid": "M-001?x=1&y=2", "City": "Chennai"}
+
+
+@pytest.fixture
+def jinja_env():
+    # Flask autoescapes .html templates the same way
+    return Environment(loader=DictLoader(TEMPLATES), autoescape=True)
+
+
+def test_fill_applies_the_handlebars_escape_table(jinja_env):
+    bulk = BulkTemplate(jinja_env, "welcome.html", "Welcome {Name}", ["Name", "Membershipid", "City"])
+
+    subject, html = bulk.fill(AWKWARD)
+
+    assert subject == "Welcome " + AWKWARD["Name"]
+    assert html == ('<p>Dear &lt;b&gt;&quot;Tom&quot; &amp; &#x27;Jerry&#x27;&lt;/b&gt; &#x60;a&#x3D;b&#x60;,</p>'
+                    '<a href="https://example.com/m/M-001?x&#x3D;1&amp;y&#x3D;2">M-001?x&#x3D;1&amp;y&#x3D;2</a>')
+
+
+def test_stored_template_uses_double_braces_in_html_and_triple_in_subject(jinja_env):
+    bulk = BulkTemplate(jinja_env, "welcome.html", "Welcome {Name}", ["Name", "Membershipid", "City", "Not-A-Name"])
+
+    assert bulk.subject == "Welcome {{{Name}}}"
+    assert "{{Name}}" in bulk.html and "{{Membershipid}}" in bulk.html
+    assert bulk.names == ["Name", "Membershipid"]
+    assert json.loads(bulk.data(AWKWARD)) == {"Name": AWKWARD["Name"], "Membershipid": AWKWARD["Membershipid"]}
+
+
+def test_verify_accepts_jinja_output_with_equivalent_entities(jinja_env):
+    bulk = BulkTemplate(jinja_env, "welcome.html", "Welcome {Name}", list(AWKWARD))
+    html_body = jinja_env.get_template("welcome.html").render(**AWKWARD)
+
+    assert "&#34;" in html_body and "`a=b`" in html_body
+    assert bulk.verify(AWKWARD, "Welcome " + AWKWARD["Name"], html_body)
+    assert not bulk.verify(AWKWARD, "Welcome " + AWKWARD["Name"], html_body.replace("&lt;b&gt;", "<b>"))
+    assert not bulk.verify(AWKWARD, "Welcome Tom", html_body)
+
+
+def test_templates_that_transform_values_are_not_used(jinja_env):
+    conditional = BulkTemplate(jinja_env, "conditional.html", "Hi", ["Name"])
+    filtered = BulkTemplate(jinja_env, "filtered.html", "Hi", ["Name"])
+    row = {"Name": "Ravi"}
+
+    assert not conditional.supported
+    assert not conditional.verify(row, "Hi", jinja_env.get_template("conditional.html").render(**row))
+    assert not filtered.verify(row, "Hi", jinja_env.get_template("filtered.html").render(**row))
+
+
+def test_changed_template_gets_a_new_name(jinja_env):
+    first = BulkTemplate(jinja_env, "welcome.html", "Welcome {Name}", ["Name", "Membershipid"])
+    same = BulkTemplate(jinja_env, "welcome.html", "Welcome {Name}", ["Name", "Membershipid"])
+    changed = BulkTemplate(jinja_env, "welcome.html", "Hello {Name}", ["Name", "Membershipid"])
+
+    assert first.name == same.name
+    assert first.name != changed.name
+    assert first.name.startswith("welcome-")
@@ -0,0 +1,67 @@
+import csv
+
+import pytest
+
+from csv_stream import ColumnPlan, iter_csv_rows, iter_csv_tuples, read_csv_header
+
+
+def _map_row_dict(row, reverse_mapping, email_col, youtube_link):
+    # The per-row mapping SES jobs did on DictReader rows before ColumnPlan
+    to_email = row.get(email_col, "").strip()
+    template_vars = {}
+    for template_var, csv_col in reverse_mapping.items():
+        if template_var != 'Email':
+            template_vars[template_var] = row.get(csv_col, "").strip()
+    for csv_col, value in row.items():
+        if csv_col not in reverse_mapping.values() and csv_col != email_col:
+            var_name = csv_col.replace(' ', '').replace('-', '').replace('_', '')
+            if var_name and var_name not in template_vars:
+                template_vars[var_name] = value.strip()
+    if youtube_link:
+        template_vars['YouTubeLink'] = youtube_link
+    return to_email, template_vars
+
+
+# Renamed, duplicated and punctuation-only columns, plus a column the YouTube link constant replaces
+HEADER = ["E-mail", "Full Name", "Membership_ID", "Mobile", "Join-Date", "Name", "City", "Mobile", "---", "YouTube Link"]
+ROWS = [
+    ["ravi@example.com", " Ravi Kumar ", "M-001", "9800000001", "2024-01-05", "Ravi", "Chennai", "9800000011", "x", "old"],
+    ["  priya@example.com ", "Priya", "M-002", "9800000002", "2024-02-06", "", "Pune", "", "", ""],
+    [],
+    ["", "No Email", "M-004", "9800000004", "2024-04-08", "NE", "Delhi", "9800000014", "y", "old"],
+]
+
+MAPPINGS = {
+    "plain": ({"Email": "E-mail", "Name": "Full Name", "Membershipid": "Membership_ID"}, "E-mail", None),
+    "constant_overrides_column": ({"Email": "E-mail", "Name": "Full Name"}, "E-mail", "https://youtu.be/example"),
+    "mapped_column_missing": ({"Email": "E-mail", "Name": "Nickname", "Mobile": "Mobile"}, "E-mail", None),
+    "email_column_missing": ({"Name": "Full Name"}, "Email", None),
+}
+
+
+@pytest.fixture
+def members_csv(tmp_path):
+    path = tmp_path / "members.csv"
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(ROWS)
+    return str(path)
+
+
+@pytest.mark.parametrize("case", MAPPINGS)
+def test_column_plan_matches_dict_mapping(members_csv, case):
+    mapping, email_col, youtube_link = MAPPINGS[case]
+    plan = ColumnPlan(read_csv_header(members_csv), mapping, email_col, {"YouTubeLink": youtube_link} if youtube_link else None)
+    expected = [_map_row_dict(row, mapping, email_col, youtube_link) for row in iter_csv_rows(members_csv)]
+    actual = [(plan.email(row), plan.apply(row)) for row in iter_csv_tuples(members_csv)]
+
+    assert actual == expected
+    assert list(actual[0][1]) == list(expected[0][1]) == plan.names
+
+
+def test_short_rows_read_as_empty_fields():
+    plan = ColumnPlan(["Email", "Name", "City"], {"Email": "Email", "Name": "Name"}, "Email")
+
+    assert plan.email(["a@example.com"]) == "a@example.com"
+    assert plan.apply(["a@example.com"]) == {"Name": "", "City": ""}
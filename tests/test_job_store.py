@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from job_store import MemoryJobStore, SQLiteJobStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobStore(error_ring_size=5)
+    return SQLiteJobStore(str(tmp_path / "jobs.sqlite3"), error_ring_size=5)
+
+
+def test_concurrent_increments_are_not_lost(store):
+    store.create("job", status="running", sent=0, failed=0)
+    start = threading.Barrier(8)
+
+    def worker():
+        start.wait()
+        for i in range(250):
+            store.incr("job", sent=1, failed=i % 2)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    job = store.get("job")
+    assert (job["sent"], job["failed"]) == (2000, 1000)
+    assert job["status"] == "running"
+
+
+def test_increments_from_another_process_share_the_file(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    SQLiteJobStore(path).create("job", sent=0)
+
+    # Each store opens its own connections, as every gunicorn worker does
+    others = [SQLiteJobStore(path) for _ in range(3)]
+    for other in others:
+        other.incr("job", sent=5, retries=1)
+
+    job = SQLiteJobStore(path).get("job")
+    assert (job["sent"], job["retries"]) == (15, 3)
+
+
+def test_errors_keep_a_ring_and_counts_across_a_reset(store):
+    store.create("job", status="running")
+    seqs = [store.incr("job", failed=1, error={"email": f"{i}@example.com", "error": f"HTTP {500 + i}: boom"}) for i in range(7)]
+
+    job = store.get("job")
+    assert seqs == [1, 2, 3, 4, 5, 6, 7]
+    assert job["failed"] == job["error_count"] == 7
+    assert [e["seq"] for e in job["errors"]] == [3, 4, 5, 6, 7]
+    assert job["error_classes"] == {"HTTP #": 7}
+    assert [e["seq"] for e in store.get("job", errors_since=5)["errors"]] == [6, 7]
+
+    store.update("job", errors=[{"email": "x@example.com", "error": "Template rendering error: x", "stage": "render"}])
+    job = store.get("job")
+    assert job["error_count"] == 1
+    assert job["error_cursor"] == 8
+    assert job["error_classes"] == {"stage: render": 1}
+    assert store.incr("job", sent=1) is None
@@ -0,0 +1,56 @@
+import pytest
+
+from mime_cache import PrebuiltMessage, build_message
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 8
+PDF = b"%PDF-1.4\n" + b"\x00\x01binary\xff" * 400
+
+CASES = {
+    "plain": ({}, None, None, "Hello {Name}", "<p>Dear Ravi,</p>"),
+    "attachment": ({}, PDF, "report.pdf", "Your report", "<p>See the attached report.</p>"),
+    "non_ascii_subject": (
+        {"signature": PNG},
+        PDF,
+        "நன்றி.pdf",
+        "நன்றி – TOGETHER WE ACHIEVED IT! ALL INDIA NO.1 🙏",
+        "<p>வணக்கம் Ravi 🌺 – एक साथ मिलकर</p>",
+    ),
+}
+
+
+def _sent_bytes(message_text):
+    # The SES worker passes the message text to SendRawEmail, which sends it UTF-8 encoded
+    return message_text.encode("utf-8")
+
+
+@pytest.mark.parametrize("case", CASES)
+def test_prebuilt_message_matches_full_build_byte_for_byte(case):
+    inline_images, attachment, filename, subject, html_body = CASES[case]
+    prebuilt = PrebuiltMessage(inline_images, attachment, filename)
+
+    rendered = prebuilt.render(subject, "Sender <sender@example.com>", "member@example.com", html_body)
+    expected = build_message(subject, "Sender <sender@example.com>", "member@example.com", html_body, inline_images,
+                             attachment, filename, boundary=prebuilt.boundary, alt_boundary=prebuilt.alt_boundary)
+
+    assert _sent_bytes(rendered) == _sent_bytes(expected.as_string())
+    assert prebuilt.verify(subject, "Sender <sender@example.com>", "member@example.com", html_body)
+
+
+def test_every_recipient_gets_its_own_headers_and_body():
+    prebuilt = PrebuiltMessage({"signature": PNG}, PDF, "report.pdf")
+
+    for name in ("Ravi", "Priya"):
+        rendered = prebuilt.render(f"Hello {name}", "sender@example.com", f"{name.lower()}@example.com", f"<p>{name}</p>")
+        expected = build_message(f"Hello {name}", "sender@example.com", f"{name.lower()}@example.com", f"<p>{name}</p>",
+                                 {"signature": PNG}, PDF, "report.pdf", boundary=prebuilt.boundary, alt_boundary=prebuilt.alt_boundary)
+        assert _sent_bytes(rendered) == _sent_bytes(expected.as_string())
+
+
+def test_body_containing_the_boundary_is_built_in_full():
+    prebuilt = PrebuiltMessage({}, PDF, "report.pdf")
+    html_body = f"<p>{prebuilt.boundary}</p>"
+
+    rendered = prebuilt.render("Subject", "sender@example.com", "member@example.com", html_body)
+
+    assert f'boundary="{prebuilt.boundary}"' not in rendered
+    assert html_body in rendered
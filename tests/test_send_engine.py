@@ -0,0 +1,222 @@
+import asyncio
+
+import pytest
+
+import send_engine
+from send_engine import AdaptiveRateController, QuotaExceeded, TokenBucket
+
+
+class FakeClock:
+    """Stands in for time.monotonic/time.sleep so pacing is checked without waiting.
+
+    asyncio reads the same clock, so tests that run an event loop do not use it.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        # Like a real sleep, always moves the clock on, even for float leftovers smaller than its resolution
+        seconds = max(seconds, 1e-6)
+        self.now += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(send_engine.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(send_engine.time, "sleep", clock.sleep)
+    return clock
+
+
+class SesError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.response = {"Error": {"Code": code, "Message": message}}
+
+
+THROTTLED = SesError("Throttling", "Maximum sending rate exceeded.")
+QUOTA = SesError("Throttling", "Daily message quota exceeded.")
+
+
+def test_token_bucket_bursts_to_capacity_then_paces(clock):
+    bucket = TokenBucket(10, capacity=5)
+
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.slept == 0
+
+    for _ in range(10):
+        bucket.acquire()
+    assert clock.slept == pytest.approx(1.0, abs=1e-4)
+
+
+def test_token_bucket_multi_token_requests_and_unlimited_rate(clock):
+    bucket = TokenBucket(14)
+    bucket.acquire(14)
+    bucket.acquire(7)
+    assert clock.slept == pytest.approx(0.5, abs=1e-4)
+
+    # A request larger than the bucket waits for a full bucket, then overdraws it
+    bucket.acquire(50)
+    assert clock.slept == pytest.approx(1.5, abs=1e-4)
+
+    bucket.set_rate(0)
+    before = clock.slept
+    for _ in range(1000):
+        bucket.acquire()
+    assert clock.slept == before
+
+
+def test_reserve_stops_at_the_daily_quota():
+    controller = AdaptiveRateController(TokenBucket(1), 14, max_24h=10, sent_24h=7)
+
+    assert controller.reserve(2)
+    assert controller.remaining_24h == 1
+    assert not controller.reserve(2)
+    assert controller.reserve()
+    assert not controller.reserve()
+
+    controller.release(2)
+    assert controller.remaining_24h == 2
+
+
+def test_no_daily_cap_never_runs_out():
+    controller = AdaptiveRateController.from_limits(TokenBucket(1), {"max_send_rate": 200, "max_24h": -1}, ceiling=50)
+
+    assert controller.rate == 50
+    assert controller.remaining_24h is None
+    assert all(controller.reserve(1000) for _ in range(100))
+
+
+def test_throttle_burst_cuts_the_rate_once(clock):
+    controller = AdaptiveRateController(TokenBucket(1), 14, min_rate=1, increase_interval=1.0)
+
+    for _ in range(14):
+        controller.on_throttle()
+    assert controller.rate == 7
+    assert controller.throttle_count == 14
+
+    clock.now += 1.0
+    controller.on_throttle()
+    assert controller.rate == 3.5
+
+    clock.now += 1.0
+    for _ in range(5):
+        clock.now += 1.0
+        controller.on_throttle()
+    assert controller.rate == 1
+
+
+def test_rate_recovers_one_step_per_interval(clock):
+    controller = AdaptiveRateController(TokenBucket(1), 14, increase_step=2, increase_interval=1.0)
+    controller.on_throttle()
+
+    controller.on_success()
+    assert controller.rate == 7
+
+    clock.now += 1.0
+    for _ in range(10):
+        controller.on_success()
+    assert controller.rate == 9
+
+    for _ in range(5):
+        clock.now += 1.0
+        controller.on_success()
+    assert controller.rate == 14
+
+
+def test_call_retries_throttled_sends(clock):
+    controller = AdaptiveRateController(TokenBucket(1), 14, max_retries=5)
+    outcomes = [THROTTLED, THROTTLED, "message-id"]
+
+    def send():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert controller.call(send) == "message-id"
+    assert controller.throttle_count == 2
+
+
+def test_call_gives_up_after_max_retries(clock):
+    controller = AdaptiveRateController(TokenBucket(1), 14, max_retries=3)
+    calls = []
+
+    def send():
+        calls.append(1)
+        raise THROTTLED
+
+    with pytest.raises(SesError):
+        controller.call(send)
+    assert len(calls) == 4
+
+
+def test_other_errors_and_daily_quota_are_not_retried(clock):
+    controller = AdaptiveRateController(TokenBucket(1), 14)
+
+    def rejected():
+        raise SesError("MessageRejected", "Email address is not verified.")
+
+    def over_quota():
+        raise QUOTA
+
+    with pytest.raises(SesError):
+        controller.call(rejected)
+    with pytest.raises(QuotaExceeded):
+        controller.call(over_quota)
+    assert controller.throttle_count == 0
+
+
+def _bulk_send(replies, calls):
+    """A SendBulkEmail stand-in returning the next canned status per entry for each call."""
+    def send_bulk(from_email, template_name, entries):
+        calls.append([email for email, _ in entries])
+        return [(replies[email].pop(0), f"id-{email}", "") for email, _ in entries]
+    return send_bulk
+
+
+def test_call_bulk_resends_only_throttled_entries(clock):
+    controller = AdaptiveRateController(TokenBucket(1), 14)
+    replies = {"a": ["SUCCESS"], "b": ["ACCOUNT_THROTTLED", "SUCCESS"], "c": ["MESSAGE_REJECTED"],
+               "d": ["ACCOUNT_THROTTLED", "ACCOUNT_THROTTLED", "SUCCESS"]}
+    calls = []
+
+    results = controller.call_bulk(_bulk_send(replies, calls), [(email, "{}") for email in "abcd"], "from", "template")
+
+    assert calls == [["a", "b", "c", "d"], ["b", "d"], ["d"]]
+    assert [status for status, _, _ in results] == ["SUCCESS", "SUCCESS", "MESSAGE_REJECTED", "SUCCESS"]
+    assert results[3][1] == "id-d"
+    assert controller.throttle_count == 2
+
+
+def test_call_bulk_keeps_the_throttled_status_after_max_retries(clock):
+    controller = AdaptiveRateController(TokenBucket(1), 14, max_retries=2)
+    replies = {"a": ["SUCCESS"], "b": ["ACCOUNT_THROTTLED"] * 3}
+    calls = []
+
+    results = controller.call_bulk(_bulk_send(replies, calls), [("a", "{}"), ("b", "{}")], "from", "template")
+
+    assert calls == [["a", "b"], ["b"], ["b"]]
+    assert [status for status, _, _ in results] == ["SUCCESS", "ACCOUNT_THROTTLED"]
+
+
+def test_call_bulk_async_resends_throttled_entries():
+    controller = AdaptiveRateController(TokenBucket(1), 14)
+    replies = {"a": ["ACCOUNT_THROTTLED", "SUCCESS"], "b": ["SUCCESS"]}
+    calls = []
+    send_bulk = _bulk_send(replies, calls)
+
+    async def send_bulk_async(*args):
+        return send_bulk(*args)
+
+    results = asyncio.run(controller.call_bulk_async(send_bulk_async, [("a", "{}"), ("b", "{}")], "from", "template"))
+
+    assert calls == [["a", "b"], ["a"]]
+    assert [status for status, _, _ in results] == ["SUCCESS", "SUCCESS"]
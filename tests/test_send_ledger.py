@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from job_store import MemoryJobStore, SQLiteJobStore
+from send_ledger import SendCheckpoint
+
+
+def test_resumed_job_skips_rows_already_sent(tmp_path):
+    checkpoint = SendCheckpoint("job", str(tmp_path))
+    checkpoint.save_params({"csv_path": "members.csv", "subject_template": "Hello {Name}", "batch_size": 14})
+    for row, email in enumerate(["a@example.com", "B@Example.com ", "c@example.com"]):
+        checkpoint.record(row, email, f"id-{row}")
+    checkpoint.close()
+
+    # A new process sees the same log and parameters
+    resumed = SendCheckpoint("job", str(tmp_path))
+    assert resumed.exists()
+    assert resumed.load_params()["subject_template"] == "Hello {Name}"
+    assert resumed.completed_rows() == {0, 1, 2}
+
+    resumed.record(5, "f@example.com", "id-5")
+    resumed.close()
+    index, first, last = SendCheckpoint("job", str(tmp_path)).message_index()
+    assert index == {"id-0": "a@example.com", "id-1": "b@example.com", "id-2": "c@example.com", "id-5": "f@example.com"}
+    assert first <= last
+
+
+def test_half_written_line_after_a_crash(tmp_path):
+    checkpoint = SendCheckpoint("job", str(tmp_path))
+    checkpoint.record(0, "a@example.com", "id-0")
+    checkpoint.close()
+    with open(checkpoint.path, "a", encoding="utf-8") as f:
+        f.write("1\tb@example.com\tid-")
+
+    resumed = SendCheckpoint("job", str(tmp_path))
+    assert resumed.completed_rows() == {0}
+
+    resumed.record(1, "b@example.com", "id-1")
+    resumed.record(2, "c@example.com", "id-2")
+    resumed.close()
+    assert [entry[:3] for entry in resumed.entries()] == [
+        (0, "a@example.com", "id-0"), (1, "b@example.com", "id-1"), (2, "c@example.com", "id-2"),
+    ]
+
+
+def test_missing_checkpoint(tmp_path):
+    checkpoint = SendCheckpoint("unknown", str(tmp_path))
+
+    assert not checkpoint.exists()
+    assert checkpoint.completed_rows() == set()
+    assert checkpoint.message_index() == ({}, None, None)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobStore()
+    return SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_claim_refuses_a_job_that_is_still_running(store):
+    store.create("job", status="running", heartbeat=time.time(), created=time.time())
+
+    assert store.claim("new", 60, status="running") is True
+    assert not store.claim("job", 60, status="running")
+
+    # A worker that stopped reporting (e.g. a killed process) no longer holds the job
+    store.update("job", heartbeat=time.time() - 120)
+    assert store.claim("job", 60, status="running", heartbeat=time.time()) is True
+    assert not store.claim("job", 60, status="running")
+
+    store.update("job", status="completed", heartbeat=time.time())
+    assert store.claim("job", 60, status="running")
+
+
+def test_only_one_of_several_workers_claims_a_job(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    SQLiteJobStore(path).create("job", status="failed")
+    stores = [SQLiteJobStore(path) for _ in range(6)]
+    start = threading.Barrier(len(stores))
+    results = []
+
+    def resume(store):
+        start.wait()
+        results.append(store.claim("job", 60, status="running", heartbeat=time.time()))
+
+    threads = [threading.Thread(target=resume, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False] * 5 + [True]
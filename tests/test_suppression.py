@@ -0,0 +1,152 @@
+import json
+import sqlite3
+
+from event_store import EventStore
+from ses_events import EventReducer, parse_lines
+from suppression import SuppressionIndex
+
+
+def _mail(message_id, destination):
+    return {
+        "timestamp": "2024-03-05T00:40:02.012Z",
+        "source": "Sender Name <sender@example.com>",
+        "sourceArn": "arn:aws:ses:ap-south-1:123456789012:identity/sender@example.com",
+        "sendingAccountId": "123456789012",
+        "messageId": message_id,
+        "destination": destination,
+        "headersTruncated": False,
+        "headers": [
+            {"name": "From", "value": "Sender Name <sender@example.com>"},
+            {"name": "To", "value": ", ".join(destination)},
+            {"name": "Subject", "value": "Message sent from Amazon SES"},
+        ],
+        "commonHeaders": {"from": ["Sender Name <sender@example.com>"], "to": destination, "subject": "Message sent from Amazon SES"},
+        "tags": {"ses:configuration-set": ["ConfigSet"], "ses:from-domain": ["example.com"]},
+    }
+
+
+# Event publishing (configuration set) payloads, as Firehose writes them to S3
+PERMANENT_BOUNCE = {
+    "eventType": "Bounce",
+    "bounce": {
+        "bounceType": "Permanent",
+        "bounceSubType": "General",
+        "bouncedRecipients": [
+            {"emailAddress": "gone@example.com", "action": "failed", "status": "5.1.1",
+             "diagnosticCode": "smtp; 550 5.1.1 user unknown"},
+        ],
+        "timestamp": "2024-03-05T00:41:02.669Z",
+        "feedbackId": "01000157c44f053b-61b59c11-9236-11e6-8f96-7be8aexample-000000",
+        "reportingMTA": "dsn; mta.example.com",
+    },
+    "mail": _mail("EXAMPLE7c191be45-e9aedb9a-02f9-4d12-a87d-dd0099a07f8a-000000", ["gone@example.com"]),
+}
+
+# A full mailbox: SES reports it as Transient even though the SMTP code is 5.x.x
+TRANSIENT_BOUNCE = {
+    "eventType": "Bounce",
+    "bounce": {
+        "bounceType": "Transient",
+        "bounceSubType": "MailboxFull",
+        "bouncedRecipients": [
+            {"emailAddress": "full@example.com", "action": "failed", "status": "5.2.2",
+             "diagnosticCode": "smtp; 552 5.2.2 Mailbox full"},
+        ],
+        "timestamp": "2024-03-05T00:42:10.101Z",
+        "feedbackId": "01000157c44f053b-61b59c11-9236-11e6-8f96-7be8aexample-000001",
+        "reportingMTA": "dsn; mta.example.com",
+    },
+    "mail": _mail("EXAMPLE8d202cf56-f0bfec0b-13a0-5e23-b98e-ee1100b18a9b-000000", ["full@example.com"]),
+}
+
+# One message to two recipients, only one of which bounced
+PARTIAL_BOUNCE = {
+    "eventType": "Bounce",
+    "bounce": {
+        "bounceType": "Permanent",
+        "bounceSubType": "NoEmail",
+        "bouncedRecipients": [
+            {"emailAddress": "Nobody@Example.com", "action": "failed", "status": "5.1.1",
+             "diagnosticCode": "smtp; 550 5.1.1 <nobody@example.com>: Recipient address rejected"},
+        ],
+        "timestamp": "2024-03-05T00:43:00.000Z",
+        "feedbackId": "01000157c44f053b-61b59c11-9236-11e6-8f96-7be8aexample-000002",
+    },
+    "mail": _mail("EXAMPLE9e313dg67-a1cafd1c-24b1-6f34-c09f-ff2211c29b0c-000000", ["nobody@example.com", "fine@example.com"]),
+}
+
+COMPLAINT = {
+    "eventType": "Complaint",
+    "complaint": {
+        "complainedRecipients": [{"emailAddress": "angry@example.com"}],
+        "timestamp": "2024-03-05T01:00:00.000Z",
+        "feedbackId": "01000157c44f053b-61b59c11-9236-11e6-8f96-7be8aexample-000003",
+        "complaintFeedbackType": "abuse",
+    },
+    "mail": _mail("EXAMPLEaf424eh78-b2dbae2d-35c2-7a45-d1a0-aa3322d3ac1d-000000", ["angry@example.com"]),
+}
+
+
+def _lines(*events):
+    return [json.dumps(event).encode("utf-8") + b"\n" for event in events]
+
+
+def test_bounce_type_and_per_recipient_diagnostic():
+    events = parse_lines(_lines(PERMANENT_BOUNCE, TRANSIENT_BOUNCE, PARTIAL_BOUNCE))
+
+    assert [(email, error, bounce_type) for email, _, _, error, _, bounce_type in events] == [
+        ("gone@example.com", "smtp; 550 5.1.1 user unknown", "Permanent"),
+        ("full@example.com", "smtp; 552 5.2.2 Mailbox full", "Transient"),
+        ("nobody@example.com", "smtp; 550 5.1.1 <nobody@example.com>: Recipient address rejected", "Permanent"),
+    ]
+    assert events[0][4] == "2024-03-05T00:41:02.669Z"
+
+
+def test_only_permanent_bounces_and_complaints_are_suppressed(tmp_path):
+    reducer = EventReducer()
+    reducer.add_events(parse_lines(_lines(PERMANENT_BOUNCE, TRANSIENT_BOUNCE, PARTIAL_BOUNCE, COMPLAINT)))
+
+    with SuppressionIndex(str(tmp_path / "suppression.sqlite3")) as index:
+        assert index.add_from_reducer(reducer) == 3
+        assert index.reason("gone@example.com") == ("Bounce", "smtp; 550 5.1.1 user unknown")
+        assert index.reason("nobody@example.com")[0] == "Bounce"
+        assert index.reason("angry@example.com") == ("Complaint", "abuse")
+        assert index.reason("full@example.com") is None
+        assert index.reason("fine@example.com") is None
+
+
+def test_merged_reducers_keep_the_bounce_type(tmp_path):
+    first, second = EventReducer(), EventReducer()
+    first.add_events(parse_lines(_lines(TRANSIENT_BOUNCE)))
+    second.add_events(parse_lines(_lines(PERMANENT_BOUNCE)))
+    first.merge(second)
+
+    with SuppressionIndex(str(tmp_path / "suppression.sqlite3")) as index:
+        assert index.add_from_reducer(first) == 1
+        assert index.reason("gone@example.com") is not None
+
+
+def test_event_cache_round_trips_bounce_type(tmp_path):
+    events = parse_lines(_lines(PERMANENT_BOUNCE, TRANSIENT_BOUNCE))
+    with EventStore(str(tmp_path / "events.sqlite3")) as store:
+        store.save("bucket", "ses/2024/03/05/a", "etag", events)
+        assert [tuple(row) for row in store.load("bucket", "ses/2024/03/05/a")] == events
+
+
+def test_event_cache_without_bounce_types_is_dropped(tmp_path):
+    path = str(tmp_path / "events.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE objects (bucket TEXT NOT NULL, object_key TEXT NOT NULL, etag TEXT NOT NULL,
+            event_count INTEGER NOT NULL, processed_at REAL NOT NULL, PRIMARY KEY (bucket, object_key));
+        CREATE TABLE events (bucket TEXT NOT NULL, object_key TEXT NOT NULL, seq INTEGER NOT NULL, email TEXT NOT NULL,
+            event_type TEXT NOT NULL, message_id TEXT NOT NULL, error TEXT NOT NULL, timestamp TEXT NOT NULL,
+            PRIMARY KEY (bucket, object_key, seq)) WITHOUT ROWID;
+        INSERT INTO objects VALUES ('bucket', 'old', 'etag', 1, 0);
+        INSERT INTO events VALUES ('bucket', 'old', 0, 'full@example.com', 'Bounce', 'm', 'smtp; 552', '');
+    """)
+    conn.close()
+
+    with EventStore(path) as store:
+        assert store.known_etags("bucket", ["old"]) == {}
+        assert store.load("bucket", "old") == []